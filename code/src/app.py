@@ -1,17 +1,115 @@
 # src/app.py
 
-from flask import Flask
+from flask import Flask, Response, jsonify, request
 from controllers.transaction_controller import transaction_bp
-# from controllers.recommendation_controller import recommendation_bp
+from controllers.job_controller import job_bp
+from controllers.recommendation_controller import recommendation_bp
+from utils import db_utils, db_indexes, json_provider, metrics
+from utils.llm_cache import get_llm_cache
+from utils.singleflight import get_singleflight
+from utils.openai_util import get_llm_client
+from utils.model_routing import get_route_stats
+from utils.circuit_breaker import get_circuit_breaker
+from services.catalog_cache import get_catalog_cache
+from services.transaction_prefilter import get_prefilter_stats
 
 def create_app():
     """
     Create and configure the Flask application.
     """
     app = Flask(__name__)
+    # orjson-backed JSON with ObjectId / Decimal128 support for all responses
+    json_provider.init_app(app)
+
+    # Shared MongoDB connection pool for the lifetime of the app
+    db_utils.init_app(app)
+    db_indexes.init_app(app)
+    # Request timing and per-request spans
+    metrics.init_app(app)
 
     # Register Blueprints for different controllers
     app.register_blueprint(transaction_bp, url_prefix='/api/transactions')
-    # app.register_blueprint(recommendation_bp, url_prefix='/api/recommendations')
+    app.register_blueprint(job_bp, url_prefix='/api/jobs')
+    app.register_blueprint(recommendation_bp, url_prefix='/api/recommendations')
+
+    @app.route('/api/health/db', methods=['GET'])
+    def db_pool_stats():
+        """
+        GET /api/health/db
+        Return MongoDB connection pool statistics for monitoring.
+        """
+        return jsonify(db_utils.get_pool_stats()), 200
+
+    @app.route('/api/health/llm_cache', methods=['GET'])
+    def llm_cache_stats():
+        """
+        GET /api/health/llm_cache
+        Return LLM response cache hit/miss counters.
+        """
+        cache = get_llm_cache()
+        return jsonify(cache.get_stats() if cache else {"enabled": False}), 200
+
+    @app.route('/api/health/llm_client', methods=['GET'])
+    def llm_client_stats():
+        """
+        GET /api/health/llm_client
+        Return LLM HTTP request, retry and failure counters and the circuit
+        breaker state for this worker.
+        """
+        return jsonify({**get_llm_client().get_stats(), "circuit": get_circuit_breaker("llm").get_stats()}), 200
+
+    @app.route('/api/health/llm_routes', methods=['GET'])
+    def llm_route_stats():
+        """
+        GET /api/health/llm_routes
+        Return the model of each LLM route and its call, latency, token,
+        cost and escalation counters for this worker.
+        """
+        return jsonify(get_route_stats()), 200
+
+    @app.route('/api/health/catalog', methods=['GET'])
+    def catalog_cache_stats():
+        """
+        GET /api/health/catalog
+        Return product catalog cache counters and version.
+        """
+        return jsonify(get_catalog_cache().get_stats()), 200
+
+    @app.route('/api/health/prefilter', methods=['GET'])
+    def prefilter_stats():
+        """
+        GET /api/health/prefilter
+        Return the rule pre-filter's row counters (dropped, auto-accepted,
+        sent to the LLM) for this worker.
+        """
+        return jsonify(get_prefilter_stats()), 200
+
+    @app.route('/api/health/singleflight', methods=['GET'])
+    def singleflight_stats():
+        """
+        GET /api/health/singleflight
+        Return request coalescing counters for this worker.
+        """
+        return jsonify(get_singleflight().get_stats()), 200
+
+    @app.route('/api/health/traces', methods=['GET'])
+    def recent_traces():
+        """
+        GET /api/health/traces[?trace_id=ID][&limit=N]
+        Return the most recent spans recorded by this worker (TRACING_ENABLED).
+        """
+        spans = metrics.get_recent_spans(request.args.get("trace_id"), request.args.get("limit", 200, type=int))
+        return jsonify({"enabled": metrics.TRACING_ENABLED, "spans": spans}), 200
+
+    @app.route('/metrics', methods=['GET'])
+    def prometheus_metrics():
+        """
+        GET /metrics
+        Stage, request, MongoDB command, token, cache and pre-filter metrics
+        of this worker in the Prometheus text format.
+        """
+        if not metrics.METRICS_ENABLED:
+            return jsonify({"error": "Metrics are disabled"}), 404
+        return Response(metrics.render_metrics(), mimetype="text/plain; version=0.0.4"), 200
 
     return app
@@ -0,0 +1,35 @@
+# src/controllers/job_controller.py
+
+from flask import Blueprint, jsonify, url_for
+import logging
+
+from services.job_service import JobQueueFullError, get_job_manager
+
+job_bp = Blueprint('job_bp', __name__)
+logger = logging.getLogger(__name__)
+
+def submit_job(kind: str, fn, params: dict):
+    """
+    Queue fn as a background job and build the 202 Accepted response.
+    """
+    try:
+        job_id = get_job_manager().submit(kind, fn, params)
+    except JobQueueFullError as e:
+        return jsonify({"error": str(e)}), 503
+
+    logger.info(f"Queued {kind} job {job_id}")
+    status_url = url_for("job_bp.get_job", job_id=job_id)
+    response = jsonify({"job_id": job_id, "status": "queued", "status_url": status_url})
+    response.headers["Location"] = status_url
+    return response, 202
+
+@job_bp.route('/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """
+    GET /api/jobs/<job_id>
+    Return the status, progress and (once finished) result of a job.
+    """
+    job = get_job_manager().get(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job), 200
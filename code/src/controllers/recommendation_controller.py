@@ -0,0 +1,22 @@
+# src/controllers/recommendation_controller.py
+
+from flask import Blueprint, jsonify
+import logging
+
+from services.recommendation_store import fetch_latest_recommendation
+
+recommendation_bp = Blueprint('recommendation_bp', __name__)
+logger = logging.getLogger(__name__)
+
+@recommendation_bp.route('/<customer_id>/latest', methods=['GET'])
+def get_latest_recommendation(customer_id):
+    """
+    GET /api/recommendations/<customer_id>/latest
+    Return the latest stored product recommendations of a customer without
+    calling the LLM. Recommendations are stored by the batch runner and by
+    GET /api/transactions/analyze_customer_product.
+    """
+    recommendation = fetch_latest_recommendation(customer_id)
+    if not recommendation:
+        return jsonify({"error": "No recommendations stored for this customer"}), 404
+    return jsonify(recommendation), 200
@@ -1,47 +1,99 @@
 # src/controllers/transaction_controller.py
 
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, current_app, request, jsonify, stream_with_context
 import logging
 
 # Assume these are in the same package or an importable package
 from services.transaction_service import (
-    fetch_transactions_by_date,
+    fetch_transactions_page,
+    iter_transactions_by_date,
+    decode_fetch_cursor,
     get_recommended_transaction_by_date,
     analyze_recommendable_transaction_by_date,
-    analyze_recommendable_products_for_customer
+    analyze_recommendable_products_for_customer,
+    stream_recommendable_transaction_by_date,
+    stream_recommendable_products_for_customer
 )
+from controllers.job_controller import submit_job
 
 transaction_bp = Blueprint('transaction_bp', __name__)
 logger = logging.getLogger(__name__)
 
+# ?format= values that stream an analysis as it runs
+STREAM_MIMETYPES = {"ndjson": "application/x-ndjson", "sse": "text/event-stream"}
+
+def _event_stream(events, stream_format: str) -> Response:
+    """
+    Stream (event, data) pairs as newline-delimited JSON objects
+    ({"event": ..., "data": ...}) or as server-sent events.
+    """
+    json_provider = current_app.json
+
+    def generate():
+        for event, data in events:
+            if stream_format == "sse":
+                yield f"event: {event}\ndata: {json_provider.dumps(data)}\n\n"
+            else:
+                yield json_provider.dumps({"event": event, "data": data}) + "\n"
+
+    # Ask proxies not to buffer, so each event reaches the client when it is sent
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return Response(stream_with_context(generate()), mimetype=STREAM_MIMETYPES[stream_format], headers=headers)
+
 @transaction_bp.route('/fetch/by_date', methods=['GET'])
 def get_transactions_by_date():
     """
-    GET /api/transactions/fetch/by_date?date=MM/DD/YYYY
-    Fetch ALL transactions for a given date.
+    GET /api/transactions/fetch/by_date?date=MM/DD/YYYY[&limit=N][&cursor=TOKEN][&format=ndjson]
+    Fetch transactions for a given date.
+    - Default: one page of up to `limit` rows plus a `next_cursor` token for the next page.
+    - format=ndjson: stream every row (after `cursor`, if given) as newline-delimited JSON.
     """
     date_str = request.args.get("date")
     if not date_str:
         return jsonify({"error": "Missing 'date' query parameter"}), 400
-    
+
+    cursor_token = request.args.get("cursor")
+    limit = request.args.get("limit", type=int)
+    if limit is not None and limit <= 0:
+        return jsonify({"error": "'limit' must be a positive integer"}), 400
+    try:
+        if cursor_token:
+            decode_fetch_cursor(cursor_token)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
     logger.info(f"Fetching transactions for date: {date_str}")
-    transactions = fetch_transactions_by_date(date_str)
-    return jsonify({"transactions": transactions, "count": len(transactions)}), 200
+
+    if request.args.get("format") == "ndjson":
+        json_provider = current_app.json
+
+        def generate():
+            for tx in iter_transactions_by_date(date_str, cursor_token, limit):
+                yield json_provider.dumps(tx) + "\n"
+
+        return Response(stream_with_context(generate()), mimetype="application/x-ndjson"), 200
+
+    transactions, next_cursor = fetch_transactions_page(date_str, cursor_token, limit)
+    return jsonify({"transactions": transactions, "count": len(transactions), "next_cursor": next_cursor}), 200
 
 @transaction_bp.route('/analyze/by_date', methods=['POST'])
 def analyze_transactions_by_date():
     """
     POST /api/transactions/analyze/by_date
-    Body: { "date": "MM/DD/YYYY" }
+    Body: { "date": "MM/DD/YYYY", "async": false }
     1) Fetch unprocessed transactions for that date
     2) Use LLM to pick transactions for recommendation
     3) Return JSON with chosen transaction_id, and reason
+    With "async": true, returns 202 with a job id to poll at GET /api/jobs/<job_id>.
     """
     data = request.get_json() or {}
     date_str = data.get("date")
     if not date_str:
         return jsonify({"error": "Missing 'date' in request body"}), 400
 
+    if data.get("async"):
+        return submit_job("analyze_by_date", get_recommended_transaction_by_date, {"date_str": date_str})
+
     logger.info(f"Analyzing transactions for date: {date_str}")
     result = get_recommended_transaction_by_date(date_str)
 
@@ -53,11 +105,28 @@ def analyze_transactions_by_date():
 
 @transaction_bp.route('/analyze_recommendable_transactions/by_date', methods=['POST'])
 def analyze_recommendable_transactions():
+    """
+    POST /api/transactions/analyze_recommendable_transactions/by_date[?format=ndjson|sse]
+    Body: { "date": "MM/DD/YYYY", "async": false }
+    With "async": true, returns 202 with a job id to poll at GET /api/jobs/<job_id>.
+    With format=ndjson or sse, streams a "transaction" event per recommendable
+    transaction as the LLM names it, then a "done" or "error" event.
+    """
     data = request.get_json() or {}
     date_str = data.get("date")
     if not date_str:
         return jsonify({"error": "Date query parameter is required"}), 400
 
+    if data.get("async"):
+        return submit_job(
+            "analyze_recommendable_transactions", analyze_recommendable_transaction_by_date, {"date_str": date_str}
+        )
+
+    stream_format = request.args.get("format")
+    if stream_format in STREAM_MIMETYPES:
+        logger.info(f"Streaming transaction analysis for date: {date_str}")
+        return _event_stream(stream_recommendable_transaction_by_date(date_str), stream_format), 200
+
     logger.info(f"Analyzing transactions for date: {date_str}")
     result = analyze_recommendable_transaction_by_date(date_str)
 
@@ -69,6 +138,11 @@ def analyze_recommendable_transactions():
 
 @transaction_bp.route('/analyze_customer_product', methods=['GET'])
 def analyze_recommendable_transactions_for_customer():
+    """
+    GET /api/transactions/analyze_customer_product?customer_id=ID&start_date=MM/DD/YYYY&end_date=MM/DD/YYYY[&format=ndjson|sse]
+    With format=ndjson or sse, streams a "product" event per ranked product
+    as the LLM writes it, then a "done" or "error" event.
+    """
     customer_str = request.args.get("customer_id")
     start_date = request.args.get("start_date")
     end_date = request.args.get("end_date")
@@ -76,6 +150,13 @@ def analyze_recommendable_transactions_for_customer():
     if not customer_str or not start_date or not end_date:
         return jsonify({"error": "Query parameters are required"}), 400
 
+    stream_format = request.args.get("format")
+    if stream_format in STREAM_MIMETYPES:
+        logger.info(f"Streaming product analysis for customer: {customer_str}")
+        return _event_stream(
+            stream_recommendable_products_for_customer(customer_str, start_date, end_date), stream_format
+        ), 200
+
     logger.info(f"Analyzing products for customer: {customer_str}")
     result = analyze_recommendable_products_for_customer(customer_str, start_date, end_date)
 
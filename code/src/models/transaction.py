@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Literal
+from typing import Literal, Optional
 from datetime import datetime
 import uuid
 
@@ -19,7 +19,16 @@ class Transaction(BaseModel):
     
     # Balance & Processing
     balance_after_transaction: float
-    is_processed_for_recommendation: bool = False  # Default to False
+    is_processed_for_recommendation: bool = False  # True once the verdict is "valid"
+
+    # Claim protocol: pending -> claimed (owner, lease expiry) -> done (verdict)
+    processing_status: Literal["pending", "claimed", "done"] = "pending"
+    claim_owner: Optional[str] = None
+    claim_token: Optional[str] = None
+    claim_expires_at: Optional[datetime] = None
+    verdict: Optional[Literal["valid", "rejected"]] = None
+    verdict_claim_token: Optional[str] = None  # claim that marked the row valid
+    processed_at: Optional[datetime] = None
     
     # Timestamps
     created_at: datetime = Field(default_factory=datetime.utcnow)
@@ -0,0 +1,35 @@
+import sys
+import os
+import json
+import argparse
+
+# Append project root to sys.path so we can import from utils.
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from utils.db_utils import get_database
+from utils.db_indexes import ensure_indexes, explain_queries
+
+def main():
+    parser = argparse.ArgumentParser(description="Create the required MongoDB indexes and report query plans.")
+    parser.add_argument("--explain", action="store_true", help="Report which hot queries still use a collection scan.")
+    parser.add_argument("--skip-create", action="store_true", help="Only run the explain report.")
+    args = parser.parse_args()
+
+    db = get_database()
+
+    if not args.skip_create:
+        created = ensure_indexes(db)
+        for coll_name, names in created.items():
+            print(f"{coll_name}: {', '.join(names)}")
+
+    if args.explain:
+        report = explain_queries(db)
+        print(json.dumps(report, indent=2, default=str))
+        scans = [entry["query"] for entry in report if entry.get("collection_scan")]
+        if scans:
+            print(f"Queries still scanning the collection: {', '.join(scans)}")
+        else:
+            print("All hot queries use an index.")
+
+if __name__ == "__main__":
+    main()
@@ -1,62 +1,67 @@
 import sys
 import os
-import csv
 import argparse
+from functools import partial
 
 # Append the project root to sys.path so we can import from models and utils.
 sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
 
 from models.product import Product
 from utils.db_utils import get_database
+from utils.csv_ingestion import add_ingest_arguments, checkpoint_path_from_args, ingest_csv, natural_key_id
+from services.catalog_cache import load_segment_ids_by_customer_type
 
-def populate_products(csv_filepath):
+def parse_product_row(row, segment_ids):
+    """
+    Convert one CSV row into a product document, or None if its segment is unknown.
+    """
+    # Extract CSV fields.
+    product_name = row["Product Name"]
+    product_type = row["Category"]
+    customer_segment = row["Customer Segment"]
+    key_features = row["Key Features"]
+    eligibility_criteria = row["Eligibility Criteria"]
+
+    # Lookup the segment based on the CSV's "Customer Segment" field.
+    # The segments collection should have documents with a "customer_type" field.
+    segment_id = segment_ids.get(customer_segment)
+    if not segment_id:
+        print(f"Segment not found for customer segment: {customer_segment}. Skipping product '{product_name}'.")
+        return None
+
+    # Create a Product model instance, with an id derived from segment + name.
+    product = Product(
+        product_id=natural_key_id(segment_id, product_name),
+        product_name=product_name,
+        product_type=product_type,
+        description=key_features,
+        eligibility_criteria=eligibility_criteria,
+        segment_id=segment_id
+    )
+    return product.to_dict()
+
+def populate_products(csv_filepath, batch_size=None, workers=None, checkpoint_path=None):
     """
     Reads product data from the CSV file and inserts the product documents into the
     products collection. Each product document references a segment from the segments collection.
+    With a checkpoint_path, rows are upserted on product_id and progress is checkpointed.
     """
     db = get_database()
     products_collection = db["products"]
-    segments_collection = db["segments"]
-
-    products_to_insert = []
+    # Resolve all segments once instead of one lookup per CSV row
+    segment_ids = load_segment_ids_by_customer_type(db)
 
     try:
-        with open(csv_filepath, newline='', encoding='utf-8') as csvfile:
-            reader = csv.DictReader(csvfile)
-            for row in reader:
-                # Extract CSV fields.
-                product_name = row["Product Name"]
-                product_type = row["Category"]
-                customer_segment = row["Customer Segment"]
-                key_features = row["Key Features"]
-                eligibility_criteria = row["Eligibility Criteria"]
-
-                # Lookup the segment based on the CSV's "Customer Segment" field.
-                # The segments collection should have documents with a "customer_type" field.
-                segment_doc = segments_collection.find_one({"customer_type": customer_segment})
-                if not segment_doc:
-                    print(f"Segment not found for customer segment: {customer_segment}. Skipping product '{product_name}'.")
-                    continue
-
-                segment_id = segment_doc["segment_id"]
-
-                # Create a Product model instance.
-                product = Product(
-                    product_name=product_name,
-                    product_type=product_type,
-                    description=key_features,
-                    eligibility_criteria=eligibility_criteria,
-                    segment_id=segment_id
-                )
-
-                products_to_insert.append(product.to_dict())
-
-        if products_to_insert:
-            result = products_collection.insert_many(products_to_insert)
-            print(f"Inserted {len(result.inserted_ids)} products successfully.")
-        else:
-            print("No products to insert.")
-
+        return ingest_csv(
+            csv_filepath,
+            products_collection,
+            partial(parse_product_row, segment_ids=segment_ids),
+            batch_size=batch_size,
+            workers=workers,
+            label="products",
+            key_fields=["product_id"] if checkpoint_path else None,
+            checkpoint_path=checkpoint_path,
+        )
     except FileNotFoundError:
         print(f"CSV file not found at {csv_filepath}. Please check the path and try again.")
     except Exception as e:
@@ -64,4 +69,8 @@ def populate_products(csv_filepath):
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Populate the products collection from a CSV file.")
-    populate_products(os.path.join(os.path.dirname(__file__), "datasets/products.csv"))
\ No newline at end of file
+    add_ingest_arguments(parser, os.path.join(os.path.dirname(__file__), "datasets/products.csv"))
+    args = parser.parse_args()
+    populate_products(
+        args.csv_filepath, batch_size=args.batch_size, workers=args.workers, checkpoint_path=checkpoint_path_from_args(args)
+    )
@@ -1,6 +1,5 @@
 import sys
 import os
-import csv
 import argparse
 from datetime import datetime
 
@@ -9,6 +8,7 @@ sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
 
 from models.transaction import Transaction
 from utils.db_utils import get_database
+from utils.csv_ingestion import add_ingest_arguments, checkpoint_path_from_args, ingest_csv, natural_key_id, text_hash
 
 def parse_transaction_date(date_str: str) -> datetime:
     """
@@ -20,60 +20,85 @@ def parse_transaction_date(date_str: str) -> datetime:
         print(f"Error parsing date '{date_str}': {e}")
         raise
 
-def populate_transactions(csv_filepath="transactions.csv"):
+def parse_transaction_row(row):
+    """
+    Convert one CSV row into a transaction document, or None if the row is invalid.
+    """
+    # Parse and convert CSV values
+    customer_id = row["customer_id"]
+    try:
+        # Parse transaction_date using the given format
+        transaction_date = parse_transaction_date(row["transaction_date"])
+    except Exception:
+        return None
+    transaction_type = row["transaction_type"]  # Expected "Debit" or "Credit"
+    try:
+        amount = float(row["amount"])
+    except Exception as e:
+        print(f"Error converting amount '{row['amount']}' for customer {customer_id}: {e}")
+        return None
+    merchant_category = row["merchant_category"]
+    description = row["description"]
+    try:
+        balance_after_transaction = float(row["balance_after_transaction"])
+    except Exception as e:
+        print(f"Error converting balance_after_transaction '{row['balance_after_transaction']}' for customer {customer_id}: {e}")
+        return None
+
+    try:
+        # Create a Transaction instance. The id is derived from the row's natural
+        # key so loading the same row again targets the same document.
+        transaction = Transaction(
+            transaction_id=natural_key_id(
+                customer_id, transaction_date.date().isoformat(), amount, balance_after_transaction,
+                text_hash(description)
+            ),
+            customer_id=customer_id,
+            transaction_date=transaction_date,
+            transaction_type=transaction_type,
+            amount=amount,
+            merchant_category=merchant_category,
+            description=description,
+            balance_after_transaction=balance_after_transaction,
+            is_processed_for_recommendation=False,
+            created_at=transaction_date,
+            updated_at=transaction_date
+        )
+    except Exception as e:
+        print(f"Error processing transaction for customer {customer_id}: {e}")
+        return None
+
+    return transaction.to_dict()
+
+def populate_transactions(csv_filepath="transactions.csv", batch_size=None, workers=None, checkpoint_path=None):
+    """
+    Load transactions from the CSV file. With a checkpoint_path, rows are upserted
+    on transaction_id (derived from the natural key) and progress is checkpointed,
+    so a re-run after a failure only loads the remaining rows.
+    """
     db = get_database()
     transactions_collection = db["transactions"]
-    
-    transactions_to_insert = []
-    
+
     try:
-        with open(csv_filepath, newline='', encoding='utf-8') as csvfile:
-            reader = csv.DictReader(csvfile)
-            for row in reader:
-                # Parse and convert CSV values
-                customer_id = row["customer_id"]
-                # Parse transaction_date using the given format
-                transaction_date = parse_transaction_date(row["transaction_date"])
-                transaction_type = row["transaction_type"]  # Expected "Debit" or "Credit"
-                try:
-                    amount = float(row["amount"])
-                except Exception as e:
-                    print(f"Error converting amount '{row['amount']}' for customer {customer_id}: {e}")
-                    continue
-                merchant_category = row["merchant_category"]
-                description = row["description"]
-                try:
-                    balance_after_transaction = float(row["balance_after_transaction"])
-                except Exception as e:
-                    print(f"Error converting balance_after_transaction '{row['balance_after_transaction']}' for customer {customer_id}: {e}")
-                    continue
-                
-                # Create a Transaction instance.
-                transaction = Transaction(
-                    customer_id=customer_id,
-                    transaction_date=transaction_date,
-                    transaction_type=transaction_type,
-                    amount=amount,
-                    merchant_category=merchant_category,
-                    description=description,
-                    balance_after_transaction=balance_after_transaction,
-                    is_processed_for_recommendation=False,
-                    created_at=transaction_date,
-                    updated_at=transaction_date
-                )
-                
-                transactions_to_insert.append(transaction.to_dict())
-        
-        if transactions_to_insert:
-            result = transactions_collection.insert_many(transactions_to_insert)
-            print(f"Inserted {len(result.inserted_ids)} transactions successfully.")
-        else:
-            print("No transactions to insert.")
-    
+        return ingest_csv(
+            csv_filepath,
+            transactions_collection,
+            parse_transaction_row,
+            batch_size=batch_size,
+            workers=workers,
+            label="transactions",
+            key_fields=["transaction_id"] if checkpoint_path else None,
+            checkpoint_path=checkpoint_path,
+        )
     except FileNotFoundError:
         print(f"CSV file not found at {csv_filepath}. Please check the path and try again.")
     except Exception as e:
         print("An error occurred while populating transactions:", e)
 
 if __name__ == "__main__":
-    populate_transactions(os.path.join(os.path.dirname(__file__), "datasets/transactions3.csv"))
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Populate the transactions collection from a CSV file.")
+    add_ingest_arguments(parser, os.path.join(os.path.dirname(__file__), "datasets/transactions3.csv"))
+    args = parser.parse_args()
+    populate_transactions(
+        args.csv_filepath, batch_size=args.batch_size, workers=args.workers, checkpoint_path=checkpoint_path_from_args(args)
+    )
@@ -0,0 +1,28 @@
+import sys
+import os
+import argparse
+import logging
+
+# Append project root to sys.path so we can import from services and utils.
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from services.batch_recommendation_service import run_batch_recommendations
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate product recommendations for all customers (biweekly cycle).")
+    parser.add_argument("--start-date", help="Window start, MM/DD/YYYY (defaults to the demo window).")
+    parser.add_argument("--end-date", help="Window end (inclusive), MM/DD/YYYY.")
+    parser.add_argument("--run-id", help="Resume an interrupted run with this id.")
+    parser.add_argument("--page-size", type=int, help="Customers loaded and written per page.")
+    parser.add_argument("--workers", type=int, help="Concurrent LLM calls.")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    run = run_batch_recommendations(
+        start_date=args.start_date,
+        end_date=args.end_date,
+        run_id=args.run_id,
+        page_size=args.page_size,
+        max_workers=args.workers,
+    )
+    print(f"Run {run['_id']} {run['status']}: {run['processed']} customers processed, {run['failed']} failed, {run.get('reused', 0)} unchanged.")
@@ -0,0 +1,35 @@
+import sys
+import os
+import signal
+import argparse
+import logging
+
+# Append project root to sys.path so we can import from services and utils.
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from services.transaction_stream_consumer import (
+    MODE_AUTO,
+    MODE_CHANGE_STREAM,
+    MODE_POLL,
+    TransactionStreamConsumer,
+)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Analyze new transactions continuously as they are inserted.")
+    parser.add_argument("--name", help="Consumer name; its resume position is stored under this name.")
+    parser.add_argument("--mode", choices=[MODE_AUTO, MODE_CHANGE_STREAM, MODE_POLL], default=MODE_AUTO,
+                        help="Change stream, polling on created_at, or change stream with polling fallback.")
+    parser.add_argument("--batch-size", type=int, help="Maximum transactions per micro-batch.")
+    parser.add_argument("--max-wait", type=float, help="Maximum seconds a transaction waits in a micro-batch.")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    consumer = TransactionStreamConsumer(
+        name=args.name, batch_size=args.batch_size, max_wait_seconds=args.max_wait, mode=args.mode
+    )
+    signal.signal(signal.SIGTERM, lambda *_: consumer.stop())
+    try:
+        consumer.run()
+    except KeyboardInterrupt:
+        consumer.stop()
+    print(f"Consumer stopped: {consumer.stats}")
@@ -0,0 +1,188 @@
+# src/services/batch_recommendation_service.py
+
+import os
+import uuid
+import logging
+from collections import defaultdict
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from pymongo import ASCENDING
+
+from utils.db_utils import get_database
+from utils.metrics import pipeline
+from services.transaction_service import (
+    CUSTOMER_PROMPT_PROJECTION,
+    TRANSACTION_PROMPT_PROJECTION,
+    LLMResponseError,
+    build_window_query,
+    prepare_customer_ranking,
+    rank_products_with_metadata,
+    resolve_recommendation_window,
+)
+from services.customer_aggregates import get_customer_aggregates
+from services.recommendation_store import load_latest_recommendations, save_recommendations
+
+logger = logging.getLogger(__name__)
+
+BATCH_PAGE_SIZE = int(os.getenv("BATCH_PAGE_SIZE", "200"))
+BATCH_MAX_WORKERS = int(os.getenv("BATCH_MAX_WORKERS", "4"))
+
+RUN_STATUS_RUNNING = "running"
+RUN_STATUS_COMPLETED = "completed"
+
+
+def _load_page(db, last_customer_id, page_size, window_start, window_end):
+    """
+    Load one page of customers with their windowed transactions and their
+    aggregates over the window, each in bulk for the whole page.
+    :return: (customers, transactions by customer_id, aggregate by customer_id)
+    """
+    customer_query = {"customer_id": {"$gt": last_customer_id}} if last_customer_id else {}
+    customers = list(
+        db["customers"]
+        .find(customer_query, {**CUSTOMER_PROMPT_PROJECTION, "customer_id": 1})
+        .sort("customer_id", ASCENDING)
+        .limit(page_size)
+    )
+    if not customers:
+        return [], {}, {}
+
+    customer_ids = [customer["customer_id"] for customer in customers]
+    transactions_by_customer = defaultdict(list)
+    for tx in db["transactions"].find(
+        {**build_window_query(window_start, window_end), "customer_id": {"$in": customer_ids}},
+        {**TRANSACTION_PROMPT_PROJECTION, "customer_id": 1},
+    ):
+        transactions_by_customer[tx.pop("customer_id")].append(tx)
+
+    aggregates = get_customer_aggregates(db, customer_ids, window_start, window_end)
+    return customers, transactions_by_customer, aggregates
+
+
+def _recommend(customer, transactions, window_start, window_end, previous=None, aggregate=None):
+    """
+    Rank products for one customer, reusing the previous recommendation when
+    its inputs are unchanged. Returns the recommendation record to store.
+    """
+    with pipeline("batch_recommendations"):
+        record = {"customer_id": customer["customer_id"], "valid_products": [], "error": None}
+        # Same inputs as the API, so stored rankings are interchangeable between the two
+        ranking = prepare_customer_ranking(
+            customer, window_start, window_end, transactions, stored=previous, lookup_stored=False,
+            aggregate=aggregate,
+        )
+        if "error" in ranking:
+            return {**record, "error": ranking["error"]}
+
+        record["input_hash"] = ranking["input_hash"]
+        if ranking["stored"] is not None:
+            return {
+                **record,
+                "valid_products": previous["valid_products"],
+                "model": previous["model"],
+                "prompt_hash": previous.get("prompt_hash"),
+                "reused_from": previous["run_id"],
+            }
+        try:
+            return {**record, **rank_products_with_metadata(
+                customer, ranking["valid_transactions"], ranking["eligible_products"], ranking["transaction_summary"]
+            )}
+        except LLMResponseError as e:
+            return {**record, "error": str(e)}
+
+
+def run_batch_recommendations(start_date: str = None, end_date: str = None, run_id: str = None,
+                              page_size: int = None, max_workers: int = None):
+    """
+    Generate product recommendations for every customer.
+    Customers are processed in customer_id order, one page at a time: each page
+    is loaded in bulk, ranked with up to max_workers concurrent LLM calls and
+    written back with one bulk_write. The run's checkpoint (last customer_id of
+    the last completed page) is stored in recommendation_runs, so calling again
+    with the same run_id resumes after the last completed page. Customers whose
+    inputs did not change since their latest stored recommendation reuse it
+    without an LLM call.
+    :return: the run document
+    """
+    page_size = page_size or BATCH_PAGE_SIZE
+    max_workers = max_workers or BATCH_MAX_WORKERS
+    window_start, window_end = resolve_recommendation_window(start_date, end_date)
+
+    db = get_database()
+    runs_coll = db["recommendation_runs"]
+
+    run_id = run_id or str(uuid.uuid4())
+    run = runs_coll.find_one({"_id": run_id})
+    if run and run["status"] == RUN_STATUS_COMPLETED:
+        logger.info(f"Batch run {run_id} already completed")
+        return run
+    if not run:
+        run = {
+            "_id": run_id,
+            "status": RUN_STATUS_RUNNING,
+            "window_start": window_start,
+            "window_end": window_end,
+            "last_customer_id": None,
+            "processed": 0,
+            "failed": 0,
+            "reused": 0,
+            "started_at": datetime.utcnow(),
+            "updated_at": datetime.utcnow(),
+        }
+        runs_coll.insert_one(run)
+    else:
+        # Resume with the window the run was started with
+        window_start, window_end = run["window_start"], run["window_end"]
+        logger.info(f"Resuming batch run {run_id} after customer {run['last_customer_id']}")
+
+    last_customer_id = run["last_customer_id"]
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while True:
+            customers, transactions_by_customer, aggregates = _load_page(
+                db, last_customer_id, page_size, window_start, window_end
+            )
+            if not customers:
+                break
+
+            previous = load_latest_recommendations(
+                db, [customer["customer_id"] for customer in customers], window_start, window_end
+            )
+            results = list(executor.map(
+                lambda customer: _recommend(
+                    customer,
+                    transactions_by_customer.get(customer["customer_id"], []),
+                    window_start,
+                    window_end,
+                    previous.get(customer["customer_id"]),
+                    aggregates.get(customer["customer_id"]),
+                ),
+                customers,
+            ))
+
+            save_recommendations(db, [
+                {**record, "run_id": run_id, "source": "batch", "window_start": window_start, "window_end": window_end}
+                for record in results
+            ])
+
+            now = datetime.utcnow()
+            failed = sum(1 for record in results if record["error"])
+            reused = sum(1 for record in results if "reused_from" in record)
+            last_customer_id = customers[-1]["customer_id"]
+            runs_coll.update_one(
+                {"_id": run_id},
+                {
+                    "$set": {"last_customer_id": last_customer_id, "updated_at": now},
+                    "$inc": {"processed": len(results), "failed": failed, "reused": reused},
+                },
+            )
+            logger.info(
+                f"Batch run {run_id}: {len(results)} customers done ({failed} failed, {reused} unchanged), "
+                f"up to {last_customer_id}"
+            )
+
+    runs_coll.update_one(
+        {"_id": run_id},
+        {"$set": {"status": RUN_STATUS_COMPLETED, "finished_at": datetime.utcnow(), "updated_at": datetime.utcnow()}},
+    )
+    return runs_coll.find_one({"_id": run_id})
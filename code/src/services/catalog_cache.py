@@ -0,0 +1,184 @@
+# src/services/catalog_cache.py
+
+import os
+import time
+import threading
+import logging
+from pymongo.errors import PyMongoError
+
+from utils.db_utils import get_database
+from utils.metrics import count_cache
+
+logger = logging.getLogger(__name__)
+
+CATALOG_CACHE_TTL_SECONDS = int(os.getenv("CATALOG_CACHE_TTL_SECONDS", "300"))
+CATALOG_CHANGE_STREAM = os.getenv("CATALOG_CHANGE_STREAM", "true").lower() == "true"
+# Distinct owned-product sets memoized per segment
+CATALOG_ELIGIBLE_MEMO_SIZE = int(os.getenv("CATALOG_ELIGIBLE_MEMO_SIZE", "256"))
+
+CATALOG_PRODUCT_PROJECTION = {
+    "_id": 0,
+    "product_id": 1,
+    "product_name": 1,
+    "product_type": 1,
+    "description": 1,
+    "eligibility_criteria": 1,
+}
+
+
+def load_segment_ids_by_customer_type(db) -> dict:
+    """
+    Map customer_type -> segment_id with a single query.
+    """
+    return {
+        segment["customer_type"]: segment["segment_id"]
+        for segment in db["segments"].find({}, {"_id": 0, "customer_type": 1, "segment_id": 1})
+    }
+
+
+def load_product_ids_by_name(db) -> dict:
+    """
+    Map product_name -> product_id with a single query.
+    """
+    return {
+        product["product_name"]: product["product_id"]
+        for product in db["products"].find({}, {"_id": 0, "product_name": 1, "product_id": 1})
+    }
+
+
+class CatalogCache:
+    """
+    Read-through cache of the product catalog per segment.
+    Entries are stamped with the catalog version: a change on the products
+    collection (seen through a change stream) bumps the version and drops the
+    entries. When change streams are not available, entries expire after the TTL.
+    """
+
+    def __init__(self, ttl_seconds: int):
+        self.ttl_seconds = ttl_seconds
+        self.version = 0
+        self._segments = {}
+        self._lock = threading.Lock()
+        self._watcher = None
+        self.stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    def _load(self, segment_id: str) -> dict:
+        # Stamp with the version seen before the query, so a change that lands
+        # while loading makes the entry stale instead of being lost
+        version = self.version
+        products = list(get_database()["products"].find({"segment_id": segment_id}, CATALOG_PRODUCT_PROJECTION))
+        return {
+            "products": products,
+            "loaded_at": time.monotonic(),
+            "version": version,
+            "eligible": {},
+            "derived": {},
+        }
+
+    def _entry(self, segment_id: str) -> dict:
+        with self._lock:
+            entry = self._segments.get(segment_id)
+            if (entry is not None and entry["version"] == self.version
+                    and time.monotonic() - entry["loaded_at"] < self.ttl_seconds):
+                self.stats["hits"] += 1
+                count_cache("catalog", True)
+                return entry
+            self.stats["misses"] += 1
+        count_cache("catalog", False)
+
+        entry = self._load(segment_id)
+        with self._lock:
+            # Keep the fresher entry if another thread loaded it meanwhile
+            if entry["version"] == self.version:
+                self._segments[segment_id] = entry
+        return entry
+
+    def get_eligible_products(self, segment_id: str, owned_product_ids) -> list:
+        """
+        Products of the customer's segment minus the products the customer
+        already owns, memoized per distinct set of owned product ids.
+        """
+        entry = self._entry(segment_id)
+        owned = frozenset(owned_product_ids or [])
+        eligible = entry["eligible"].get(owned)
+        if eligible is None:
+            eligible = [product for product in entry["products"] if product["product_id"] not in owned]
+            with self._lock:
+                if len(entry["eligible"]) >= CATALOG_ELIGIBLE_MEMO_SIZE:
+                    entry["eligible"].clear()
+                entry["eligible"][owned] = eligible
+        return eligible
+
+    def get_derived(self, segment_id: str, name: str, build):
+        """
+        Data derived from a segment's products (e.g. a search index), built
+        once with build(products) and dropped together with the cached segment,
+        so it always matches the catalog version it was built from.
+        """
+        entry = self._entry(segment_id)
+        derived = entry["derived"].get(name)
+        if derived is None:
+            derived = build(entry["products"])
+            with self._lock:
+                entry["derived"][name] = derived
+        return derived
+
+    def invalidate(self):
+        """
+        Bump the catalog version and drop all cached segments.
+        """
+        with self._lock:
+            self.version += 1
+            self._segments.clear()
+            self.stats["invalidations"] += 1
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats)
+            stats["version"] = self.version
+            stats["segments_cached"] = len(self._segments)
+        stats["change_stream"] = self._watcher is not None and self._watcher.is_alive()
+        return stats
+
+    def start_watcher(self):
+        """
+        Watch the products collection in a background thread and invalidate
+        the cache on every change. Falls back to TTL expiry if change streams
+        are not supported (e.g. standalone mongod).
+        """
+        if self._watcher is not None:
+            return
+        self._watcher = threading.Thread(target=self._watch, name="catalog-watcher", daemon=True)
+        self._watcher.start()
+
+    def _watch(self):
+        try:
+            with get_database()["products"].watch() as stream:
+                for _ in stream:
+                    self.invalidate()
+        except PyMongoError as e:
+            logger.info(f"Catalog change stream unavailable, using TTL expiry only: {e}")
+        except Exception as e:
+            logger.warning(f"Catalog change stream stopped: {e}")
+
+
+_catalog_cache = None
+_catalog_cache_pid = None
+_catalog_cache_lock = threading.Lock()
+
+
+def get_catalog_cache() -> CatalogCache:
+    """
+    Return the per-process catalog cache, starting its change stream watcher
+    on first use (threads do not survive a fork, so this is done lazily).
+    """
+    global _catalog_cache, _catalog_cache_pid
+    pid = os.getpid()
+    if _catalog_cache is None or _catalog_cache_pid != pid:
+        with _catalog_cache_lock:
+            if _catalog_cache is None or _catalog_cache_pid != pid:
+                _catalog_cache = CatalogCache(CATALOG_CACHE_TTL_SECONDS)
+                _catalog_cache_pid = pid
+                if CATALOG_CHANGE_STREAM:
+                    _catalog_cache.start_watcher()
+    return _catalog_cache
@@ -0,0 +1,276 @@
+# src/services/customer_aggregates.py
+
+import os
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+logger = logging.getLogger(__name__)
+
+# One document per customer and day with processed transactions, built by an
+# aggregation pipeline, plus one coverage document per customer recording the
+# range of days built so far
+AGGREGATES_COLLECTION = "customer_aggregates"
+# Customers with more processed transactions than this get a summary in the prompt
+AGGREGATE_SUMMARY_THRESHOLD = int(os.getenv("AGGREGATE_SUMMARY_THRESHOLD", "50"))
+
+DUPLICATE_KEY_ERROR = 11000
+
+
+def bucket_id(customer_id: str, day: datetime) -> str:
+    return f"{customer_id}|{day:%Y-%m-%d}"
+
+
+def coverage_id(customer_id: str) -> str:
+    return f"{customer_id}|coverage"
+
+
+def _day(value: datetime) -> datetime:
+    return datetime(value.year, value.month, value.day)
+
+
+def _category_key(category: str) -> str:
+    # Field names cannot contain "." or start with "$"
+    return (category or "Unknown").replace(".", "_").lstrip("$") or "Unknown"
+
+
+def _day_bucket_pipeline(match: dict) -> list:
+    """
+    Aggregation pipeline grouping the processed transactions selected by
+    match into one result per customer and day.
+    """
+    return [
+        {"$match": {**match, "is_processed_for_recommendation": True}},
+        {"$group": {
+            "_id": {
+                "customer_id": "$customer_id",
+                "year": {"$year": "$transaction_date"},
+                "month": {"$month": "$transaction_date"},
+                "day": {"$dayOfMonth": "$transaction_date"},
+                "category": "$merchant_category",
+            },
+            "spend": {"$sum": "$amount"},
+            "count": {"$sum": 1},
+            "debit_count": {"$sum": {"$cond": [{"$eq": ["$transaction_type", "Debit"]}, 1, 0]}},
+            "max_amount": {"$max": "$amount"},
+            "min_balance": {"$min": "$balance_after_transaction"},
+        }},
+        {"$group": {
+            "_id": {
+                "customer_id": "$_id.customer_id",
+                "year": "$_id.year",
+                "month": "$_id.month",
+                "day": "$_id.day",
+            },
+            "categories": {"$push": {"k": "$_id.category", "v": "$spend"}},
+            "transaction_count": {"$sum": "$count"},
+            "amount_sum": {"$sum": "$spend"},
+            "debit_count": {"$sum": "$debit_count"},
+            "max_amount": {"$max": "$max_amount"},
+            "min_balance": {"$min": "$min_balance"},
+        }},
+    ]
+
+
+def _build_buckets(db, match_clauses: list):
+    """
+    Recompute the day buckets of the processed transactions matching any of
+    match_clauses with an aggregation pipeline, and store them. A bucket is
+    only replaced by one counting at least as many transactions: processed
+    transactions are never removed, so the larger count is the newer
+    snapshot, and concurrent or repeated builds cannot lose or double-count
+    a transaction.
+    """
+    if not match_clauses:
+        return
+    match = match_clauses[0] if len(match_clauses) == 1 else {"$or": match_clauses}
+    now = datetime.utcnow()
+    writes = []
+    for result in db["transactions"].aggregate(_day_bucket_pipeline(match)):
+        key = result["_id"]
+        day = datetime(key["year"], key["month"], key["day"])
+        spend_by_category = defaultdict(float)
+        for category in result["categories"]:
+            spend_by_category[_category_key(category["k"])] += category["v"]
+        bucket = {
+            "customer_id": key["customer_id"],
+            "day": day,
+            "spend_by_category": dict(spend_by_category),
+            "transaction_count": result["transaction_count"],
+            "amount_sum": result["amount_sum"],
+            "debit_count": result["debit_count"],
+            "credit_count": result["transaction_count"] - result["debit_count"],
+            "max_amount": result["max_amount"],
+            "min_balance": result["min_balance"],
+            "updated_at": now,
+        }
+        writes.append(UpdateOne(
+            {"_id": bucket_id(key["customer_id"], day), "transaction_count": {"$lte": bucket["transaction_count"]}},
+            # transaction_ids was kept by buckets folded one transaction at a time
+            {"$set": bucket, "$unset": {"transaction_ids": ""}},
+            upsert=True,
+        ))
+    if not writes:
+        return
+    try:
+        db[AGGREGATES_COLLECTION].bulk_write(writes, ordered=False)
+    except BulkWriteError as e:
+        # A duplicate key means the stored bucket already counts more transactions
+        if any(error.get("code") != DUPLICATE_KEY_ERROR for error in e.details.get("writeErrors", [])):
+            raise
+
+
+def _day_range_match(customer_ids: list, first_day: datetime, last_day: datetime) -> dict:
+    return {
+        "customer_id": customer_ids[0] if len(customer_ids) == 1 else {"$in": customer_ids},
+        "transaction_date": {"$gte": first_day, "$lt": last_day + timedelta(days=1)},
+    }
+
+
+def _missing_ranges(coverage: dict, first_day: datetime, last_day: datetime) -> list:
+    built_from, built_until = (coverage or {}).get("built_from"), (coverage or {}).get("built_until")
+    if built_from is None:
+        return [(first_day, last_day)]
+    missing = []
+    if first_day < built_from:
+        missing.append((first_day, built_from - timedelta(days=1)))
+    if last_day > built_until:
+        missing.append((built_until + timedelta(days=1), last_day))
+    return missing
+
+
+def _empty_aggregate(customer_id: str, window_start: datetime, window_end: datetime = None) -> dict:
+    return {
+        "customer_id": customer_id,
+        "window_start": window_start,
+        "window_end": window_end,
+        "spend_by_category": defaultdict(float),
+        "transaction_count": 0,
+        "amount_sum": 0.0,
+        "debit_count": 0,
+        "credit_count": 0,
+    }
+
+
+def _add_bucket(aggregate: dict, bucket: dict):
+    for category, spend in bucket.get("spend_by_category", {}).items():
+        aggregate["spend_by_category"][category] += spend
+    for field in ("transaction_count", "amount_sum", "debit_count", "credit_count"):
+        aggregate[field] += bucket.get(field, 0)
+    # Left unset on an empty window, as the prompt summary expects
+    if "max_amount" in bucket:
+        aggregate["max_amount"] = max(aggregate.get("max_amount", bucket["max_amount"]), bucket["max_amount"])
+    if "min_balance" in bucket:
+        aggregate["min_balance"] = min(aggregate.get("min_balance", bucket["min_balance"]), bucket["min_balance"])
+
+
+def get_customer_aggregates(db, customer_ids: list, window_start: datetime, window_end: datetime = None) -> dict:
+    """
+    Aggregate the processed transactions of several customers over a window
+    (whole days, up to today when window_end is None) by combining their day
+    buckets. The buckets and the customers' coverage documents are read with
+    one query. Days a customer's coverage does not include yet are built
+    first, with one pipeline per distinct missing range, and read again.
+    :return: {customer_id: aggregate}
+    """
+    customer_ids = list(dict.fromkeys(customer_ids))
+    if not customer_ids:
+        return {}
+    first_day = _day(window_start)
+    last_day = _day(window_end or datetime.utcnow())
+    aggregates_coll = db[AGGREGATES_COLLECTION]
+
+    def read_buckets(ids: list, with_coverage: bool):
+        ranges = [{"day": {"$gte": first_day, "$lte": last_day}}]
+        if with_coverage:
+            ranges.append({"_id": {"$in": [coverage_id(customer_id) for customer_id in ids]}})
+        return aggregates_coll.find(
+            {"customer_id": {"$in": ids}, "$or": ranges},
+            {"transaction_ids": 0, "updated_at": 0},
+        )
+
+    buckets, coverages = defaultdict(list), {}
+    for doc in read_buckets(customer_ids, True):
+        if doc["_id"] == coverage_id(doc["customer_id"]):
+            coverages[doc["customer_id"]] = doc
+        else:
+            buckets[doc["customer_id"]].append(doc)
+
+    customers_by_range = defaultdict(list)
+    for customer_id in customer_ids:
+        for missing in _missing_ranges(coverages.get(customer_id), first_day, last_day):
+            customers_by_range[missing].append(customer_id)
+    if customers_by_range:
+        _build_buckets(db, [
+            _day_range_match(ids, start, end) for (start, end), ids in customers_by_range.items()
+        ])
+        stale = sorted({customer_id for ids in customers_by_range.values() for customer_id in ids})
+        aggregates_coll.bulk_write([
+            UpdateOne(
+                {"_id": coverage_id(customer_id)},
+                {
+                    "$min": {"built_from": first_day},
+                    "$max": {"built_until": last_day},
+                    "$set": {"customer_id": customer_id, "updated_at": datetime.utcnow()},
+                },
+                upsert=True,
+            )
+            for customer_id in stale
+        ], ordered=False)
+        for customer_id in stale:
+            buckets.pop(customer_id, None)
+        for doc in read_buckets(stale, False):
+            buckets[doc["customer_id"]].append(doc)
+
+    aggregates = {}
+    for customer_id in customer_ids:
+        aggregate = _empty_aggregate(customer_id, window_start, window_end)
+        for bucket in buckets.get(customer_id, []):
+            _add_bucket(aggregate, bucket)
+        aggregate["spend_by_category"] = dict(aggregate["spend_by_category"])
+        aggregates[customer_id] = aggregate
+    return aggregates
+
+
+def get_customer_aggregate(db, customer_id: str, window_start: datetime, window_end: datetime = None) -> dict:
+    """
+    Aggregate one customer's processed transactions over a window
+    (see get_customer_aggregates()).
+    """
+    return get_customer_aggregates(db, [customer_id], window_start, window_end)[customer_id]
+
+
+def apply_processed_transactions(db, transactions: list):
+    """
+    Rebuild the day buckets of newly processed transactions (each needs
+    customer_id and transaction_date), so the aggregates stay in step with
+    the processed flag.
+    """
+    customers_by_day = defaultdict(set)
+    for tx in transactions:
+        customers_by_day[_day(tx["transaction_date"])].add(tx["customer_id"])
+    _build_buckets(db, [
+        _day_range_match(sorted(ids), day, day) for day, ids in sorted(customers_by_day.items())
+    ])
+
+
+def format_aggregate_summary(aggregate: dict) -> str:
+    """
+    Render an aggregate as a compact prompt section.
+    """
+    count = aggregate["transaction_count"]
+    mean_amount = aggregate["amount_sum"] / count if count else 0.0
+    spend_lines = [
+        f"  {category}: {spend:.2f}"
+        for category, spend in sorted(aggregate["spend_by_category"].items(), key=lambda item: -item[1])
+    ]
+    return "\n".join([
+        f"Transaction summary ({count} transactions):",
+        f"Debits: {aggregate['debit_count']}, Credits: {aggregate['credit_count']}",
+        f"Max Amount: {aggregate.get('max_amount')}, Mean Amount: {mean_amount:.2f}",
+        f"Minimum Balance After Transaction: {aggregate.get('min_balance')}",
+        "Spend by Merchant Category:",
+        *spend_lines,
+    ])
@@ -0,0 +1,117 @@
+# src/services/fallback_ranker.py
+
+import re
+import math
+from collections import Counter, defaultdict
+
+from services.catalog_cache import get_catalog_cache
+
+FALLBACK_SOURCE = "fallback_ranker"
+# Products returned by the fallback ranking
+FALLBACK_MAX_PRODUCTS = 5
+
+_TOKEN_RE = re.compile(r"[a-z]+")
+_STOPWORDS = {
+    "and", "the", "for", "with", "your", "you", "our", "are", "from", "that", "this", "all", "any",
+    "can", "has", "have", "not", "per", "who", "into", "over", "more", "than", "its", "their", "age",
+    "transaction", "transactions", "payment", "purchase",
+}
+
+
+def _stem(token: str) -> str:
+    if token.endswith("ies") and len(token) > 4:
+        return token[:-3] + "y"
+    if token.endswith("s") and not token.endswith("ss") and len(token) > 3:
+        return token[:-1]
+    return token
+
+
+def tokenize(text) -> list:
+    return [
+        _stem(token) for token in _TOKEN_RE.findall(str(text or "").lower())
+        if len(token) > 2 and token not in _STOPWORDS
+    ]
+
+
+def _normalize(vector: dict) -> dict:
+    norm = math.sqrt(sum(weight * weight for weight in vector.values()))
+    return {term: weight / norm for term, weight in vector.items()} if norm else {}
+
+
+def build_product_index(products: list) -> dict:
+    """
+    TF-IDF vectors of a segment's products over their name, type, description
+    and eligibility criteria. Built once per catalog version (see CatalogCache.get_derived).
+    """
+    documents = {
+        product["product_id"]: Counter(tokenize(" ".join(str(product.get(field) or "") for field in (
+            "product_name", "product_type", "description", "eligibility_criteria"
+        ))))
+        for product in products
+    }
+    document_frequency = Counter(term for terms in documents.values() for term in terms)
+    idf = {term: math.log((1 + len(documents)) / (1 + df)) + 1 for term, df in document_frequency.items()}
+    vectors = {
+        product_id: _normalize({term: (1 + math.log(count)) * idf[term] for term, count in terms.items()})
+        for product_id, terms in documents.items()
+    }
+    return {"idf": idf, "vectors": vectors}
+
+
+def _query_vector(customer: dict, transactions, spend_by_category: dict, idf: dict) -> dict:
+    """
+    Weighted terms describing the customer: interests, merchant categories
+    (weighted by their share of spend) and transaction descriptions.
+    """
+    weights = defaultdict(float)
+    for interest in customer.get("interests") or []:
+        for term in tokenize(interest):
+            weights[term] += 1.0
+
+    spend = defaultdict(float, spend_by_category or {})
+    for tx in transactions:
+        spend[tx.get("merchant_category")] += abs(float(tx.get("amount") or 0))
+        for term in set(tokenize(tx.get("description"))):
+            weights[term] += 0.25
+    total_spend = sum(spend.values())
+    for category, amount in spend.items():
+        for term in tokenize(category):
+            weights[term] += 0.5 + (amount / total_spend if total_spend else 0.0)
+
+    return _normalize({term: weight * idf[term] for term, weight in weights.items() if term in idf})
+
+
+def rank_products_fallback(customer: dict, transactions, eligible_products: list, segment_id: str,
+                           spend_by_category: dict = None, max_products: int = None) -> list:
+    """
+    Deterministic local ranking used when the LLM is unavailable or too slow:
+    cosine similarity between the customer's TF-IDF query vector and each
+    eligible product's vector, ties broken by product_id. The output has the
+    same shape as the LLM's valid_products, marked with "source".
+    """
+    max_products = max_products or FALLBACK_MAX_PRODUCTS
+    index = get_catalog_cache().get_derived(segment_id, "tfidf", build_product_index)
+    query = _query_vector(customer, list(transactions), spend_by_category, index["idf"])
+
+    scored = []
+    for product in eligible_products:
+        vector = index["vectors"].get(product["product_id"], {})
+        matched = sorted((term for term in query if term in vector), key=lambda t: -query[t] * vector[t])
+        score = sum(query[term] * vector[term] for term in matched)
+        scored.append((score, product, matched))
+    scored.sort(key=lambda item: (-item[0], item[1]["product_id"]))
+
+    return [
+        {
+            "product_id": product["product_id"],
+            "product_name": product.get("product_name"),
+            "reason": (
+                f"Matches the customer's activity on: {', '.join(matched[:3])}" if matched
+                else "No direct match; listed as an eligible product of the customer's segment"
+            ),
+            "priority": priority,
+            "score": round(score, 4),
+            "source": FALLBACK_SOURCE,
+        }
+        for priority, (score, product, matched) in enumerate(scored[:max_products], start=1)
+    ]
@@ -0,0 +1,238 @@
+# src/services/job_service.py
+
+import os
+import json
+import uuid
+import socket
+import sqlite3
+import threading
+import logging
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+JOBS_DB_PATH = os.getenv("JOBS_DB_PATH", "jobs.sqlite3")
+JOBS_MAX_WORKERS = int(os.getenv("JOBS_MAX_WORKERS", "2"))
+JOBS_MAX_QUEUE = int(os.getenv("JOBS_MAX_QUEUE", "20"))
+# Queued/running jobs whose process stops renewing their lease for this long are marked failed
+JOBS_LEASE_SECONDS = float(os.getenv("JOBS_LEASE_SECONDS", "60"))
+
+STATUS_QUEUED = "queued"
+STATUS_RUNNING = "running"
+STATUS_SUCCEEDED = "succeeded"
+STATUS_FAILED = "failed"
+
+LOST_JOB_ERROR = "Job lost: the worker process running it stopped"
+
+
+class JobQueueFullError(Exception):
+    """
+    Raised when the job queue already holds JOBS_MAX_QUEUE pending/running jobs.
+    """
+
+
+def _now() -> str:
+    return datetime.utcnow().isoformat(timespec="microseconds")
+
+
+def _lease_until(lease_seconds: float) -> str:
+    return (datetime.utcnow() + timedelta(seconds=lease_seconds)).isoformat(timespec="microseconds")
+
+
+class JobStore:
+    """
+    SQLite-backed persistence for job status, progress and results, so any
+    worker process on the host can answer status polls.
+    Unfinished jobs carry the owner process and a lease it keeps renewing;
+    a job whose lease has expired is marked failed, since its process died.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " job_id TEXT PRIMARY KEY, kind TEXT NOT NULL, status TEXT NOT NULL,"
+            " params TEXT, progress TEXT, result TEXT, error TEXT,"
+            " created_at TEXT NOT NULL, started_at TEXT, finished_at TEXT,"
+            " owner TEXT, lease_expires_at TEXT)"
+        )
+        # Job tables created before leases existed
+        columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+        for column in ("owner", "lease_expires_at"):
+            if column not in columns:
+                conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} TEXT")
+        conn.commit()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def create(self, kind: str, params: dict, owner: str = None, lease_seconds: float = None) -> str:
+        job_id = str(uuid.uuid4())
+        lease_seconds = JOBS_LEASE_SECONDS if lease_seconds is None else lease_seconds
+        conn = self._conn()
+        conn.execute(
+            "INSERT INTO jobs (job_id, kind, status, params, created_at, owner, lease_expires_at)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (job_id, kind, STATUS_QUEUED, json.dumps(params), _now(), owner, _lease_until(lease_seconds)),
+        )
+        conn.commit()
+        return job_id
+
+    def update(self, job_id: str, **fields):
+        for key in ("params", "progress", "result"):
+            if key in fields:
+                fields[key] = json.dumps(fields[key], default=str)
+        columns = ", ".join(f"{key} = ?" for key in fields)
+        conn = self._conn()
+        conn.execute(f"UPDATE jobs SET {columns} WHERE job_id = ?", (*fields.values(), job_id))
+        conn.commit()
+
+    def renew_leases(self, owner: str, lease_seconds: float = None) -> int:
+        """
+        Extend the lease of every unfinished job of owner.
+        :return: number of jobs renewed
+        """
+        lease_seconds = JOBS_LEASE_SECONDS if lease_seconds is None else lease_seconds
+        conn = self._conn()
+        cursor = conn.execute(
+            "UPDATE jobs SET lease_expires_at = ? WHERE owner = ? AND status IN (?, ?)",
+            (_lease_until(lease_seconds), owner, STATUS_QUEUED, STATUS_RUNNING),
+        )
+        conn.commit()
+        return cursor.rowcount
+
+    def fail_expired(self, job_id: str = None) -> int:
+        """
+        Mark unfinished jobs whose lease has expired (all of them, or only
+        job_id) as failed. Jobs without a lease predate leases and are
+        treated as expired.
+        :return: number of jobs marked failed
+        """
+        query = (
+            "UPDATE jobs SET status = ?, error = ?, finished_at = ?"
+            " WHERE status IN (?, ?) AND (lease_expires_at IS NULL OR lease_expires_at < ?)"
+        )
+        now = _now()
+        args = [STATUS_FAILED, LOST_JOB_ERROR, now, STATUS_QUEUED, STATUS_RUNNING, now]
+        if job_id is not None:
+            query += " AND job_id = ?"
+            args.append(job_id)
+        conn = self._conn()
+        cursor = conn.execute(query, args)
+        conn.commit()
+        if cursor.rowcount:
+            logger.warning(f"Marked {cursor.rowcount} lost job(s) as failed")
+        return cursor.rowcount
+
+    def get(self, job_id: str):
+        self.fail_expired(job_id)
+        row = self._conn().execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        for key in ("params", "progress", "result"):
+            if job[key] is not None:
+                job[key] = json.loads(job[key])
+        return job
+
+
+class JobManager:
+    """
+    Run jobs on a bounded background thread pool. At most max_queue jobs may
+    be queued or running at once; further submissions are rejected.
+    A heartbeat thread renews the leases of this manager's unfinished jobs.
+    On start, jobs lost by a previous process are marked failed.
+    """
+
+    def __init__(self, store: JobStore, max_workers: int, max_queue: int, lease_seconds: float = None):
+        self.store = store
+        self.lease_seconds = JOBS_LEASE_SECONDS if lease_seconds is None else lease_seconds
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._slots = threading.BoundedSemaphore(max_queue)
+        self._stopped = threading.Event()
+
+        self.store.fail_expired()
+        self._heartbeat = threading.Thread(target=self._renew_leases, name="job-heartbeat", daemon=True)
+        self._heartbeat.start()
+
+    def _renew_leases(self):
+        while not self._stopped.wait(self.lease_seconds / 3):
+            try:
+                self.store.renew_leases(self.owner, self.lease_seconds)
+            except Exception:
+                logger.exception("Failed to renew job leases")
+
+    def submit(self, kind: str, fn, params: dict) -> str:
+        """
+        Queue fn(**params, progress=callback) and return the job id.
+        fn's return value is stored as the job result; a dict with an
+        "error" key marks the job as failed.
+        """
+        if not self._slots.acquire(blocking=False):
+            raise JobQueueFullError("Too many jobs in progress, try again later")
+        try:
+            job_id = self.store.create(kind, params, self.owner, self.lease_seconds)
+            self._executor.submit(self._run, job_id, fn, params)
+        except Exception:
+            self._slots.release()
+            raise
+        return job_id
+
+    def _run(self, job_id: str, fn, params: dict):
+        try:
+            self.store.update(job_id, status=STATUS_RUNNING, started_at=_now())
+
+            def report_progress(progress: dict):
+                self.store.update(job_id, progress=progress)
+
+            result = fn(**params, progress=report_progress)
+            failed = isinstance(result, dict) and "error" in result
+            self.store.update(
+                job_id,
+                status=STATUS_FAILED if failed else STATUS_SUCCEEDED,
+                result=result,
+                error=result.get("error") if failed else None,
+                finished_at=_now(),
+            )
+        except Exception as e:
+            logger.exception(f"Job {job_id} failed")
+            self.store.update(job_id, status=STATUS_FAILED, error=str(e), finished_at=_now())
+        finally:
+            self._slots.release()
+
+    def get(self, job_id: str):
+        return self.store.get(job_id)
+
+    def shutdown(self):
+        self._stopped.set()
+        self._executor.shutdown(wait=False)
+
+
+_job_manager = None
+_job_manager_pid = None
+_job_manager_lock = threading.Lock()
+
+
+def get_job_manager() -> JobManager:
+    """
+    Return the per-process job manager (its threads, semaphore and SQLite
+    connections do not survive a fork).
+    """
+    global _job_manager, _job_manager_pid
+    pid = os.getpid()
+    if _job_manager is None or _job_manager_pid != pid:
+        with _job_manager_lock:
+            if _job_manager is None or _job_manager_pid != pid:
+                _job_manager = JobManager(JobStore(JOBS_DB_PATH), JOBS_MAX_WORKERS, JOBS_MAX_QUEUE)
+                _job_manager_pid = pid
+    return _job_manager
@@ -0,0 +1,133 @@
+# src/services/recommendation_store.py
+
+import os
+import json
+import hashlib
+import logging
+from datetime import datetime, timedelta
+from pymongo import ASCENDING, DESCENDING, UpdateOne
+
+from utils.db_utils import get_database
+
+logger = logging.getLogger(__name__)
+
+RECOMMENDATIONS_COLLECTION = "recommendations"
+# Stored recommendations older than this are regenerated even if inputs are unchanged (0 = never)
+RECOMMENDATION_MAX_AGE_SECONDS = int(os.getenv("RECOMMENDATION_MAX_AGE_SECONDS", "1209600"))
+
+# Customers in turn, newest first: the key order of the customer_latest index,
+# so a page of customers is read from the index without an in-memory sort
+LATEST_PER_CUSTOMER_SORT = [("customer_id", ASCENDING), ("created_at", DESCENDING)]
+
+RECOMMENDATION_PROJECTION = {
+    "_id": 0,
+    "customer_id": 1,
+    "run_id": 1,
+    "source": 1,
+    "valid_products": 1,
+    "model": 1,
+    "prompt_hash": 1,
+    "input_hash": 1,
+    "window_start": 1,
+    "window_end": 1,
+    "created_at": 1,
+    "updated_at": 1,
+}
+
+
+def compute_input_hash(customer: dict, transactions, eligible_products, window_start: datetime,
+                       window_end: datetime = None, transaction_summary: str = None) -> str:
+    """
+    SHA-256 over everything a customer's ranking depends on: profile, window,
+    transactions (or their aggregate summary) and eligible products.
+    """
+    payload = {
+        "segment_id": customer.get("segment_id"),
+        "product_ids": sorted(customer.get("product_ids") or []),
+        "interests": list(customer.get("interests") or []),
+        "credit_score": customer.get("credit_score"),
+        "window": [window_start.isoformat(), window_end.isoformat() if window_end else None],
+        "transactions": transaction_summary or sorted(
+            [tx["transaction_id"], tx["amount"], tx["balance_after_transaction"]] for tx in transactions
+        ),
+        "products": sorted(
+            [pd["product_id"], pd.get("product_name"), pd.get("description"), pd.get("eligibility_criteria")]
+            for pd in eligible_products
+        ),
+    }
+    encoded = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def is_fresh(recommendation: dict, input_hash: str, model: str) -> bool:
+    """
+    A stored recommendation can be served instead of regenerating it when it
+    succeeded, was produced by the same model from the same inputs, and is
+    not older than RECOMMENDATION_MAX_AGE_SECONDS.
+    """
+    if not recommendation or recommendation.get("error"):
+        return False
+    if recommendation.get("input_hash") != input_hash or recommendation.get("model") != model:
+        return False
+    if RECOMMENDATION_MAX_AGE_SECONDS:
+        max_age = timedelta(seconds=RECOMMENDATION_MAX_AGE_SECONDS)
+        return datetime.utcnow() - recommendation["created_at"] < max_age
+    return True
+
+
+def recommendation_write(record: dict) -> UpdateOne:
+    """
+    Upsert of one recommendation record keyed on (customer_id, run_id).
+    """
+    now = datetime.utcnow()
+    return UpdateOne(
+        {"customer_id": record["customer_id"], "run_id": record["run_id"]},
+        {"$set": {**record, "updated_at": now}, "$setOnInsert": {"created_at": now}},
+        upsert=True,
+    )
+
+
+def save_recommendations(db, records: list):
+    """
+    Store recommendation records with one unordered bulk_write.
+    """
+    if records:
+        db[RECOMMENDATIONS_COLLECTION].bulk_write([recommendation_write(r) for r in records], ordered=False)
+
+
+def _window_filter(window_start: datetime, window_end: datetime = None) -> dict:
+    return {"window_start": window_start, "window_end": window_end}
+
+
+def load_latest_recommendations(db, customer_ids: list, window_start: datetime, window_end: datetime = None) -> dict:
+    """
+    Latest successful recommendation per customer for a window, in one query.
+    :return: dict of customer_id -> recommendation
+    """
+    latest = {}
+    cursor = db[RECOMMENDATIONS_COLLECTION].find(
+        {"customer_id": {"$in": customer_ids}, "error": None, **_window_filter(window_start, window_end)},
+        RECOMMENDATION_PROJECTION,
+    ).sort(LATEST_PER_CUSTOMER_SORT)
+    for recommendation in cursor:
+        latest.setdefault(recommendation["customer_id"], recommendation)
+    return latest
+
+
+def get_latest_recommendation(db, customer_id: str, window_start: datetime = None, window_end: datetime = None):
+    """
+    Latest successful recommendation of a customer, for a specific window if given.
+    """
+    query = {"customer_id": customer_id, "error": None}
+    if window_start is not None:
+        query.update(_window_filter(window_start, window_end))
+    return db[RECOMMENDATIONS_COLLECTION].find_one(
+        query, RECOMMENDATION_PROJECTION, sort=[("created_at", DESCENDING)]
+    )
+
+
+def fetch_latest_recommendation(customer_id: str):
+    """
+    Serve the latest stored recommendation of a customer (indexed lookup, no LLM call).
+    """
+    return get_latest_recommendation(get_database(), customer_id)
@@ -0,0 +1,172 @@
+# src/services/transaction_claims.py
+
+import os
+import uuid
+import socket
+import logging
+from datetime import datetime, timedelta
+from pymongo import ASCENDING
+
+logger = logging.getLogger(__name__)
+
+# How long a worker may hold claimed rows before others can take them over;
+# workers renew the lease while their LLM calls are still running
+CLAIM_LEASE_SECONDS = int(os.getenv("CLAIM_LEASE_SECONDS", "900"))
+CLAIM_BATCH_SIZE = int(os.getenv("CLAIM_BATCH_SIZE", "500"))
+
+# processing_status of a transaction: pending -> claimed -> done
+STATUS_PENDING = "pending"
+STATUS_CLAIMED = "claimed"
+STATUS_DONE = "done"
+
+# verdict of a done transaction; is_processed_for_recommendation is True only for "valid"
+VERDICT_VALID = "valid"
+VERDICT_REJECTED = "rejected"
+
+
+def default_claim_owner() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def claimable_filter(now: datetime = None) -> dict:
+    """
+    Rows nobody holds: pending, claimed under an expired lease, or rows
+    loaded before the claim protocol that were never flagged.
+    """
+    now = now or datetime.utcnow()
+    return {"$or": [
+        {"processing_status": STATUS_PENDING},
+        {"processing_status": STATUS_CLAIMED, "claim_expires_at": {"$lt": now}},
+        {"processing_status": None, "is_processed_for_recommendation": False},
+    ]}
+
+
+def claim_transactions(db, base_query: dict, projection: dict, owner: str = None, limit: int = None,
+                       lease_seconds: int = None):
+    """
+    Claim up to limit claimable transactions matching base_query for owner.
+    Candidates are picked in (transaction_date, _id) order and claimed with a
+    single update_many guarded by the claimable filter, so rows taken by a
+    concurrent worker in between are skipped. The rows actually won are
+    read back by their claim token.
+    :return: (claim_token, claimed transactions)
+    """
+    owner = owner or default_claim_owner()
+    limit = limit or CLAIM_BATCH_SIZE
+    lease_seconds = lease_seconds or CLAIM_LEASE_SECONDS
+    transactions_coll = db["transactions"]
+
+    now = datetime.utcnow()
+    claimable = {"$and": [base_query, claimable_filter(now)]}
+    candidate_ids = [
+        doc["_id"] for doc in transactions_coll.find(claimable, {"_id": 1})
+        .sort([("transaction_date", ASCENDING), ("_id", ASCENDING)])
+        .limit(limit)
+    ]
+    if not candidate_ids:
+        return None, []
+
+    claim_token = uuid.uuid4().hex
+    transactions_coll.update_many(
+        {"$and": [{"_id": {"$in": candidate_ids}}, claimable_filter(now)]},
+        {"$set": {
+            "processing_status": STATUS_CLAIMED,
+            "claim_owner": owner,
+            "claim_token": claim_token,
+            "claim_expires_at": now + timedelta(seconds=lease_seconds),
+            "updated_at": now,
+        }},
+    )
+    claimed = list(transactions_coll.find({"claim_token": claim_token}, projection))
+    if len(claimed) < len(candidate_ids):
+        logger.info(f"{owner}: claimed {len(claimed)} of {len(candidate_ids)} candidates, the rest were taken")
+    return claim_token, claimed
+
+
+def renew_claim(db, claim_token: str, lease_seconds: int = None) -> int:
+    """
+    Extend the lease of every row still held under claim_token, so rows
+    whose analysis outlives CLAIM_LEASE_SECONDS are not taken over.
+    :return: number of rows renewed
+    """
+    now = datetime.utcnow()
+    lease_seconds = lease_seconds or CLAIM_LEASE_SECONDS
+    return db["transactions"].update_many(
+        {"claim_token": claim_token, "processing_status": STATUS_CLAIMED},
+        {"$set": {"claim_expires_at": now + timedelta(seconds=lease_seconds), "updated_at": now}},
+    ).modified_count
+
+
+def mark_claimed_valid(db, claim_token: str, transaction_ids) -> list:
+    """
+    Mark the given rows still held under claim_token as done/valid
+    (is_processed_for_recommendation = True) without settling the rest of
+    the claim, e.g. while the LLM is still answering for the other rows.
+    Rows whose lease was taken over are left alone; the rows actually
+    marked are read back by the claim token recorded on them.
+    :return: transaction IDs of the rows marked
+    """
+    transaction_ids = list(transaction_ids)
+    if not transaction_ids:
+        return []
+    transactions_coll = db["transactions"]
+    now = datetime.utcnow()
+    modified = transactions_coll.update_many(
+        {"claim_token": claim_token, "transaction_id": {"$in": transaction_ids}},
+        {
+            "$set": {
+                "processing_status": STATUS_DONE,
+                "verdict": VERDICT_VALID,
+                "verdict_claim_token": claim_token,
+                "is_processed_for_recommendation": True,
+                "processed_at": now,
+                "updated_at": now,
+            },
+            "$unset": {"claim_token": "", "claim_expires_at": ""},
+        },
+    ).modified_count
+    if not modified:
+        return []
+    return [
+        doc["transaction_id"] for doc in transactions_coll.find(
+            {"transaction_id": {"$in": transaction_ids}, "verdict_claim_token": claim_token},
+            {"_id": 0, "transaction_id": 1},
+        )
+    ]
+
+
+def complete_claim(db, claim_token: str, valid_transaction_ids) -> dict:
+    """
+    Mark the rows still held under claim_token as done: the given IDs as
+    valid (is_processed_for_recommendation = True), all others as rejected.
+    :return: {"valid": n, "rejected": n}
+    """
+    transactions_coll = db["transactions"]
+    now = datetime.utcnow()
+    done = {"processing_status": STATUS_DONE, "processed_at": now, "updated_at": now}
+    unset = {"claim_token": "", "claim_expires_at": ""}
+
+    valid = len(mark_claimed_valid(db, claim_token, valid_transaction_ids))
+    rejected = transactions_coll.update_many(
+        {"claim_token": claim_token},
+        {"$set": {**done, "verdict": VERDICT_REJECTED}, "$unset": unset},
+    ).modified_count
+    return {"valid": valid, "rejected": rejected}
+
+
+def release_claim(db, claim_token: str, transaction_ids=None) -> int:
+    """
+    Return rows held under claim_token to pending (all of them, or only
+    transaction_ids), e.g. when their LLM chunk failed.
+    :return: number of released rows
+    """
+    query = {"claim_token": claim_token}
+    if transaction_ids is not None:
+        query["transaction_id"] = {"$in": list(transaction_ids)}
+    return db["transactions"].update_many(
+        query,
+        {
+            "$set": {"processing_status": STATUS_PENDING, "updated_at": datetime.utcnow()},
+            "$unset": {"claim_owner": "", "claim_token": "", "claim_expires_at": ""},
+        },
+    ).modified_count
@@ -0,0 +1,131 @@
+# src/services/transaction_prefilter.py
+
+import os
+import json
+import logging
+import threading
+import numpy as np
+
+from utils.metrics import count_prefilter_rows
+
+logger = logging.getLogger(__name__)
+
+# Optional JSON file overriding (key by key) the default rules below
+PREFILTER_RULES_PATH = os.getenv("PREFILTER_RULES_PATH")
+PREFILTER_ENABLED = os.getenv("PREFILTER_ENABLED", "true").lower() == "true"
+
+DEFAULT_PREFILTER_RULES = {
+    # Rows below this amount are never worth a recommendation
+    "min_amount": 50.0,
+    # Routine categories: rows below the category threshold are dropped
+    "routine_category_max_amount": {
+        "Groceries": 300.0,
+        "Dining": 200.0,
+        "Utilities": 500.0,
+        "Subscription": 200.0,
+        "Supplies": 500.0,
+        "Online Shopping": 200.0,
+        "Refund": 1000.0,
+    },
+    # Categories that are clearly recommendable at or above the threshold
+    "auto_accept_category_min_amount": {
+        "Travel": 2000.0,
+        "Real Estate": 25000.0,
+        "Equipment Purchase": 20000.0,
+        "Project Investment": 25000.0,
+    },
+    # Categories always sent to the LLM, whatever the amount
+    "allowlist_categories": ["Insurance", "Loan EMI", "Treasury"],
+    # A low balance after the transaction can signal credit/overdraft needs, keep those rows
+    "low_balance_threshold": 500.0,
+}
+
+
+def load_prefilter_rules(path: str = None) -> dict:
+    """
+    Return the default rules, overridden by the JSON file at path if given.
+    """
+    rules = json.loads(json.dumps(DEFAULT_PREFILTER_RULES))
+    path = path or PREFILTER_RULES_PATH
+    if path:
+        with open(path, encoding="utf-8") as f:
+            rules.update(json.load(f))
+    return rules
+
+
+_stats_lock = threading.Lock()
+_stats = {"rows_in": 0, "rows_dropped": 0, "rows_auto_accepted": 0, "rows_to_llm": 0}
+
+
+def get_prefilter_stats() -> dict:
+    """
+    Cumulative row counts for this process.
+    """
+    with _stats_lock:
+        return {"enabled": PREFILTER_ENABLED, **_stats}
+
+
+def _category_threshold(categories, thresholds: dict, default: float):
+    return np.array([thresholds.get(category, default) for category in categories], dtype=float)
+
+
+def prefilter_transactions(transactions: list, rules: dict = None) -> dict:
+    """
+    Split transactions into obvious drops, obvious recommendable rows and
+    ambiguous rows that still need the LLM, using vectorized threshold rules
+    on amount, balance_after_transaction and merchant_category.
+    :return: {
+        "accepted": [ {"transaction_id", "reason"} ... ]  (same shape as the LLM output),
+        "ambiguous": [transactions to send to the LLM],
+        "stats": {"rows_in", "rows_dropped", "rows_auto_accepted", "rows_to_llm"}
+    }
+    """
+    if not PREFILTER_ENABLED and rules is None:
+        stats = {"rows_in": len(transactions), "rows_dropped": 0, "rows_auto_accepted": 0,
+                 "rows_to_llm": len(transactions)}
+        return {"accepted": [], "ambiguous": list(transactions), "stats": stats}
+
+    rules = rules or load_prefilter_rules()
+    if not transactions:
+        return {"accepted": [], "ambiguous": [],
+                "stats": {"rows_in": 0, "rows_dropped": 0, "rows_auto_accepted": 0, "rows_to_llm": 0}}
+
+    amounts = np.array([float(tx["amount"]) for tx in transactions], dtype=float)
+    balances = np.array([float(tx["balance_after_transaction"]) for tx in transactions], dtype=float)
+    categories = [tx["merchant_category"] for tx in transactions]
+
+    routine_max = _category_threshold(categories, rules["routine_category_max_amount"], -np.inf)
+    accept_min = _category_threshold(categories, rules["auto_accept_category_min_amount"], np.inf)
+    allowlisted = np.isin(np.array(categories, dtype=object), list(rules["allowlist_categories"]))
+    low_balance = balances < rules["low_balance_threshold"]
+
+    keep = allowlisted | low_balance
+    dropped = ~keep & ((amounts < rules["min_amount"]) | (amounts < routine_max))
+    accepted = ~dropped & ~allowlisted & (amounts >= accept_min)
+    ambiguous = ~dropped & ~accepted
+
+    accepted_items = [
+        {
+            "transaction_id": transactions[i]["transaction_id"],
+            "reason": f"Rule: {categories[i]} transaction of {amounts[i]:.2f} meets the auto-accept threshold",
+        }
+        for i in np.flatnonzero(accepted)
+    ]
+    ambiguous_txs = [transactions[i] for i in np.flatnonzero(ambiguous)]
+
+    stats = {
+        "rows_in": len(transactions),
+        "rows_dropped": int(dropped.sum()),
+        "rows_auto_accepted": int(accepted.sum()),
+        "rows_to_llm": int(ambiguous.sum()),
+    }
+    with _stats_lock:
+        for key, value in stats.items():
+            _stats[key] += value
+    count_prefilter_rows(stats)
+
+    logger.info(
+        f"Prefilter: {stats['rows_in']} rows, {stats['rows_dropped']} dropped, "
+        f"{stats['rows_auto_accepted']} auto-accepted, {stats['rows_to_llm']} sent to LLM"
+    )
+    return {"accepted": accepted_items, "ambiguous": ambiguous_txs, "stats": stats}
@@ -1,79 +1,240 @@
 # src/services/transaction_service.py
 
+import os
 import json
-from datetime import datetime
-from pymongo import MongoClient
-from utils.db_utils import get_database
-from utils.openai_util import get_openai_client
-from datetime import datetime, timedelta, timezone
+import uuid
+import time
+import base64
 from bson import ObjectId
+from pymongo import ASCENDING
+from utils.db_utils import get_database
+from utils.openai_util import RETRYABLE_STATUS_CODES, LLMHTTPError, get_llm_client
+from utils.circuit_breaker import BreakerCall, get_circuit_breaker
+from utils.llm_batch import LLM_CHUNK_MAX_TOKENS, chunk_by_tokens, estimate_tokens, stream_chunks_concurrently
+from utils.llm_cache import get_llm_cache, make_cache_key
+from utils.metrics import count_cache, observe_first_item, observe_tokens, pipeline, propagate_context, stage
+from utils.json_provider import StreamingArrayParser, parse_completion_json
+from utils.model_routing import (
+    LLM_ESCALATION_CONFIDENCE,
+    LLM_MODEL,
+    ROUTE_DEFAULT,
+    ROUTE_ESCALATION,
+    ROUTE_RANKING,
+    ROUTE_TRIAGE,
+    model_for,
+    record_escalation,
+    record_llm_call,
+    should_escalate,
+)
+from utils.prompt_builder import PROMPT_MAX_TOKENS, PromptBuilder
+from utils.singleflight import SingleFlightError, SingleFlightTimeoutError, coalesce
+from services.transaction_prefilter import prefilter_transactions
+from services.catalog_cache import get_catalog_cache
+from services.transaction_claims import (
+    CLAIM_LEASE_SECONDS,
+    STATUS_DONE,
+    claim_transactions,
+    complete_claim,
+    mark_claimed_valid,
+    release_claim,
+    renew_claim,
+)
+from services.fallback_ranker import rank_products_fallback
+from services.recommendation_store import compute_input_hash, get_latest_recommendation, is_fresh, save_recommendations
+from services.customer_aggregates import (
+    AGGREGATE_SUMMARY_THRESHOLD,
+    apply_processed_transactions,
+    format_aggregate_summary,
+    get_customer_aggregate,
+)
+from datetime import datetime, timedelta
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 
-def fetch_transactions_by_date(date_str: str):
+logger = logging.getLogger(__name__)
+
+# Keyset pagination for the fetch endpoint
+FETCH_PAGE_SIZE = int(os.getenv("FETCH_PAGE_SIZE", "500"))
+FETCH_MAX_PAGE_SIZE = int(os.getenv("FETCH_MAX_PAGE_SIZE", "5000"))
+FETCH_BATCH_SIZE = int(os.getenv("FETCH_BATCH_SIZE", "500"))
+
+LLM_TEMPERATURE = float(os.getenv("LLM_TEMPERATURE", "0.7"))
+# Seconds analyze_customer_product waits for the LLM before serving the fallback ranking (0 = no deadline)
+RANKING_DEADLINE_SECONDS = float(os.getenv("RANKING_DEADLINE_SECONDS", "60"))
+# Threads running deadline-bound ranking calls; calls past their deadline still hold one until they finish
+RANKING_DEADLINE_WORKERS = int(os.getenv("RANKING_DEADLINE_WORKERS", "8"))
+# Stream completions so result items are used while the LLM is still generating
+LLM_STREAM_ENABLED = os.getenv("LLM_STREAM_ENABLED", "true").lower() == "true"
+
+class LLMResponseError(Exception):
     """
-    Fetch ALL transactions for a given date (ignoring is_processed_for_recommendation).
-    :param date_str: in format 'MM/DD/YYYY' or 'YYYY-MM-DD' (depending on your approach)
+    Raised when the LLM call fails or its completion cannot be parsed as JSON.
+    """
+    def __init__(self, message: str, raw_response: str = None):
+        super().__init__(message)
+        self.raw_response = raw_response
+
+    def to_dict(self):
+        error = {"error": str(self)}
+        if self.raw_response is not None:
+            error["raw_response"] = self.raw_response
+        return error
+
+class LLMUnavailableError(LLMResponseError):
+    """
+    Raised when the LLM provider cannot be reached: the circuit breaker is
+    open, the request failed after retries, or a deadline passed.
+    """
+
+# Fields each read path needs; everything else stays on the server
+TRANSACTION_FETCH_PROJECTION = {
+    "_id": 1,
+    "transaction_id": 1,
+    "customer_id": 1,
+    "transaction_date": 1,
+    "transaction_type": 1,
+    "amount": 1,
+    "merchant_category": 1,
+    "description": 1,
+    "balance_after_transaction": 1,
+    "is_processed_for_recommendation": 1,
+}
+TRANSACTION_PROMPT_PROJECTION = {
+    "_id": 0,
+    "transaction_id": 1,
+    "customer_id": 1,
+    "transaction_date": 1,
+    "transaction_type": 1,
+    "amount": 1,
+    "merchant_category": 1,
+    "description": 1,
+    "balance_after_transaction": 1,
+}
+CUSTOMER_PROMPT_PROJECTION = {
+    "_id": 0,
+    "segment_id": 1,
+    "product_ids": 1,
+    "interests": 1,
+    "credit_score": 1,
+}
+
+def build_day_query(date_str: str) -> dict:
+    """
+    Build the query for all transactions on a date in 'MM/DD/YYYY' format.
     """
-    db = get_database()
-    transactions_coll = db["transactions"]
-    
     date_obj = datetime.strptime(date_str, "%m/%d/%Y")
     start_of_day = datetime(date_obj.year, date_obj.month, date_obj.day, 0, 0, 0)
     end_of_day   = datetime(date_obj.year, date_obj.month, date_obj.day, 23, 59, 59)
-    
-    query = {
+
+    return {
       "transaction_date": {
           "$gte": start_of_day,
           "$lte": end_of_day
-      },
-      "is_processed_for_recommendation": False
+      }
+    }
+
+def build_unprocessed_day_query(date_str: str) -> dict:
+    """
+    Build the query for unprocessed transactions on a date in 'MM/DD/YYYY' format:
+    rows without a verdict yet (pending, claimed, or loaded before the claim protocol).
+    Rejected rows keep is_processed_for_recommendation False, so processing_status
+    must be checked as well.
+    """
+    return {
+        **build_day_query(date_str),
+        "is_processed_for_recommendation": False,
+        "processing_status": {"$ne": STATUS_DONE},
     }
 
-    transactions = list(transactions_coll.find(query))
-    for tx in transactions:
-        tx["_id"] = str(tx["_id"])  # Convert ObjectID to string if needed
-    return transactions
+def encode_fetch_cursor(tx: dict) -> str:
+    """
+    Encode the (transaction_date, _id) keyset position of a row as an opaque token.
+    """
+    payload = json.dumps({"d": tx["transaction_date"].isoformat(), "id": str(tx["_id"])})
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+def decode_fetch_cursor(token: str):
+    """
+    Decode a cursor token produced by encode_fetch_cursor.
+    Raises ValueError if the token is malformed.
+    """
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token.encode("ascii")))
+        return datetime.fromisoformat(payload["d"]), ObjectId(payload["id"])
+    except Exception:
+        raise ValueError("Invalid cursor token")
+
+def iter_transactions_by_date(date_str: str, cursor_token: str = None, limit: int = None):
+    """
+    Yield unprocessed transactions for a date in (transaction_date, _id) order,
+    straight from the Mongo cursor, starting after cursor_token if given.
+    """
+    db = get_database()
+    transactions_coll = db["transactions"]
+
+    query = build_unprocessed_day_query(date_str)
+    if cursor_token:
+        after_date, after_id = decode_fetch_cursor(cursor_token)
+        query["$or"] = [
+            {"transaction_date": {"$gt": after_date}},
+            {"transaction_date": after_date, "_id": {"$gt": after_id}},
+        ]
 
-def clean_completion_text(text: str) -> str:
+    cursor = transactions_coll.find(query, TRANSACTION_FETCH_PROJECTION).sort(
+        [("transaction_date", ASCENDING), ("_id", ASCENDING)]
+    ).batch_size(FETCH_BATCH_SIZE)
+    if limit:
+        cursor = cursor.limit(limit)
+    return cursor
+
+def fetch_transactions_page(date_str: str, cursor_token: str = None, limit: int = None):
+    """
+    Fetch one page of unprocessed transactions for a date using keyset pagination.
+    :return: (transactions, next_cursor) where next_cursor is None on the last page
     """
-    Clean the text returned by the LLM by stripping markdown code block formatting,
-    such as triple backticks and any language hints.
+    limit = min(limit or FETCH_PAGE_SIZE, FETCH_MAX_PAGE_SIZE)
+
+    # Read one extra row to know whether another page exists
+    with pipeline("fetch_by_date"), stage("transaction_query") as span:
+        transactions = list(iter_transactions_by_date(date_str, cursor_token, limit + 1))
+        span.set(documents=len(transactions))
+    next_cursor = None
+    if len(transactions) > limit:
+        transactions = transactions[:limit]
+        next_cursor = encode_fetch_cursor(transactions[-1])
+
+    # ObjectId and datetime values are encoded by the app's JSON provider
+    return transactions, next_cursor
+
+def fetch_transactions_by_date(date_str: str):
+    """
+    Fetch ALL transactions for a given date (ignoring is_processed_for_recommendation).
+    :param date_str: in format 'MM/DD/YYYY' or 'YYYY-MM-DD' (depending on your approach)
     """
-    text = text.strip()
-    if text.startswith("```"):
-        # Remove the first line (```json or similar) and the last line (```)
-        lines = text.splitlines()
-        # Remove the first and last lines if they are the triple backticks
-        if lines[0].startswith("```"):
-            lines = lines[1:]
-        if lines and lines[-1].startswith("```"):
-            lines = lines[:-1]
-        text = "\n".join(lines).strip()
-    return text
+    return list(iter_transactions_by_date(date_str))
 
-def get_recommended_transaction_by_date(date_str: str):
+def get_recommended_transaction_by_date(date_str: str, progress=None):
     """
     1) Fetch all transactions by specified date with is_processed_for_recommendation = false.
     2) Build an intelligent prompt to choose ONE transaction and recommend a product.
     3) Call the LLM with chat completions using openai_util, parse JSON response.
     4) Return the chosen transaction_id.
+    :param progress: optional callback receiving progress dicts (used by async jobs)
     """
+    with pipeline("analyze_by_date"):
+        return _get_recommended_transaction_by_date(date_str, progress)
+
+def _get_recommended_transaction_by_date(date_str: str, progress=None):
     db = get_database()
     transactions_coll = db["transactions"]
 
     # Prepare the query for unprocessed transactions on given date
-    date_obj = datetime.strptime(date_str, "%m/%d/%Y")
-    start_of_day = datetime(date_obj.year, date_obj.month, date_obj.day, 0, 0, 0)
-    end_of_day   = datetime(date_obj.year, date_obj.month, date_obj.day, 23, 59, 59)
-    
-    query = {
-      "transaction_date": {
-          "$gte": start_of_day,
-          "$lte": end_of_day
-      },
-      "is_processed_for_recommendation": False
-    }
+    query = build_unprocessed_day_query(date_str)
 
-    unprocessed_txs = list(transactions_coll.find(query))
+    with stage("transaction_query") as span:
+        unprocessed_txs = list(transactions_coll.find(query, TRANSACTION_PROMPT_PROJECTION))
+        span.set(documents=len(unprocessed_txs))
 
     if not unprocessed_txs:
         return {
@@ -81,20 +242,6 @@ def get_recommended_transaction_by_date(date_str: str):
             "date": date_str
         }
 
-    # Build a prompt context from the unprocessed transactions
-    tx_descriptions = []
-    for tx in unprocessed_txs:
-        tx_descriptions.append(
-            f"TransactionID: {tx['transaction_id']}, "
-            f"Type: {tx['transaction_type']}, "
-            f"Balance After Transaction: {tx['balance_after_transaction']}"
-            f"Amount: {tx['amount']}, "
-            f"Category: {tx['merchant_category']}, "
-            f"Desc: {tx['description']}"
-        )
-
-    prompt_context = "\n".join(tx_descriptions)
-
     # Construct a JSON instruction for the LLM
     system_instructions = (
         "You are a Wells Fargo product recommendation system. "
@@ -110,242 +257,953 @@ def get_recommended_transaction_by_date(date_str: str):
         "} ]"
     )
 
-    user_message = f"Transactions:\n{prompt_context}\nWhich transactions do you pick?"
+    # Build a token-bounded prompt context from the unprocessed transactions
+    with stage("prompt_build"):
+        builder = PromptBuilder(system_instructions, footer="Which transactions do you pick?")
+        builder.add_transactions(unprocessed_txs)
+        system_instructions, user_message = builder.build()
+    logger.info(f"Transaction pick prompt for {date_str}: {builder.stats}")
 
-    # Get the configured openai client
-    openai_client = get_openai_client()
+    if progress:
+        progress({"stage": "llm_call", "transactions": len(unprocessed_txs)})
 
-    # Make the ChatCompletion call
     try:
-        response = openai_client.chat.completions.create(
-            model="deepseek-reasoner",
-            temperature=0.7,
-            messages=[
-                {"role": "system", "content": system_instructions},
-                {"role": "user", "content": user_message}
-            ]
+        llm_json = call_llm_json(system_instructions, user_message, route=ROUTE_TRIAGE)
+    except LLMResponseError as e:
+        return e.to_dict()
+
+    # Return the parsed response
+    return llm_json
+
+def build_messages(system_prompt: str, user_message: str) -> list:
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_message}
+    ]
+
+def hash_prompt(system_prompt: str, user_message: str, model: str = None) -> str:
+    """
+    Content hash of a request (model, temperature and messages), as used by the LLM cache.
+    """
+    return make_cache_key(model or LLM_MODEL, LLM_TEMPERATURE, build_messages(system_prompt, user_message))
+
+def _log_usage(model: str, usage: dict):
+    observe_tokens(model, usage)
+    if usage:
+        logger.info(
+            f"LLM call ({model}): {usage.get('prompt_tokens')} prompt tokens, "
+            f"{usage.get('completion_tokens')} completion tokens"
         )
-    except Exception as e:
-        return {"error": f"OpenAI API call failed: {e}"}
 
-    # Extract response text (should be JSON)
-    completion_text = response.choices[0].message.content.strip()
-    completion_text = clean_completion_text(completion_text)
+def _completion_text(response: dict, model: str) -> str:
+    """
+    Extract the completion from a chat completions response and log its token usage.
+    Code fences are left in place; parse_completion_json strips them while parsing.
+    """
+    _log_usage(model, response.get("usage"))
+    try:
+        content = response["choices"][0]["message"]["content"]
+    except (KeyError, IndexError, TypeError):
+        raise LLMResponseError("Unexpected chat completion response.", raw_response=str(response)[:1000])
+    return content or ""
+
+def _open_circuit_error() -> LLMUnavailableError:
+    return LLMUnavailableError("LLM circuit is open after repeated provider failures")
 
+def _record_llm_failure(breaker, error: LLMHTTPError) -> LLMResponseError:
+    """
+    Report a failed request to the breaker and build the error to raise.
+    Only provider-side failures (transport, 429, 5xx, a success response that
+    is not JSON) count against the circuit.
+    """
+    if error.status_code is None or error.status_code < 400 or error.status_code in RETRYABLE_STATUS_CODES:
+        breaker.record_failure()
+        return LLMUnavailableError(f"OpenAI API call failed: {error}", raw_response=error.body)
+    breaker.record_success()
+    return LLMResponseError(f"OpenAI API call failed: {error}", raw_response=error.body)
+
+def _parse_completion(completion_text: str, cache, cache_key: str, fresh: bool) -> dict:
     try:
-        llm_json = json.loads(completion_text)
+        with stage("parse"):
+            llm_json = parse_completion_json(completion_text)
     except json.JSONDecodeError:
-        return {"error": "Failed to parse LLM response as JSON.", "raw_response": completion_text}
+        raise LLMResponseError("Failed to parse LLM response as JSON.", raw_response=completion_text)
 
-    # Return the parsed response
+    # Only cache completions that parsed, so a bad answer is retried next time
+    if cache and fresh:
+        cache.set(cache_key, completion_text)
+    return llm_json
+
+def call_llm_json(system_prompt: str, user_message: str, route: str = ROUTE_DEFAULT, breaker=None) -> dict:
+    """
+    Send one chat completion request to the model of `route` and parse the
+    completion as JSON.
+    Identical requests are answered from the LLM response cache.
+    Raises LLMResponseError if the call fails or the output is not valid JSON.
+    :param breaker: where to report the outcome, the "llm" circuit breaker by default
+                    (a BreakerCall when the caller may report it first)
+    """
+    model = model_for(route)
+    temperature = LLM_TEMPERATURE
+    messages = build_messages(system_prompt, user_message)
+
+    cache = get_llm_cache()
+    cache_key = make_cache_key(model, temperature, messages) if cache else None
+    completion_text = cache.get(cache_key) if cache else None
+
+    fresh = completion_text is None
+    if fresh:
+        breaker = breaker or get_circuit_breaker("llm")
+        if not breaker.allow():
+            raise _open_circuit_error()
+        started = time.perf_counter()
+        try:
+            with stage("llm_call", model=model, route=route):
+                response = get_llm_client().chat_completion(model, messages, temperature=temperature)
+        except LLMHTTPError as e:
+            record_llm_call(route, model, time.perf_counter() - started, failed=True)
+            raise _record_llm_failure(breaker, e)
+        except BaseException:
+            # Whatever else ends the call must still settle the breaker (and a half-open probe)
+            record_llm_call(route, model, time.perf_counter() - started, failed=True)
+            breaker.record_failure()
+            raise
+        record_llm_call(route, model, time.perf_counter() - started, response.get("usage"))
+        breaker.record_success()
+        completion_text = _completion_text(response, model)
+
+    return _parse_completion(completion_text, cache, cache_key, fresh)
+
+async def acall_llm_json(system_prompt: str, user_message: str, route: str = ROUTE_DEFAULT, breaker=None) -> dict:
+    """
+    asyncio version of call_llm_json(), sharing its cache and circuit breaker.
+    """
+    model = model_for(route)
+    temperature = LLM_TEMPERATURE
+    messages = build_messages(system_prompt, user_message)
+
+    cache = get_llm_cache()
+    cache_key = make_cache_key(model, temperature, messages) if cache else None
+    completion_text = cache.get(cache_key) if cache else None
+
+    fresh = completion_text is None
+    if fresh:
+        breaker = breaker or get_circuit_breaker("llm")
+        if not breaker.allow():
+            raise _open_circuit_error()
+        started = time.perf_counter()
+        try:
+            with stage("llm_call", model=model, route=route):
+                response = await get_llm_client().achat_completion(model, messages, temperature=temperature)
+        except LLMHTTPError as e:
+            record_llm_call(route, model, time.perf_counter() - started, failed=True)
+            raise _record_llm_failure(breaker, e)
+        except BaseException:
+            # Cancellation or anything else must still settle the breaker (and a half-open probe)
+            record_llm_call(route, model, time.perf_counter() - started, failed=True)
+            breaker.record_failure()
+            raise
+        record_llm_call(route, model, time.perf_counter() - started, response.get("usage"))
+        breaker.record_success()
+        completion_text = _completion_text(response, model)
+
+    return _parse_completion(completion_text, cache, cache_key, fresh)
+
+def _result_items(llm_json, key: str) -> list:
+    """
+    The result list of a parsed completion: llm_json[key], or the completion
+    itself when the LLM answered with a bare list.
+    """
+    if isinstance(llm_json, list):
+        return llm_json
+    if isinstance(llm_json, dict):
+        return llm_json.get(key) or []
+    raise LLMResponseError("Unexpected LLM response shape.", raw_response=str(llm_json))
+
+def stream_llm_json_items(system_prompt: str, user_message: str, key: str, route: str = ROUTE_DEFAULT):
+    """
+    Stream one chat completion from the model of `route` and yield each
+    element of its result list (llm_json[key], or a bare list) as soon as
+    that element is complete.
+    Shares the LLM response cache with call_llm_json(); a cached completion
+    is replayed at once. When the stream ends the whole completion is parsed
+    and cached, and elements the incremental parser missed are yielded last.
+    Raises LLMResponseError if the call fails or the output is not valid JSON.
+    :return: (as the generator's return value) the parsed completion
+    """
+    if not LLM_STREAM_ENABLED:
+        llm_json = call_llm_json(system_prompt, user_message, route)
+        yield from _result_items(llm_json, key)
+        return llm_json
+
+    model = model_for(route)
+    temperature = LLM_TEMPERATURE
+    messages = build_messages(system_prompt, user_message)
+
+    cache = get_llm_cache()
+    cache_key = make_cache_key(model, temperature, messages) if cache else None
+    completion_text = cache.get(cache_key) if cache else None
+    if completion_text is not None:
+        llm_json = _parse_completion(completion_text, cache, cache_key, False)
+        yield from _result_items(llm_json, key)
+        return llm_json
+
+    breaker = get_circuit_breaker("llm")
+    if not breaker.allow():
+        raise _open_circuit_error()
+
+    parser = StreamingArrayParser([key])
+    emitted = []
+    usage = None
+    answered = False
+    started = time.perf_counter()
+    try:
+        with stage("llm_call", model=model, route=route):
+            for chunk in get_llm_client().stream_chat_completion(model, messages, temperature=temperature):
+                answered = True
+                usage = chunk.get("usage") or usage
+                for choice in chunk.get("choices") or []:
+                    text = (choice.get("delta") or {}).get("content")
+                    if not text:
+                        continue
+                    try:
+                        items = parser.feed(text)
+                    except json.JSONDecodeError:
+                        raise LLMResponseError("Failed to parse LLM response as JSON.", raw_response=parser.text)
+                    for item in items:
+                        if not emitted:
+                            observe_first_item(model, time.perf_counter() - started)
+                        emitted.append(item)
+                        yield item
+    except LLMHTTPError as e:
+        record_llm_call(route, model, time.perf_counter() - started, failed=True)
+        raise _record_llm_failure(breaker, e)
+    except GeneratorExit:
+        # The consumer stopped reading; the provider only failed if it had not answered yet
+        record_llm_call(route, model, time.perf_counter() - started, usage, failed=not answered)
+        if answered:
+            breaker.record_success()
+        else:
+            breaker.record_failure()
+        raise
+    except BaseException:
+        # A malformed chunk, an undecodable event line or anything else: settle the breaker
+        # so a half-open probe is never left in flight
+        record_llm_call(route, model, time.perf_counter() - started, failed=True)
+        breaker.record_failure()
+        raise
+    record_llm_call(route, model, time.perf_counter() - started, usage)
+    breaker.record_success()
+    _log_usage(model, usage)
+
+    llm_json = _parse_completion(parser.text, cache, cache_key, True)
+    items = _result_items(llm_json, key)
+    if items[:len(emitted)] == emitted:
+        yield from items[len(emitted):]
+    else:
+        logger.warning(f"Streamed {key} differ from the final completion; yielding the missing ones")
+        yield from (item for item in items if item not in emitted)
     return llm_json
 
-def analyze_recommendable_transaction_by_date(date_str: str):
+def format_transaction_line(tx: dict) -> str:
+    return (
+        f"TransactionID: {tx['transaction_id']}, "
+        f"Transaction Type: {tx['transaction_type']}, "
+        f"Balance After Transaction: {tx['balance_after_transaction']}"
+        f"Amount: {tx['amount']}, "
+        f"Merchant Category: {tx['merchant_category']}, "
+        f"Description: {tx['description']}"
+    )
+
+RECOMMENDABLE_TRANSACTIONS_SYSTEM_PROMPT = (
+    "You are an AI assistant specializing in financial product recommendations for bank customers. "
+    "Your task is to analyze a list of recent transactions and determine which transactions are suitable "
+    "for a personalized recommendation. Consider factors such as merchant category, transaction amount, "
+    "available balance, transaction type, and description. Select only transactions that indicate potential "
+    "interest in relevant banking products (e.g., travel transactions may suggest interest in travel insurance, "
+    "large retail purchases may indicate interest in a credit limit increase). "
+    "Give each selected transaction a confidence between 0 and 1, and list the IDs of transactions you cannot "
+    "decide on under uncertain_transactions. "
+    "Output a object containing a list of valid transactions strictly maintaining below format:\n"
+    "{\"valid_transactions\": [\n"
+    "    {\n"
+    "      \"transaction_id\": \"<valid transaction id>\",\n"
+    "      \"reason\": \"<brief reason why this transaction is suitable for recommendation>\",\n"
+    "      \"confidence\": <0 to 1>\n"
+    "    }\n"
+    "  ],\n"
+    "  \"uncertain_transactions\": [\"<transaction id>\"]\n"
+    "}"
+)
+
+TRANSACTION_CHUNK_FOOTER = "Which transactions do you pick?"
+
+def transaction_chunk_max_tokens() -> int:
+    """
+    Token budget of one transaction chunk: LLM_CHUNK_MAX_TOKENS, capped so the
+    chunk's prompt fits PROMPT_MAX_TOKENS with room left for the builder's
+    category headings and summaries.
+    """
+    overhead = estimate_tokens(RECOMMENDABLE_TRANSACTIONS_SYSTEM_PROMPT) + estimate_tokens(TRANSACTION_CHUNK_FOOTER)
+    return max(1, min(LLM_CHUNK_MAX_TOKENS, (PROMPT_MAX_TOKENS - overhead) * 3 // 4))
+
+def _transaction_chunk_messages(chunk_txs: list):
+    """
+    :return: (system_prompt, user_message, transactions the builder had to summarize)
+    """
+    # Chunks are sized by transaction_chunk_max_tokens, so the builder normally
+    # lists every row and only dedupes repeated descriptions
+    with stage("prompt_build"):
+        builder = PromptBuilder(RECOMMENDABLE_TRANSACTIONS_SYSTEM_PROMPT, footer=TRANSACTION_CHUNK_FOOTER)
+        builder.add_transactions(chunk_txs)
+        system_prompt, user_message = builder.build()
+    logger.debug(f"Transaction chunk prompt: {builder.stats}")
+    return system_prompt, user_message, builder.summarized
+
+def _confidence(item: dict) -> float:
+    # Answers without a usable confidence are taken as they are
+    try:
+        return float(item.get("confidence", 1))
+    except (TypeError, ValueError):
+        return 1.0
+
+def _stream_transaction_chunk(chunk, emit, on_unlisted=None):
+    """
+    Ask the triage model which transactions of one chunk are recommendable
+    and emit each one as soon as it has been generated. Transactions it is
+    unsure about (listed as uncertain, or picked with a confidence below
+    LLM_ESCALATION_CONFIDENCE) are asked again of the escalation model, as
+    is the rest of the chunk if the triage answer is not valid JSON.
+    Only IDs listed in the chunk's prompt are kept.
+    :param on_unlisted: called with the IDs the prompt only summarized, which
+                        the LLM was never asked about
+    """
+    chunk_txs, _ = chunk
+    system_prompt, user_message, summarized = _transaction_chunk_messages(chunk_txs)
+    unlisted = {tx["transaction_id"] for tx in summarized}
+    if unlisted and on_unlisted:
+        on_unlisted(unlisted)
+    chunk_txs = [tx for tx in chunk_txs if tx["transaction_id"] not in unlisted]
+    chunk_ids = {tx["transaction_id"] for tx in chunk_txs}
+    escalate = should_escalate(ROUTE_TRIAGE)
+    emitted, uncertain = set(), set()
+
+    triage = stream_llm_json_items(system_prompt, user_message, "valid_transactions", route=ROUTE_TRIAGE)
+    try:
+        while True:
+            try:
+                item = next(triage)
+            except StopIteration as stop:
+                llm_json = stop.value
+                break
+            if not isinstance(item, dict) or item.get("transaction_id") not in chunk_ids:
+                continue
+            if escalate and _confidence(item) < LLM_ESCALATION_CONFIDENCE:
+                uncertain.add(item["transaction_id"])
+            else:
+                emitted.add(item["transaction_id"])
+                emit(item)
+        if isinstance(llm_json, dict):
+            uncertain.update(
+                tx_id for tx_id in (llm_json.get("uncertain_transactions") or [])
+                if isinstance(tx_id, str) and tx_id in chunk_ids
+            )
+    except LLMUnavailableError:
+        raise
+    except LLMResponseError as e:
+        if not escalate:
+            raise
+        logger.warning(f"Escalating a transaction chunk after an invalid triage answer: {e}")
+        uncertain = set(chunk_ids)
+
+    uncertain -= emitted
+    if not (escalate and uncertain):
+        return
+    record_escalation(ROUTE_TRIAGE, len(uncertain))
+    system_prompt, user_message, _ = _transaction_chunk_messages(
+        [tx for tx in chunk_txs if tx["transaction_id"] in uncertain]
+    )
+    for item in stream_llm_json_items(system_prompt, user_message, "valid_transactions", route=ROUTE_ESCALATION):
+        if isinstance(item, dict) and item.get("transaction_id") in uncertain:
+            emit(item)
+
+def _tagged(event: str, generator):
+    """
+    Yield (event, item) for each item of generator and return its return value.
+    """
+    while True:
+        try:
+            item = next(generator)
+        except StopIteration as stop:
+            return stop.value
+        yield event, item
+
+def _drain(generator):
+    """
+    Run a generator to its end.
+    :return: (list of the yielded items, its return value)
+    """
+    items = []
+    while True:
+        try:
+            items.append(next(generator))
+        except StopIteration as stop:
+            return items, stop.value
+
+def stream_unprocessed_transactions(claimed_txs: list, claim_token: str, progress=None, label: str = "batch"):
+    """
+    Run the pre-filter and the chunked, streamed LLM analysis over
+    transactions claimed with claim_transactions. Each recommendable row is
+    flagged done/valid and yielded as soon as the LLM has named it, while
+    the other chunks are still generating. Once every chunk has finished the
+    claim is settled: all other rows become done/rejected, while rows of
+    failed LLM chunks, and rows a prompt could only summarize, go back to
+    pending so another run can retry them.
+    Rows not flagged yet are released if the consumer stops early.
+    :param label: used in log messages (e.g. the date being analyzed)
+    :return: (as the generator's return value) {"valid", "rejected", "released", "failed_chunks"},
+             or a dict with an "error" key if every LLM chunk failed
+    """
     db = get_database()
-    transactions_coll = db["transactions"]
+    claimed_by_id = {tx["transaction_id"]: tx for tx in claimed_txs}
+    flagged = set()
+    valid_ids = set()
+    unlisted = set()
 
-    date_obj = datetime.strptime(date_str, "%m/%d/%Y")
-    start_of_day = datetime(date_obj.year, date_obj.month, date_obj.day, 0, 0, 0)
-    end_of_day   = datetime(date_obj.year, date_obj.month, date_obj.day, 23, 59, 59)
-    
-    query = {
-      "transaction_date": {
-          "$gte": start_of_day,
-          "$lte": end_of_day
-      },
-      "is_processed_for_recommendation": False
-    }
+    def flag_valid(items: list) -> list:
+        # A row named twice (e.g. by the triage and the escalation model) is flagged once
+        new_items = []
+        for item in items:
+            if item["transaction_id"] not in flagged:
+                flagged.add(item["transaction_id"])
+                new_items.append(item)
+        if new_items:
+            with stage("flag_valid") as span:
+                marked = mark_claimed_valid(db, claim_token, [item["transaction_id"] for item in new_items])
+                valid_ids.update(marked)
+                # Keep the per-customer rolling aggregates in step with the processed flag by
+                # rebuilding the day buckets of the rows this claim moved
+                apply_processed_transactions(db, [
+                    claimed_by_id[tx_id] for tx_id in marked if tx_id in claimed_by_id
+                ])
+                span.set(documents=len(marked))
+        return [item for item in new_items if item["transaction_id"] in valid_ids]
 
-    unprocessed_txs = list(transactions_coll.find(query))
+    settled = False
+    fanout = None
+    try:
+        # Drop routine rows and auto-accept obvious ones before spending LLM tokens
+        with stage("prefilter"):
+            prefiltered = prefilter_transactions(claimed_txs)
+        if progress:
+            progress({"stage": "prefilter", **prefiltered["stats"]})
+        yield from flag_valid(prefiltered["accepted"])
 
-    if not unprocessed_txs:
+        # Split the remaining rows into token-bounded chunks and stream them concurrently
+        chunks = chunk_by_tokens(prefiltered["ambiguous"], format_transaction_line, transaction_chunk_max_tokens())
+        fanout = stream_chunks_concurrently(
+            chunks,
+            lambda chunk, emit: _stream_transaction_chunk(chunk, emit, unlisted.update),
+            on_progress=progress,
+            # Chunk calls and their retries can outlive the lease; keep it while they run
+            heartbeat=lambda: renew_claim(db, claim_token),
+            heartbeat_seconds=CLAIM_LEASE_SECONDS / 3,
+        )
+        with stage("llm_fanout") as span:
+            while True:
+                try:
+                    arrived = next(fanout)
+                except StopIteration as stop:
+                    failures = stop.value
+                    break
+                yield from flag_valid([item for _, item in arrived])
+            span.set(documents=len(prefiltered["ambiguous"]))
+
+        released = 0
+        if unlisted:
+            # The LLM never saw these rows individually; leave them for another run
+            released += release_claim(db, claim_token, unlisted)
+            logger.warning(f"{label}: {len(unlisted)} rows did not fit their chunk prompt; they are pending again")
+        if failures:
+            # Rows already flagged valid no longer hold the claim and stay done
+            failed_ids = [tx["transaction_id"] for index, _ in failures for tx in chunks[index][0]]
+            released += release_claim(db, claim_token, failed_ids)
+        if failures and len(failures) == len(chunks) and not flagged:
+            release_claim(db, claim_token)
+            settled = True
+            return {"error": f"All {len(chunks)} LLM chunks failed", "failures": [err for _, err in failures]}
+        if failures:
+            logger.warning(f"{len(failures)} of {len(chunks)} chunks failed for {label}; their rows are pending again")
+
+        # Settle the claim: every row still held was not selected
+        with stage("complete_claim") as span:
+            counts = complete_claim(db, claim_token, [])
+            span.set(documents=counts["rejected"])
+        settled = True
+        logger.info(f"{label}: {len(valid_ids)} valid, {counts['rejected']} rejected")
         return {
+            "valid": len(valid_ids),
+            "rejected": counts["rejected"],
+            "released": released,
+            "failed_chunks": len(failures),
+        }
+    finally:
+        if fanout is not None:
+            fanout.close()
+        if not settled:
+            release_claim(db, claim_token)
+
+def analyze_unprocessed_transactions(claimed_txs: list, claim_token: str, progress=None, label: str = "batch"):
+    """
+    Run the pre-filter and chunked LLM analysis over transactions claimed
+    with claim_transactions and settle the claim: recommendable rows become
+    done/valid, all other rows done/rejected. Rows of failed LLM chunks are
+    released back to pending so another run can retry them.
+    See stream_unprocessed_transactions() for the streaming version.
+    :param label: used in log messages (e.g. the date being analyzed)
+    :return: list of valid transactions, or a dict with an "error" key if every LLM chunk failed
+    """
+    valid_transactions, summary = _drain(stream_unprocessed_transactions(claimed_txs, claim_token, progress, label))
+    if "error" in summary:
+        return summary
+    return valid_transactions
+
+def _coalesced(key: str, fn):
+    """
+    Share one computation between concurrent identical requests, in this
+    process and across workers. Coalescing failures are returned as error dicts.
+    """
+    try:
+        return coalesce(key, fn)
+    except (SingleFlightError, SingleFlightTimeoutError) as e:
+        return {"error": str(e)}
+
+def _date_key(date_str: str) -> str:
+    try:
+        return datetime.strptime(date_str, "%m/%d/%Y").strftime("%Y-%m-%d")
+    except (TypeError, ValueError):
+        return str(date_str)
+
+def analyze_recommendable_transaction_by_date(date_str: str, progress=None):
+    """
+    Pick the recommendable transactions of a day and flag them as processed.
+    Concurrent calls for the same date share one analysis.
+    :param progress: optional callback receiving progress dicts (used by async jobs)
+    """
+    with pipeline("analyze_recommendable_transactions"):
+        return _coalesced(
+            f"analyze_by_date:{_date_key(date_str)}",
+            lambda: _analyze_recommendable_transaction_by_date(date_str, progress),
+        )
+
+def stream_recommendable_transaction_by_date(date_str: str, progress=None):
+    """
+    Streaming version of analyze_recommendable_transaction_by_date(). Yields
+    ("transaction", item) for each recommendable transaction as soon as it is
+    known and flagged, then a final ("done", summary) or ("error", error).
+    Streams are not coalesced; concurrent streams for a date split its rows
+    through their claims.
+    """
+    with pipeline("analyze_recommendable_transactions"):
+        yield from _iter_recommendable_transaction_events(date_str, progress)
+
+def _analyze_recommendable_transaction_by_date(date_str: str, progress=None):
+    valid_transactions = []
+    for event, data in _iter_recommendable_transaction_events(date_str, progress):
+        if event == "transaction":
+            valid_transactions.append(data)
+        elif event == "error" or "message" in data:
+            return data
+    return valid_transactions
+
+def _iter_recommendable_transaction_events(date_str: str, progress=None):
+    db = get_database()
+
+    query = build_day_query(date_str)
+
+    # Claim and analyze the day one batch at a time; other workers claiming
+    # the same day get the remaining rows instead of the same ones
+    totals = {"valid": 0, "rejected": 0, "released": 0, "failed_chunks": 0}
+    claimed_any = False
+    while True:
+        with stage("claim") as span:
+            claim_token, claimed_txs = claim_transactions(db, query, TRANSACTION_PROMPT_PROJECTION)
+            span.set(documents=len(claimed_txs))
+        if not claimed_txs:
+            break
+        claimed_any = True
+        summary = yield from _tagged("transaction", stream_unprocessed_transactions(
+            claimed_txs, claim_token, progress=progress, label=date_str
+        ))
+        if "error" in summary:
+            # Every chunk failed; stop instead of re-claiming the released rows
+            if not totals["valid"]:
+                yield "error", summary
+                return
+            logger.warning(f"Stopping analysis of {date_str} early: {summary['error']}")
+            break
+        for key in totals:
+            totals[key] += summary[key]
+        if not (summary["valid"] or summary["rejected"]):
+            # Everything claimed went back to pending; claiming it again would spin
+            logger.warning(f"Stopping analysis of {date_str} early: no row of the last claim was settled")
+            break
+
+    if not claimed_any:
+        yield "done", {
             "message": "No unprocessed transactions found for this date",
             "date": date_str
         }
-    
-    tx_descriptions = []
-    for tx in unprocessed_txs:
-        tx_descriptions.append(
-            f"TransactionID: {tx['transaction_id']}, "
-            f"Transaction Type: {tx['transaction_type']}, "
-            f"Balance After Transaction: {tx['balance_after_transaction']}"
-            f"Amount: {tx['amount']}, "
-            f"Merchant Category: {tx['merchant_category']}, "
-            f"Description: {tx['description']}"
-        )
+        return
+
+    yield "done", {"date": date_str, **totals}
+
+def resolve_recommendation_window(start_date: str = None, end_date: str = None):
+    """
+    Resolve the transaction window for product recommendations.
+    Dates are 'MM/DD/YYYY'; without a start_date the demo window (two weeks up
+    to Feb 15, 2025) is used. end_date is inclusive.
+    :return: (window_start, window_end) where window_end may be None
+    """
+    if start_date:
+        window_start = datetime.strptime(start_date, "%m/%d/%Y")
+    else:
+        window_start = datetime(2025,2,15) - timedelta(weeks=2) # Hard coded
+    window_end = None
+    if end_date:
+        end_obj = datetime.strptime(end_date, "%m/%d/%Y")
+        window_end = datetime(end_obj.year, end_obj.month, end_obj.day, 23, 59, 59)
+    return window_start, window_end
 
-    prompt_context = "\n".join(tx_descriptions)
-
-    system_prompt = (
-        "You are an AI assistant specializing in financial product recommendations for bank customers. "
-        "Your task is to analyze a list of recent transactions and determine which transactions are suitable "
-        "for a personalized recommendation. Consider factors such as merchant category, transaction amount, "
-        "available balance, transaction type, and description. Select only transactions that indicate potential "
-        "interest in relevant banking products (e.g., travel transactions may suggest interest in travel insurance, "
-        "large retail purchases may indicate interest in a credit limit increase). "
-        "Output a object containing a list of valid transactions strictly maintaining below format:\n"
-        "{\"valid_transactions\": [\n"
-        "    {\n"
-        "      \"transaction_id\": \"<valid transaction id>\",\n"
-        "      \"reason\": \"<brief reason why this transaction is suitable for recommendation>\"\n"
-        "    }\n"
-        "  ]\n"
-        "}"
+def build_window_query(window_start: datetime, window_end: datetime = None) -> dict:
+    date_filter = {"$gte": window_start}
+    if window_end:
+        date_filter["$lte"] = window_end
+    return {
+        "transaction_date": date_filter,
+        "is_processed_for_recommendation": True      # Only processed transactions
+    }
+
+# Static so it is a cacheable prefix; customer and product details go in the user message
+PRODUCT_RANKING_SYSTEM_PROMPT = (
+    "You are a financial AI assistant specializing in recommending personalized banking products based on customer transactions"
+    "Your task is to analyze a list of valid transactions and match them with eligible financial products based on the customer's segment."
+    "Consider the following key factors while making recommendations:"
+    "Transaction Type: Identify patterns such as large purchases, frequent travel expenses, or recurring business transactions."
+    "Merchant Category: Recognize spending behaviors that align with specific banking products (e.g., real estate-related payments may indicate interest in commercial real estate financing)."
+    "Transaction Amount & Balance: Suggest products that match the customer's financial activity and ensure affordability."
+    "Segment-Based Eligibility: Only recommend products that belong to the customer's designated segment."
+    "Customer Interest: Take into account any explicit product interests the customer has shown in past interactions, applications, or inquiries."
+    "Priority Ranking: Assign a priority to each recommended product based on how well it matches the transaction. A lower number indicates a higher priority (1 = best match)."
+    "The customer interests, credit score, eligible financial products and transactions are given in the user message.\n"
+    "Output a object containing a list of valid products strictly maintaining below format:\n"
+    "{\"valid_products\": [\n"
+    "    {\n"
+    "      \"product_id\": \"<valid product id>\",\n"
+    "      \"product_name\": \"<valid product name>\",\n"
+    "      \"reason\": \"<brief reason why this product is suitable for customer>\"\n"
+    "      \"priority\": \"<Recommendation priority (1 = highest, increasing number = lower priority)>\"\n"
+    "    }\n"
+    "  ]\n"
+    "}"
+)
+
+def build_product_ranking_prompt(customer: dict, valid_transactions, eligible_products, transaction_summary: str = None):
+    """
+    Build the (system_prompt, user_message) pair asking the LLM to rank products,
+    within the prompt token budget.
+    :param transaction_summary: aggregate summary used instead of listing each transaction
+    :return: (system_prompt, user_message, prompt_stats)
+    """
+    builder = PromptBuilder(
+        PRODUCT_RANKING_SYSTEM_PROMPT,
+        footer="Choose the most eligible product recommended for the transactions and rank them in order",
     )
 
-    user_message = f"Transactions:\n{prompt_context}\nWhich transactions do you pick?"
+    customer_interests = " ".join(list(customer.get('interests') or []))
+    builder.add_text(
+        "Here are the **customer interests**" + "\n" + customer_interests + "\n"
+        "Customer Credit Score: " + str(customer.get('credit_score'))
+    )
 
-    openai_client = get_openai_client()
+    pd_descriptions = []
+    for pd in eligible_products:
+        pd_descriptions.append(
+            f"product_id: {pd['product_id']}, "
+            f"Product Name: {pd['product_name']}, "
+            f"Product Type: {pd['product_type']}, "
+            f"Product Description: {pd['description']}, "
+            f"Product Eligibility Criteria: {pd['eligibility_criteria']}"
+        )
+    builder.add_lines("Here are the **eligible financial products**", pd_descriptions)
 
-    try:
-        response = openai_client.chat.completions.create(
-            model="deepseek-reasoner",
-            temperature=0.7,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_message}
-            ]
+    if transaction_summary:
+        builder.add_text(f"Transactions:\n{transaction_summary}")
+    else:
+        builder.add_transactions(valid_transactions)
+
+    system_prompt, user_message = builder.build()
+    return system_prompt, user_message, builder.stats
+
+def _product_ranking_messages(customer: dict, valid_transactions, eligible_products, transaction_summary: str = None):
+    with stage("prompt_build"):
+        system_prompt, user_message, prompt_stats = build_product_ranking_prompt(
+            customer, valid_transactions, eligible_products, transaction_summary
         )
-    except Exception as e:
-        return {"error": f"OpenAI API call failed: {e}"}
-    
-    completion_text = response.choices[0].message.content.strip()
-    completion_text = clean_completion_text(completion_text)
+    logger.info(f"Product ranking prompt for customer {customer.get('customer_id')}: {prompt_stats}")
+    return system_prompt, user_message
 
-    try:
-        llm_json = json.loads(completion_text)
-    except json.JSONDecodeError:
-        return {"error": "Failed to parse LLM response as JSON.", "raw_response": completion_text}
+def rank_products_with_metadata(customer: dict, valid_transactions, eligible_products, transaction_summary: str = None,
+                                breaker=None) -> dict:
+    """
+    Ask the ranking model to rank the eligible products for one customer.
+    Raises LLMResponseError if the call fails or the output is not valid JSON.
+    :param breaker: passed on to call_llm_json()
+    :return: {"valid_products", "model", "prompt_hash"}
+    """
+    system_prompt, user_message = _product_ranking_messages(
+        customer, valid_transactions, eligible_products, transaction_summary
+    )
+    llm_json = call_llm_json(system_prompt, user_message, route=ROUTE_RANKING, breaker=breaker)
+    model = model_for(ROUTE_RANKING)
+    return {
+        "valid_products": _result_items(llm_json, "valid_products"),
+        "model": model,
+        "prompt_hash": hash_prompt(system_prompt, user_message, model),
+    }
 
-    valid_transactions = llm_json.get("valid_transactions") or []
+_deadline_executor = None
+_deadline_executor_pid = None
+_deadline_executor_lock = threading.Lock()
 
-    # Update processed transactions in the database
-    transaction_ids = [tx["transaction_id"] for tx in valid_transactions]
-    transactions_coll.update_many(
-        {"transaction_id": {"$in": transaction_ids}},
-        {"$set": {"is_processed_for_recommendation": True}}
+def _get_deadline_executor() -> ThreadPoolExecutor:
+    global _deadline_executor, _deadline_executor_pid
+    pid = os.getpid()
+    if _deadline_executor is None or _deadline_executor_pid != pid:
+        with _deadline_executor_lock:
+            if _deadline_executor is None or _deadline_executor_pid != pid:
+                _deadline_executor = ThreadPoolExecutor(
+                    max_workers=RANKING_DEADLINE_WORKERS, thread_name_prefix="llm-deadline"
+                )
+                _deadline_executor_pid = pid
+    return _deadline_executor
+
+def rank_products_within_deadline(customer: dict, valid_transactions, eligible_products,
+                                  transaction_summary: str = None, deadline_seconds: float = None) -> dict:
+    """
+    rank_products_with_metadata() bounded by deadline_seconds.
+    On timeout LLMUnavailableError is raised. A call that had started counts
+    as one breaker failure, and its own outcome is then ignored; it keeps
+    running and still fills the LLM cache. A call still queued for a thread
+    is cancelled.
+    """
+    deadline_seconds = RANKING_DEADLINE_SECONDS if deadline_seconds is None else deadline_seconds
+    if not deadline_seconds:
+        return rank_products_with_metadata(customer, valid_transactions, eligible_products, transaction_summary)
+
+    breaker_call = BreakerCall(get_circuit_breaker("llm"))
+    future = _get_deadline_executor().submit(
+        propagate_context(rank_products_with_metadata), customer, valid_transactions, eligible_products,
+        transaction_summary, breaker_call
     )
+    try:
+        return future.result(timeout=deadline_seconds)
+    except FutureTimeoutError:
+        if not future.cancel():
+            breaker_call.record_failure()
+        raise LLMUnavailableError(f"LLM did not answer within {deadline_seconds}s")
 
-    return valid_transactions
+def analyze_recommendable_products_for_customer(customer_id: str, start_date: str = None, end_date: str = None):
+    """
+    Rank the eligible products for one customer over a transaction window.
+    Concurrent calls for the same customer and window share one LLM call.
+    """
+    key = f"analyze_customer_product:{customer_id}:{_date_key(start_date)}:{_date_key(end_date)}"
+    with pipeline("analyze_customer_product"):
+        return _coalesced(key, lambda: _analyze_recommendable_products_for_customer(customer_id, start_date, end_date))
 
-def analyze_recommendable_products_for_customer(customer_id: str):
+def _prepare_product_ranking(customer_id: str, start_date: str = None, end_date: str = None) -> dict:
+    """
+    Load everything a product ranking for one customer needs.
+    :return: the ranking inputs (see prepare_customer_ranking()), or a dict with an "error" key
+    """
     db = get_database()
-    transactions_coll = db["transactions"]
     customers_coll = db["customers"]
-    products_coll = db["products"]
 
     # Find the customer to get the segment_id
-    customer = customers_coll.find_one({"customer_id": customer_id})
+    with stage("customer_lookup"):
+        customer = customers_coll.find_one({"customer_id": customer_id}, {**CUSTOMER_PROMPT_PROJECTION, "customer_id": 1})
     if not customer:
         return {"error": "Customer not found"}
 
+    try:
+        window_start, window_end = resolve_recommendation_window(start_date, end_date)
+    except ValueError:
+        return {"error": "Dates must be in MM/DD/YYYY format"}
+
+    return prepare_customer_ranking(customer, window_start, window_end)
+
+def prepare_customer_ranking(customer: dict, window_start: datetime, window_end: datetime = None,
+                             transactions: list = None, stored: dict = None, lookup_stored: bool = True,
+                             aggregate: dict = None) -> dict:
+    """
+    Build the ranking inputs of a loaded customer over a window. Shared by
+    the API and the batch runner so both send the same prompt and compute
+    the same input hash.
+    :param transactions: the customer's processed transactions in the window,
+                         if already loaded (only read for light customers)
+    :param stored: the customer's latest stored recommendation, if already loaded
+    :param lookup_stored: read the latest stored recommendation when stored is not given
+    :param aggregate: the customer's aggregate over the window, if already loaded
+    :return: the ranking inputs, with "stored" (the stored recommendation) and
+             "stored_products" set when it can be served as is, or a dict with an "error" key
+    """
+    db = get_database()
+    customer_id = customer["customer_id"]
+
     segment_id = customer.get("segment_id")
     if not segment_id:
         return {"error": "Segment ID not found for customer"}
 
-    two_weeks_ago = datetime(2025,2,15) - timedelta(weeks=2) # Hard coded
-    valid_transactions = transactions_coll.find({
-        "transaction_date": {"$gte": two_weeks_ago},  # Filter for last 2 weeks
-        "customer_id": customer_id,
-        "is_processed_for_recommendation": True      # Only processed transactions
-    })
-    valid_transactions = [{**tx, "_id": str(tx["_id"])} for tx in valid_transactions]
+    # Heavy customers are described by their rolling aggregate instead of every transaction
+    if aggregate is None:
+        with stage("aggregate_lookup"):
+            aggregate = get_customer_aggregate(db, customer_id, window_start, window_end)
+    transaction_summary = None
+    valid_transactions = []
+    if aggregate["transaction_count"] > AGGREGATE_SUMMARY_THRESHOLD:
+        transaction_summary = format_aggregate_summary(aggregate)
+    elif transactions is not None:
+        valid_transactions = transactions
+    else:
+        with stage("transaction_query") as span:
+            valid_transactions = list(db["transactions"].find(
+                {**build_window_query(window_start, window_end), "customer_id": customer_id},
+                TRANSACTION_PROMPT_PROJECTION
+            ))
+            span.set(documents=len(valid_transactions))
 
-    eligible_products = products_coll.find({"segment_id": segment_id})
-    eligible_products = [{**product, "_id": str(product["_id"])} for product in eligible_products]
+    with stage("product_query") as span:
+        subtracted_eligible_rpoducts = get_catalog_cache().get_eligible_products(segment_id, customer.get("product_ids"))
+        span.set(documents=len(subtracted_eligible_rpoducts))
 
-    customer_product_ids = customer.get("product_ids")
-    subtracted_eligible_rpoducts = [
-        product for product in eligible_products if product["product_id"] not in customer_product_ids
-    ]
+    # Serve the stored ranking while the customer's inputs are unchanged
+    input_hash = compute_input_hash(
+        customer, valid_transactions, subtracted_eligible_rpoducts, window_start, window_end, transaction_summary
+    )
+    if stored is None and lookup_stored:
+        with stage("stored_lookup"):
+            stored = get_latest_recommendation(db, customer_id, window_start, window_end)
+    fresh = is_fresh(stored, input_hash, model_for(ROUTE_RANKING))
+    count_cache("recommendations", fresh)
+    if fresh:
+        logger.info(f"Serving stored recommendations for customer {customer_id} (inputs unchanged)")
 
-    # tx_descriptions = []
-    # for tx in valid_transactions:
-    #     tx_descriptions.append(
-    #         f"TransactionID: {tx['transaction_id']}, "
-    #         f"Transaction Type: {tx['transaction_type']}, "
-    #         f"Balance After Transaction: {tx['balance_after_transaction']}"
-    #         f"Amount: {tx['amount']}, "
-    #         f"Merchant Category: {tx['merchant_category']}, "
-    #         f"Description: {tx['description']}"
-    #     )
-    # tx_prompt_context = "\n".join(tx_descriptions)
-
-    tx_descriptions = []
-    for tx in valid_transactions:
-        tx_descriptions.append(
-            f"TransactionID: {tx['transaction_id']}, "
-            f"Transaction Type: {tx['transaction_type']}, "
-            f"Balance After Transaction: {tx['balance_after_transaction']}"
-            f"Amount: {tx['amount']}, "
-            f"Merchant Category: {tx['merchant_category']}, "
-            f"Description: {tx['description']}"
-        )
-    tx_prompt_context = "\n".join(tx_descriptions)
-    user_message = f"Transactions:\n{tx_prompt_context}\nChoose the most eligible product recommended for the transactions and rank them in order"
+    return {
+        "customer": customer,
+        "segment_id": segment_id,
+        "window_start": window_start,
+        "window_end": window_end,
+        "aggregate": aggregate,
+        "transaction_summary": transaction_summary,
+        "valid_transactions": valid_transactions,
+        "eligible_products": subtracted_eligible_rpoducts,
+        "input_hash": input_hash,
+        "stored": stored if fresh else None,
+        "stored_products": stored["valid_products"] if fresh else None,
+    }
 
-    pd_descriptions = []
-    for pd in subtracted_eligible_rpoducts:
-        pd_descriptions.append(
-            f"product_id: {pd['product_id']}, "
-            f"Product Name: {pd['product_name']}, "
-            f"Product Type: {pd['product_type']}, "
-            f"Product Description: {pd['description']}"
-            f"Product Eligibility Criteria: {pd['eligibility_criteria']}"
+def _fallback_ranking(ranking: dict, error: LLMUnavailableError) -> list:
+    """
+    Rank from the local ranker; it is not stored, so the next call retries the LLM.
+    """
+    logger.warning(f"Serving fallback ranking for customer {ranking['customer']['customer_id']}: {error}")
+    spend_by_category = ranking["aggregate"]["spend_by_category"] if ranking["transaction_summary"] else None
+    with stage("fallback_rank"):
+        return rank_products_fallback(
+            ranking["customer"], ranking["valid_transactions"], ranking["eligible_products"], ranking["segment_id"],
+            spend_by_category
         )
-    pd_prompt_context = "\n".join(pd_descriptions)
-
-    customer_interests = " ".join(list(customer.get('interests')))
-    customer_credit_score = customer.get('credit_score')
-
-    system_prompt = (
-        "You are a financial AI assistant specializing in recommending personalized banking products based on customer transactions"
-        "Your task is to analyze a list of valid transactions and match them with eligible financial products based on the customer's segment."
-        "Consider the following key factors while making recommendations:"
-        "Transaction Type: Identify patterns such as large purchases, frequent travel expenses, or recurring business transactions."
-        "Merchant Category: Recognize spending behaviors that align with specific banking products (e.g., real estate-related payments may indicate interest in commercial real estate financing)."
-        "Transaction Amount & Balance: Suggest products that match the customer's financial activity and ensure affordability."
-        "Segment-Based Eligibility: Only recommend products that belong to the customer's designated segment."
-        "Customer Interest: Take into account any explicit product interests the customer has shown in past interactions, applications, or inquiries."
-        "Priority Ranking: Assign a priority to each recommended product based on how well it matches the transaction. A lower number indicates a higher priority (1 = best match)."
-        "Here are the **customer interests**" + "\n" + customer_interests + "\n"
-        "Customer Credit Score: " + str(customer_credit_score) + "\n"
-        "Here are the **eligible financial products**" + "\n" + pd_prompt_context + "\n"
-        "Output a object containing a list of valid products strictly maintaining below format:\n"
-        "{\"valid_products\": [\n"
-        "    {\n"
-        "      \"product_id\": \"<valid product id>\",\n"
-        "      \"product_name\": \"<valid product name>\",\n"
-        "      \"reason\": \"<brief reason why this product is suitable for customer>\"\n"
-        "      \"priority\": \"<Recommendation priority (1 = highest, increasing number = lower priority)>\"\n"
-        "    }\n"
-        "  ]\n"
-        "}"
-    )
 
-    openai_client = get_openai_client()
+def _save_ranking(ranking: dict, valid_products: list, model: str, prompt_hash: str):
+    with stage("save"):
+        save_recommendations(get_database(), [{
+            "customer_id": ranking["customer"]["customer_id"],
+            "run_id": f"api-{uuid.uuid4()}",
+            "source": "api",
+            "valid_products": valid_products,
+            "error": None,
+            "model": model,
+            "prompt_hash": prompt_hash,
+            "input_hash": ranking["input_hash"],
+            "window_start": ranking["window_start"],
+            "window_end": ranking["window_end"],
+        }])
+
+def _analyze_recommendable_products_for_customer(customer_id: str, start_date: str = None, end_date: str = None):
+    ranking = _prepare_product_ranking(customer_id, start_date, end_date)
+    if "error" in ranking:
+        return ranking
+    if ranking["stored_products"] is not None:
+        return ranking["stored_products"]
 
     try:
-        response = openai_client.chat.completions.create(
-            model="deepseek-reasoner",
-            temperature=0.7,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_message}
-            ]
+        ranked = rank_products_within_deadline(
+            ranking["customer"], ranking["valid_transactions"], ranking["eligible_products"],
+            ranking["transaction_summary"]
         )
-    except Exception as e:
-        return {"error": f"OpenAI API call failed: {e}"}
-    
-    completion_text = response.choices[0].message.content.strip()
-    completion_text = clean_completion_text(completion_text)
+    except LLMUnavailableError as e:
+        # Answer fast from the local ranker
+        return _fallback_ranking(ranking, e)
+    except LLMResponseError as e:
+        return e.to_dict()
 
-    try:
-        llm_json = json.loads(completion_text)
-    except json.JSONDecodeError:
-        return {"error": "Failed to parse LLM response as JSON.", "raw_response": completion_text}
+    _save_ranking(ranking, ranked["valid_products"], ranked["model"], ranked["prompt_hash"])
+    return ranked["valid_products"]
 
-    valid_products = llm_json.get("valid_products") or []
+def stream_recommendable_products_for_customer(customer_id: str, start_date: str = None, end_date: str = None):
+    """
+    Streaming version of analyze_recommendable_products_for_customer(). Yields
+    ("product", item) for each ranked product as soon as the LLM has written
+    it, then a final ("done", {"count", "source"}) or ("error", error).
+    Stored and fallback rankings are sent at once. Streams are not coalesced
+    and RANKING_DEADLINE_SECONDS does not apply, since products arrive as
+    they are generated; the fallback ranking is only used if the LLM fails
+    before its first product.
+    """
+    with pipeline("analyze_customer_product"):
+        ranking = _prepare_product_ranking(customer_id, start_date, end_date)
+        if "error" in ranking:
+            yield "error", ranking
+            return
+        if ranking["stored_products"] is not None:
+            for product in ranking["stored_products"]:
+                yield "product", product
+            yield "done", {"count": len(ranking["stored_products"]), "source": "stored"}
+            return
+
+        system_prompt, user_message = _product_ranking_messages(
+            ranking["customer"], ranking["valid_transactions"], ranking["eligible_products"],
+            ranking["transaction_summary"]
+        )
+        valid_products = []
+        try:
+            for product in stream_llm_json_items(system_prompt, user_message, "valid_products", route=ROUTE_RANKING):
+                valid_products.append(product)
+                yield "product", product
+        except LLMUnavailableError as e:
+            if valid_products:
+                yield "error", e.to_dict()
+                return
+            fallback = _fallback_ranking(ranking, e)
+            for product in fallback:
+                yield "product", product
+            yield "done", {"count": len(fallback), "source": "fallback_ranker"}
+            return
+        except LLMResponseError as e:
+            yield "error", e.to_dict()
+            return
 
-    return valid_products
+        model = model_for(ROUTE_RANKING)
+        _save_ranking(ranking, valid_products, model, hash_prompt(system_prompt, user_message, model))
+        yield "done", {"count": len(valid_products), "source": "llm"}
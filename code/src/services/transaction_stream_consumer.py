@@ -0,0 +1,159 @@
+# src/services/transaction_stream_consumer.py
+
+import os
+import time
+import threading
+import logging
+from datetime import datetime
+from pymongo import ASCENDING
+from pymongo.errors import OperationFailure
+
+from utils.db_utils import get_database
+from utils.metrics import pipeline
+from services.transaction_service import TRANSACTION_PROMPT_PROJECTION, analyze_unprocessed_transactions
+from services.transaction_claims import claim_transactions, claimable_filter, default_claim_owner
+
+logger = logging.getLogger(__name__)
+
+STREAM_CONSUMER_NAME = os.getenv("STREAM_CONSUMER_NAME", "transaction-analyzer")
+STREAM_BATCH_SIZE = int(os.getenv("STREAM_BATCH_SIZE", "200"))
+STREAM_BATCH_MAX_WAIT_SECONDS = float(os.getenv("STREAM_BATCH_MAX_WAIT_SECONDS", "5"))
+STREAM_POLL_INTERVAL_SECONDS = float(os.getenv("STREAM_POLL_INTERVAL_SECONDS", "2"))
+
+MODE_AUTO = "auto"
+MODE_CHANGE_STREAM = "change_stream"
+MODE_POLL = "poll"
+
+# Error code returned by mongod when change streams need a replica set
+_CHANGE_STREAM_UNSUPPORTED_CODES = {40573}
+
+
+class TransactionStreamConsumer:
+    """
+    Long-running consumer that analyzes new unprocessed transactions in
+    micro-batches bounded by size (batch_size) or time (max_wait_seconds).
+
+    It tails the transactions change stream and persists the resume token in
+    the stream_checkpoints collection after each batch, so a restart picks up
+    where it stopped. On a standalone mongod (no change streams) it polls on
+    (created_at, _id) instead, checkpointing the last position seen.
+    """
+
+    def __init__(self, name: str = None, batch_size: int = None, max_wait_seconds: float = None,
+                 poll_interval_seconds: float = None, mode: str = MODE_AUTO):
+        self.name = name or STREAM_CONSUMER_NAME
+        self.batch_size = batch_size or STREAM_BATCH_SIZE
+        self.max_wait_seconds = STREAM_BATCH_MAX_WAIT_SECONDS if max_wait_seconds is None else max_wait_seconds
+        self.poll_interval_seconds = (
+            STREAM_POLL_INTERVAL_SECONDS if poll_interval_seconds is None else poll_interval_seconds
+        )
+        self.mode = mode
+        self.stop_event = threading.Event()
+        self.owner = f"{self.name}@{default_claim_owner()}"
+        self.stats = {"batches": 0, "transactions": 0, "recommendable": 0, "failed_batches": 0, "skipped": 0}
+
+        self._db = get_database()
+        self._transactions = self._db["transactions"]
+        self._checkpoints = self._db["stream_checkpoints"]
+
+    def stop(self):
+        self.stop_event.set()
+
+    def _load_checkpoint(self) -> dict:
+        return self._checkpoints.find_one({"_id": self.name}) or {}
+
+    def _save_checkpoint(self, **fields):
+        self._checkpoints.update_one(
+            {"_id": self.name},
+            {"$set": {**fields, "updated_at": datetime.utcnow()}},
+            upsert=True,
+        )
+
+    def _process(self, transaction_ids: list):
+        """
+        Claim one micro-batch and send it through the pre-filter, LLM analysis
+        and claim settlement. Rows another worker already claimed are skipped.
+        """
+        claim_token, transactions = claim_transactions(
+            self._db, {"transaction_id": {"$in": transaction_ids}}, TRANSACTION_PROMPT_PROJECTION,
+            owner=self.owner, limit=len(transaction_ids),
+        )
+        self.stats["skipped"] += len(transaction_ids) - len(transactions)
+        if not transactions:
+            return
+
+        with pipeline("transaction_consumer"):
+            result = analyze_unprocessed_transactions(transactions, claim_token, label=f"{self.name} micro-batch")
+        self.stats["batches"] += 1
+        self.stats["transactions"] += len(transactions)
+        if isinstance(result, dict) and "error" in result:
+            # Rows are released to pending; the by-date analysis can still pick them up
+            self.stats["failed_batches"] += 1
+            logger.warning(f"{self.name}: micro-batch of {len(transactions)} failed: {result['error']}")
+        else:
+            self.stats["recommendable"] += len(result)
+            logger.info(f"{self.name}: {len(result)} of {len(transactions)} transactions recommendable")
+
+    def run(self):
+        """
+        Consume until stop() is called.
+        """
+        if self.mode in (MODE_AUTO, MODE_CHANGE_STREAM):
+            try:
+                self._run_change_stream()
+                return
+            except OperationFailure as e:
+                if self.mode == MODE_CHANGE_STREAM or e.code not in _CHANGE_STREAM_UNSUPPORTED_CODES:
+                    raise
+                logger.info(f"{self.name}: change streams unavailable ({e}), falling back to polling")
+        self._run_polling()
+
+    def _run_change_stream(self):
+        pipeline = [{"$match": {
+            "operationType": "insert",
+            "fullDocument.is_processed_for_recommendation": False,
+        }}]
+        resume_token = self._load_checkpoint().get("resume_token")
+        max_await_ms = int(max(0.1, min(self.max_wait_seconds, 1.0)) * 1000)
+
+        with self._transactions.watch(pipeline, resume_after=resume_token, max_await_time_ms=max_await_ms) as stream:
+            logger.info(f"{self.name}: tailing the transactions change stream")
+            buffer, first_buffered_at = [], None
+            while not self.stop_event.is_set():
+                change = stream.try_next()
+                if change is not None:
+                    buffer.append(change["fullDocument"]["transaction_id"])
+                    if first_buffered_at is None:
+                        first_buffered_at = time.monotonic()
+
+                batch_full = len(buffer) >= self.batch_size
+                batch_due = buffer and time.monotonic() - first_buffered_at >= self.max_wait_seconds
+                if batch_full or batch_due:
+                    self._process(buffer)
+                    self._save_checkpoint(resume_token=stream.resume_token)
+                    buffer, first_buffered_at = [], None
+
+    def _run_polling(self):
+        checkpoint = self._load_checkpoint()
+        last_created_at, last_id = checkpoint.get("last_created_at"), checkpoint.get("last_id")
+        logger.info(f"{self.name}: polling transactions on created_at every {self.poll_interval_seconds}s")
+
+        while not self.stop_event.is_set():
+            query = claimable_filter()
+            if last_created_at is not None:
+                query = {"$and": [query, {"$or": [
+                    {"created_at": {"$gt": last_created_at}},
+                    {"created_at": last_created_at, "_id": {"$gt": last_id}},
+                ]}]}
+            batch = list(
+                self._transactions.find(query, {"_id": 1, "created_at": 1, "transaction_id": 1})
+                .sort([("created_at", ASCENDING), ("_id", ASCENDING)])
+                .limit(self.batch_size)
+            )
+            if not batch:
+                self.stop_event.wait(self.poll_interval_seconds)
+                continue
+
+            last_created_at, last_id = batch[-1]["created_at"], batch[-1]["_id"]
+            self._process([tx["transaction_id"] for tx in batch])
+            self._save_checkpoint(last_created_at=last_created_at, last_id=last_id)
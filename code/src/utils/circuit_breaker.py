@@ -0,0 +1,139 @@
+# src/utils/circuit_breaker.py
+
+import os
+import time
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RESET_SECONDS = float(os.getenv("CIRCUIT_RESET_SECONDS", "30"))
+# A half-open probe that has not reported back after this long is presumed lost
+CIRCUIT_PROBE_TIMEOUT_SECONDS = float(os.getenv("CIRCUIT_PROBE_TIMEOUT_SECONDS", "600"))
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+    After failure_threshold failures in a row the circuit opens and calls are
+    refused for reset_seconds. Then a single probe call is let through
+    (half-open): its success closes the circuit, its failure opens it again.
+    A probe that never reports back is given up on after probe_timeout_seconds
+    and the next call becomes the probe.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = None, reset_seconds: float = None,
+                 probe_timeout_seconds: float = None):
+        self.name = name
+        self.failure_threshold = failure_threshold or CIRCUIT_FAILURE_THRESHOLD
+        self.reset_seconds = CIRCUIT_RESET_SECONDS if reset_seconds is None else reset_seconds
+        self.probe_timeout_seconds = (
+            CIRCUIT_PROBE_TIMEOUT_SECONDS if probe_timeout_seconds is None else probe_timeout_seconds
+        )
+        self.state = STATE_CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self._probe_in_flight = False
+        self._probe_started_at = None
+        self._lock = threading.Lock()
+        self.stats = {"allowed": 0, "rejected": 0, "successes": 0, "failures": 0, "opened": 0}
+
+    def allow(self) -> bool:
+        """
+        Whether a call may go ahead now. Callers that get True must report
+        the outcome with record_success() or record_failure().
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self.state == STATE_OPEN and now - self.opened_at >= self.reset_seconds:
+                self.state = STATE_HALF_OPEN
+                self._probe_in_flight = False
+            if (self.state == STATE_HALF_OPEN and self._probe_in_flight
+                    and now - self._probe_started_at >= self.probe_timeout_seconds):
+                logger.warning(f"Circuit {self.name} probe did not report back; letting another one through")
+                self._probe_in_flight = False
+            if self.state == STATE_CLOSED or (self.state == STATE_HALF_OPEN and not self._probe_in_flight):
+                if self.state == STATE_HALF_OPEN:
+                    self._probe_in_flight = True
+                    self._probe_started_at = now
+                self.stats["allowed"] += 1
+                return True
+            self.stats["rejected"] += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.stats["successes"] += 1
+            if self.state != STATE_CLOSED:
+                logger.info(f"Circuit {self.name} closed")
+            self.state = STATE_CLOSED
+            self.failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.stats["failures"] += 1
+            self.failures += 1
+            if self.state == STATE_HALF_OPEN or (
+                    self.state == STATE_CLOSED and self.failures >= self.failure_threshold):
+                self.state = STATE_OPEN
+                self.opened_at = time.monotonic()
+                self._probe_in_flight = False
+                self.stats["opened"] += 1
+                logger.warning(f"Circuit {self.name} opened after {self.failures} consecutive failures")
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {**self.stats, "state": self.state, "consecutive_failures": self.failures}
+
+
+class BreakerCall:
+    """
+    One call's outcome report to a breaker, settled at most once. A caller
+    that gives up on a call (e.g. at a deadline) reports through the same
+    object, so the call finishing later cannot count a second time.
+    """
+
+    def __init__(self, breaker: CircuitBreaker):
+        self.breaker = breaker
+        self.settled = False
+        self._lock = threading.Lock()
+
+    def _settle(self) -> bool:
+        with self._lock:
+            if self.settled:
+                return False
+            self.settled = True
+            return True
+
+    def allow(self) -> bool:
+        # A call already given up on must not start (or become the half-open probe)
+        return not self.settled and self.breaker.allow()
+
+    def record_success(self):
+        if self._settle():
+            self.breaker.record_success()
+
+    def record_failure(self):
+        if self._settle():
+            self.breaker.record_failure()
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(name: str) -> CircuitBreaker:
+    """
+    Return the process-wide breaker registered under name.
+    """
+    with _breakers_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            breaker = _breakers[name] = CircuitBreaker(name)
+        return breaker
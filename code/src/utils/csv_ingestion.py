@@ -0,0 +1,221 @@
+# src/utils/csv_ingestion.py
+
+import os
+import csv
+import json
+import time
+import uuid
+import hashlib
+from itertools import islice
+from multiprocessing import Pool
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "5000"))
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "1"))
+INGEST_REPORT_EVERY_SECONDS = float(os.getenv("INGEST_REPORT_EVERY_SECONDS", "5"))
+
+
+# Namespace for deterministic document ids derived from natural keys
+INGEST_ID_NAMESPACE = uuid.UUID("6f1c2a8e-4f0b-4d8e-9a57-3c1d5e7b9f20")
+
+
+def natural_key_id(*parts) -> str:
+    """
+    Deterministic UUID for a natural key, so re-loading a row yields the same id.
+    """
+    return str(uuid.uuid5(INGEST_ID_NAMESPACE, "|".join(str(part) for part in parts)))
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def iter_csv_rows(csv_filepath, skip_rows=0):
+    """
+    Yield the CSV rows one at a time as dicts, without loading the file.
+    :param skip_rows: number of data rows to skip (resume point)
+    """
+    with open(csv_filepath, newline='', encoding='utf-8') as csvfile:
+        yield from islice(csv.DictReader(csvfile), skip_rows, None)
+
+
+def load_checkpoint(checkpoint_path, csv_filepath) -> int:
+    """
+    Return the number of rows already committed for this CSV, 0 if none.
+    """
+    if not checkpoint_path or not os.path.exists(checkpoint_path):
+        return 0
+    with open(checkpoint_path, encoding="utf-8") as f:
+        checkpoint = json.load(f)
+    if checkpoint.get("csv_filepath") != os.path.abspath(csv_filepath):
+        print(f"Checkpoint {checkpoint_path} belongs to another file, starting from the beginning.")
+        return 0
+    return checkpoint.get("rows_done", 0)
+
+
+def save_checkpoint(checkpoint_path, csv_filepath, rows_done):
+    """
+    Atomically record the number of rows committed so far.
+    """
+    tmp_path = f"{checkpoint_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"csv_filepath": os.path.abspath(csv_filepath), "rows_done": rows_done}, f)
+    os.replace(tmp_path, checkpoint_path)
+
+
+def chunked(iterable, size):
+    """
+    Yield lists of up to size items from iterable.
+    """
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class ProgressReporter:
+    """
+    Print rows/sec at most every report_every seconds and a final summary.
+    """
+
+    def __init__(self, label, report_every=None):
+        self.label = label
+        self.report_every = INGEST_REPORT_EVERY_SECONDS if report_every is None else report_every
+        self.started = time.monotonic()
+        self.last_report = self.started
+        self.rows_read = 0
+        self.rows_written = 0
+        self.rows_skipped = 0
+
+    def update(self, read=0, written=0, skipped=0):
+        self.rows_read += read
+        self.rows_written += written
+        self.rows_skipped += skipped
+        now = time.monotonic()
+        if now - self.last_report >= self.report_every:
+            self.last_report = now
+            print(f"{self.label}: {self.rows_written} written, {self.rows_skipped} skipped, {self.rate():.0f} rows/sec")
+
+    def rate(self):
+        elapsed = time.monotonic() - self.started
+        return self.rows_read / elapsed if elapsed > 0 else 0.0
+
+    def summary(self):
+        return {
+            "rows_read": self.rows_read,
+            "rows_written": self.rows_written,
+            "rows_skipped": self.rows_skipped,
+            "seconds": round(time.monotonic() - self.started, 3),
+            "rows_per_sec": round(self.rate(), 1),
+        }
+
+
+def insert_batch(collection, docs):
+    """
+    Unordered insert_many of one batch. Rows rejected by the server (e.g.
+    duplicate keys) are reported and do not stop the rest of the batch.
+    :return: number of inserted documents
+    """
+    if not docs:
+        return 0
+    try:
+        return len(collection.insert_many(docs, ordered=False).inserted_ids)
+    except BulkWriteError as e:
+        errors = e.details.get("writeErrors", [])
+        print(f"{len(errors)} rows rejected in batch, first error: {errors[0]['errmsg'] if errors else e}")
+        return e.details.get("nInserted", 0)
+
+
+def upsert_batch(collection, docs, key_fields):
+    """
+    Unordered bulk_write of insert-if-absent upserts keyed on key_fields, so
+    rows that were already loaded are left untouched.
+    :return: number of newly inserted documents
+    """
+    if not docs:
+        return 0
+    writes = [
+        UpdateOne({field: doc[field] for field in key_fields}, {"$setOnInsert": doc}, upsert=True)
+        for doc in docs
+    ]
+    try:
+        return collection.bulk_write(writes, ordered=False).upserted_count
+    except BulkWriteError as e:
+        errors = e.details.get("writeErrors", [])
+        print(f"{len(errors)} rows rejected in batch, first error: {errors[0]['errmsg'] if errors else e}")
+        return e.details.get("nUpserted", 0)
+
+
+def ingest_csv(csv_filepath, collection, parse_row, batch_size=None, workers=None, label=None,
+               key_fields=None, checkpoint_path=None):
+    """
+    Stream a CSV file into a collection in bounded memory.
+    :param parse_row: picklable callable turning one CSV row into a document, or None to skip it
+    :param batch_size: rows per unordered insert_many / bulk_write
+    :param workers: >1 parses/validates rows in a multiprocessing pool
+    :param key_fields: natural key fields; when given, rows are upserted instead of inserted
+    :param checkpoint_path: file recording the rows committed so far; a re-run resumes after them
+    :return: summary dict with row counts and rows/sec
+    """
+    batch_size = batch_size or INGEST_BATCH_SIZE
+    workers = workers or INGEST_WORKERS
+    progress = ProgressReporter(label or collection.name)
+
+    rows_done = load_checkpoint(checkpoint_path, csv_filepath)
+    if rows_done:
+        print(f"{progress.label}: resuming after row {rows_done}")
+
+    pool = Pool(workers) if workers > 1 else None
+    try:
+        for rows in chunked(iter_csv_rows(csv_filepath, skip_rows=rows_done), batch_size):
+            if pool:
+                parsed = pool.map(parse_row, rows, chunksize=max(1, len(rows) // (workers * 4)))
+            else:
+                parsed = [parse_row(row) for row in rows]
+            docs = [doc for doc in parsed if doc is not None]
+            if key_fields:
+                written = upsert_batch(collection, docs, key_fields)
+            else:
+                written = insert_batch(collection, docs)
+            progress.update(read=len(rows), written=written, skipped=len(rows) - len(docs))
+            rows_done += len(rows)
+            if checkpoint_path:
+                save_checkpoint(checkpoint_path, csv_filepath, rows_done)
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+
+    summary = progress.summary()
+    print(
+        f"{progress.label}: inserted {summary['rows_written']} of {summary['rows_read']} rows "
+        f"({summary['rows_skipped']} skipped) in {summary['seconds']}s, {summary['rows_per_sec']} rows/sec."
+    )
+    return summary
+
+
+def add_ingest_arguments(parser, default_csv):
+    """
+    Common CLI options for the populate scripts.
+    """
+    parser.add_argument("csv_filepath", nargs="?", default=default_csv, help="CSV file to load.")
+    parser.add_argument("--batch-size", type=int, default=INGEST_BATCH_SIZE, help="Rows per bulk insert.")
+    parser.add_argument("--workers", type=int, default=INGEST_WORKERS, help="Processes used to parse and validate rows.")
+    parser.add_argument(
+        "--resume", action="store_true",
+        help="Upsert on the natural key and checkpoint progress, so a re-run continues after the last committed batch."
+    )
+    parser.add_argument("--checkpoint", help="Checkpoint file (defaults to <csv_filepath>.checkpoint.json).")
+    return parser
+
+
+def checkpoint_path_from_args(args):
+    """
+    Checkpoint file to use for the parsed CLI args, or None when not resuming.
+    """
+    if not args.resume:
+        return None
+    return args.checkpoint or f"{args.csv_filepath}.checkpoint.json"
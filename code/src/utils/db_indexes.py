@@ -0,0 +1,181 @@
+# src/utils/db_indexes.py
+
+import os
+import logging
+from datetime import datetime
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import PyMongoError
+
+logger = logging.getLogger(__name__)
+
+MONGO_ENSURE_INDEXES = os.getenv("MONGO_ENSURE_INDEXES", "true").lower() == "true"
+
+# Required indexes per collection. Compound keys follow equality-sort-range
+# order: equality fields first, then the transaction_date range.
+INDEXES = {
+    "transactions": [
+        # _id suffix serves the keyset-paginated (transaction_date, _id) sort
+        IndexModel(
+            [("is_processed_for_recommendation", ASCENDING), ("transaction_date", ASCENDING),
+             ("_id", ASCENDING)],
+            name="processed_date_id",
+        ),
+        IndexModel(
+            [("customer_id", ASCENDING), ("is_processed_for_recommendation", ASCENDING),
+             ("transaction_date", ASCENDING)],
+            name="customer_processed_date",
+        ),
+        IndexModel([("transaction_id", ASCENDING)], name="transaction_id", unique=True),
+        # Claimable rows of a day, in claim order (pending / expired claims)
+        IndexModel(
+            [("processing_status", ASCENDING), ("transaction_date", ASCENDING), ("_id", ASCENDING)],
+            name="status_date_id",
+        ),
+        # Polling fallback of the transaction stream consumer
+        IndexModel(
+            [("processing_status", ASCENDING), ("created_at", ASCENDING), ("_id", ASCENDING)],
+            name="status_created_id",
+        ),
+        # Settling and releasing a claim
+        IndexModel([("claim_token", ASCENDING)], name="claim_token", sparse=True),
+    ],
+    "customers": [
+        IndexModel([("customer_id", ASCENDING)], name="customer_id", unique=True),
+    ],
+    "products": [
+        IndexModel([("segment_id", ASCENDING)], name="segment_id"),
+        IndexModel([("product_name", ASCENDING)], name="product_name"),
+        IndexModel([("product_id", ASCENDING)], name="product_id", unique=True),
+    ],
+    "segments": [
+        IndexModel([("customer_type", ASCENDING)], name="customer_type"),
+    ],
+    "recommendations": [
+        IndexModel([("customer_id", ASCENDING), ("run_id", ASCENDING)], name="customer_run", unique=True),
+        # Latest recommendation of a customer (read API, freshness check)
+        IndexModel([("customer_id", ASCENDING), ("created_at", DESCENDING)], name="customer_latest"),
+    ],
+    # Day buckets of a customer, combined over a window at read time
+    "customer_aggregates": [
+        IndexModel([("customer_id", ASCENDING), ("day", ASCENDING)], name="customer_day"),
+    ],
+    # Finished and abandoned coalescing leases are removed once expires_at passes
+    "singleflight": [
+        IndexModel([("expires_at", ASCENDING)], name="expires_at", expireAfterSeconds=0),
+    ],
+}
+
+# Representative filters for the hot queries, used by explain_queries()
+_SAMPLE_DAY = datetime(2025, 2, 1)
+QUERY_SHAPES = [
+    ("transactions by date", "transactions", {
+        "transaction_date": {"$gte": _SAMPLE_DAY, "$lte": _SAMPLE_DAY.replace(hour=23, minute=59, second=59)},
+        "is_processed_for_recommendation": False,
+        "processing_status": {"$ne": "done"},
+    }),
+    ("customer transactions in window", "transactions", {
+        "transaction_date": {"$gte": _SAMPLE_DAY},
+        "customer_id": "101",
+        "is_processed_for_recommendation": True,
+    }),
+    ("claimable transactions of a day", "transactions", {
+        "transaction_date": {"$gte": _SAMPLE_DAY, "$lte": _SAMPLE_DAY.replace(hour=23, minute=59, second=59)},
+        "processing_status": "pending",
+    }),
+    ("settle claim", "transactions", {"claim_token": "sample"}),
+    ("mark transactions processed", "transactions", {"transaction_id": {"$in": ["sample"]}}),
+    ("customer by id", "customers", {"customer_id": "101"}),
+    ("products by segment", "products", {"segment_id": "sample"}),
+    ("product by name", "products", {"product_name": "Everyday Checking"}),
+    ("segment by customer type", "segments", {"customer_type": "Individual"}),
+    ("latest recommendation", "recommendations", {"customer_id": "101", "error": None}),
+    ("customer day buckets", "customer_aggregates", {
+        "customer_id": {"$in": ["101", "102"]},
+        "day": {"$gte": _SAMPLE_DAY, "$lte": _SAMPLE_DAY},
+    }),
+]
+
+
+def ensure_indexes(db):
+    """
+    Create all declared indexes. create_indexes() is a no-op for indexes
+    that already exist with the same spec, so this is safe to run repeatedly.
+    :return: dict of collection name -> list of index names
+    """
+    created = {}
+    for coll_name, models in INDEXES.items():
+        created[coll_name] = db[coll_name].create_indexes(models)
+    return created
+
+
+def _plan_stages(plan):
+    """
+    Yield every stage name in an explain() winning plan tree.
+    """
+    if not plan:
+        return
+    yield plan.get("stage")
+    if "inputStage" in plan:
+        yield from _plan_stages(plan["inputStage"])
+    for child in plan.get("inputStages", []):
+        yield from _plan_stages(child)
+    # Slot-based engine wraps the classic plan under queryPlan
+    if "queryPlan" in plan:
+        yield from _plan_stages(plan["queryPlan"])
+
+
+def _index_names(plan):
+    if not plan:
+        return
+    if plan.get("indexName"):
+        yield plan["indexName"]
+    if "inputStage" in plan:
+        yield from _index_names(plan["inputStage"])
+    for child in plan.get("inputStages", []):
+        yield from _index_names(child)
+    if "queryPlan" in plan:
+        yield from _index_names(plan["queryPlan"])
+
+
+def explain_queries(db):
+    """
+    Run explain() for each hot query shape and report whether it still
+    falls back to a collection scan.
+    """
+    report = []
+    for name, coll_name, query in QUERY_SHAPES:
+        try:
+            explain = db[coll_name].find(query).explain()
+        except PyMongoError as e:
+            report.append({"query": name, "collection": coll_name, "error": str(e)})
+            continue
+
+        winning_plan = explain.get("queryPlanner", {}).get("winningPlan", {})
+        stages = [stage for stage in _plan_stages(winning_plan) if stage]
+        stats = explain.get("executionStats", {})
+        report.append({
+            "query": name,
+            "collection": coll_name,
+            "collection_scan": "COLLSCAN" in stages,
+            "indexes": sorted(set(_index_names(winning_plan))),
+            "stages": stages,
+            "docs_examined": stats.get("totalDocsExamined"),
+            "keys_examined": stats.get("totalKeysExamined"),
+            "returned": stats.get("nReturned"),
+        })
+    return report
+
+
+def init_app(app):
+    """
+    Create the declared indexes at application startup (MONGO_ENSURE_INDEXES).
+    Failures are logged and do not prevent the app from starting.
+    """
+    if not MONGO_ENSURE_INDEXES:
+        return
+    from utils.db_utils import get_database
+
+    try:
+        ensure_indexes(get_database())
+    except Exception as e:
+        logger.warning(f"Could not ensure MongoDB indexes at startup: {e}")
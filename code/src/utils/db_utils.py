@@ -1,6 +1,9 @@
 import os
-from pymongo import MongoClient
+import atexit
+import threading
+from pymongo import MongoClient, monitoring
 from dotenv import load_dotenv
+from utils import metrics
 
 # Load environment variables from .env file
 load_dotenv()
@@ -9,14 +12,125 @@ load_dotenv()
 MONGO_URI = os.getenv("MONGO_URI")
 DB_NAME = os.getenv("DB_NAME", "my_database")  # Default DB name if not provided
 
+# Connection pool settings (see pymongo MongoClient options)
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "50"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+MONGO_MAX_IDLE_TIME_MS = int(os.getenv("MONGO_MAX_IDLE_TIME_MS", "300000"))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+
+
+class PoolStatsListener(monitoring.ConnectionPoolListener):
+    """
+    Collect connection pool counters so the pool can be monitored.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.connections_created = 0
+            self.connections_closed = 0
+            self.checked_out = 0
+            self.checkout_failures = 0
+            self.pools_cleared = 0
+
+    def _incr(self, name, value=1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + value)
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._incr("pools_cleared")
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self._incr("connections_created")
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._incr("connections_closed")
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        self._incr("checkout_failures")
+
+    def connection_checked_out(self, event):
+        self._incr("checked_out")
+
+    def connection_checked_in(self, event):
+        self._incr("checked_out", -1)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "connections_open": self.connections_created - self.connections_closed,
+                "connections_created": self.connections_created,
+                "connections_closed": self.connections_closed,
+                "connections_in_use": self.checked_out,
+                "checkout_failures": self.checkout_failures,
+                "pools_cleared": self.pools_cleared,
+            }
+
+
+_pool_stats = PoolStatsListener()
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+
 def get_db_client():
     """
-    Create and return a MongoClient instance connected to MongoDB Atlas.
+    Return the process-wide MongoClient connected to MongoDB Atlas.
+    The client (and its connection pool) is created once per process and
+    re-created after a fork, since MongoClient instances are not fork-safe.
     """
-    if not MONGO_URI:
-        raise Exception("MONGO_URI is not set in your environment variables.")
-    client = MongoClient(MONGO_URI)
-    return client
+    global _client, _client_pid
+    pid = os.getpid()
+    if _client is not None and _client_pid == pid:
+        return _client
+
+    with _client_lock:
+        if _client is not None and _client_pid == pid:
+            return _client
+        if not MONGO_URI:
+            raise Exception("MONGO_URI is not set in your environment variables.")
+        _pool_stats.reset()
+        _client = MongoClient(
+            MONGO_URI,
+            maxPoolSize=MONGO_MAX_POOL_SIZE,
+            minPoolSize=MONGO_MIN_POOL_SIZE,
+            maxIdleTimeMS=MONGO_MAX_IDLE_TIME_MS,
+            serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+            event_listeners=[_pool_stats, metrics.MongoCommandMetrics()] if metrics.METRICS_ENABLED else [_pool_stats],
+        )
+        _client_pid = pid
+    return _client
+
+
+def close_db_client():
+    """
+    Close the shared MongoClient (if it was created by this process).
+    """
+    global _client, _client_pid
+    with _client_lock:
+        if _client is not None and _client_pid == os.getpid():
+            _client.close()
+        _client = None
+        _client_pid = None
+
 
 def get_database():
     """
@@ -26,7 +140,44 @@ def get_database():
     db = client[DB_NAME]
     return db
 
+
+def get_pool_stats():
+    """
+    Return connection pool counters and the configured pool limits.
+    """
+    stats = _pool_stats.snapshot()
+    stats.update({
+        "max_pool_size": MONGO_MAX_POOL_SIZE,
+        "min_pool_size": MONGO_MIN_POOL_SIZE,
+        "max_idle_time_ms": MONGO_MAX_IDLE_TIME_MS,
+        "server_selection_timeout_ms": MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        "client_initialized": _client is not None and _client_pid == os.getpid(),
+    })
+    return stats
+
+
+def init_app(app):
+    """
+    Tie the MongoClient lifecycle to the Flask application: the client is
+    created lazily on first use in each worker process and closed at exit.
+    """
+    app.extensions["mongo_client"] = get_db_client
+    atexit.register(close_db_client)
+
+
+def _reset_after_fork():
+    global _client, _client_pid, _client_lock
+    _client = None
+    _client_pid = None
+    _client_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    # Drop the parent's client reference in the child; a fresh one is built on demand.
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
 if __name__ == "__main__":
     # Test connection by retrieving the database name
     db = get_database()
-    print(f"Connected to database: {db.name}")
\ No newline at end of file
+    print(f"Connected to database: {db.name}")
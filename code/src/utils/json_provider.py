@@ -0,0 +1,199 @@
+# src/utils/json_provider.py
+
+import re
+import json
+from bson import Decimal128, ObjectId
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    # Optional: several times faster than the stdlib encoder (pip install orjson)
+    import orjson
+except ImportError:
+    orjson = None
+
+# Leading ``` fence line of a completion, e.g. "```json\n"
+_OPENING_FENCE = re.compile(r"\s*```[^\n]*(?:\n|$)")
+# Characters the streaming parser has to look at, outside and inside strings
+_STRUCTURAL = re.compile(r'[\[\]{}",:]')
+_STRING_SPECIAL = re.compile(r'["\\]')
+_ORJSON_DUMPS_KWARGS = {"indent", "separators"}
+
+
+def bson_default(o):
+    """
+    Encode the BSON types documents come back with (ObjectId, Decimal128),
+    then everything Flask's default provider handles (datetime as an HTTP
+    date, UUID, dataclasses).
+    """
+    if isinstance(o, ObjectId):
+        return str(o)
+    if isinstance(o, Decimal128):
+        return str(o.to_decimal())
+    return DefaultJSONProvider.default(o)
+
+
+def _orjson_dumps(obj, sort_keys: bool = True, indent: bool = False) -> bytes:
+    # Datetimes go through bson_default so both encoders format them the same way
+    option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+    if sort_keys:
+        option |= orjson.OPT_SORT_KEYS
+    if indent:
+        option |= orjson.OPT_INDENT_2
+    return orjson.dumps(obj, default=bson_default, option=option)
+
+
+def loads(text):
+    """
+    Parse JSON text or UTF-8 bytes, with orjson when installed.
+    Raises json.JSONDecodeError (orjson's error is a subclass of it).
+    """
+    if orjson is not None:
+        return orjson.loads(text)
+    return json.loads(text)
+
+
+def strip_code_fence(text: str) -> str:
+    """
+    Return the body of a completion wrapped in a markdown code fence
+    (```json ... ```), or the text unchanged when it is not fenced. The text
+    is sliced once; anything after the closing fence is dropped.
+    """
+    opening = _OPENING_FENCE.match(text)
+    if not opening:
+        return text
+    closing = text.rfind("```", opening.end())
+    return text[opening.end():closing if closing != -1 else len(text)]
+
+
+def parse_completion_json(text: str):
+    """
+    Strip an optional code fence from an LLM completion and parse it as JSON.
+    Raises json.JSONDecodeError if the body is not valid JSON.
+    """
+    return loads(strip_code_fence(text))
+
+
+class StreamingArrayParser:
+    """
+    Incremental parser for a completion that is still being generated.
+    feed() takes the next piece of text and returns the elements of the
+    result array that are complete so far: the array under one of `keys`
+    in the top-level object, or a top-level array. Text around the JSON
+    (code fences) is ignored. Each element is parsed once, when the comma or
+    bracket after it arrives; the full text stays available in .text for a
+    final parse_completion_json().
+    """
+
+    def __init__(self, keys=()):
+        self.keys = set(keys)
+        self.text = ""
+        self._pos = 0
+        self._stack = []
+        self._in_string = False
+        self._string_start = None
+        self._last_string = None
+        self._key = None
+        self._array_depth = None
+        self._element_start = None
+        self.done = False
+
+    def feed(self, chunk: str) -> list:
+        """
+        Append chunk to the text and return the elements it completed.
+        Raises json.JSONDecodeError if a completed element is not valid JSON.
+        """
+        self.text += chunk
+        elements = []
+        text = self.text
+        while not self.done and self._pos < len(text):
+            if self._in_string:
+                match = _STRING_SPECIAL.search(text, self._pos)
+                if not match:
+                    self._pos = len(text)
+                    break
+                if match.group() == "\\":
+                    # Skip the escaped character, which may still be on its way
+                    self._pos = match.end() + 1
+                    continue
+                self._in_string = False
+                self._last_string = (self._string_start, match.end())
+                self._pos = match.end()
+                continue
+
+            match = _STRUCTURAL.search(text, self._pos)
+            if not match:
+                self._pos = len(text)
+                break
+            self._pos = match.end()
+            char = match.group()
+            if char == '"':
+                self._in_string = True
+                self._string_start = match.start()
+            elif char == ":":
+                if self._stack == ["{"] and self._last_string:
+                    start, end = self._last_string
+                    self._key = text[start + 1:end - 1]
+            elif char in "[{":
+                self._stack.append(char)
+                if char == "[" and self._array_depth is None and (
+                        len(self._stack) == 1 or (self._stack == ["{", "["] and self._key in self.keys)):
+                    self._array_depth = len(self._stack)
+                    self._element_start = match.end()
+            elif char in "]}":
+                if len(self._stack) == self._array_depth:
+                    self._append_element(elements, text[self._element_start:match.start()])
+                    self.done = True
+                if self._stack:
+                    self._stack.pop()
+            elif char == "," and len(self._stack) == self._array_depth:
+                self._append_element(elements, text[self._element_start:match.start()])
+                self._element_start = match.end()
+        return elements
+
+    @staticmethod
+    def _append_element(elements: list, element_text: str):
+        if element_text.strip():
+            elements.append(loads(element_text))
+
+
+class JSONProvider(DefaultJSONProvider):
+    """
+    Flask JSON provider that encodes ObjectId and Decimal128 natively and
+    uses orjson when it is installed. Output matches the default provider
+    (sorted keys, datetimes as HTTP dates) except that non-ASCII characters
+    are written as UTF-8 instead of \\u escapes.
+    """
+
+    default = staticmethod(bson_default)
+
+    def dumps(self, obj, **kwargs) -> str:
+        if orjson is None or not kwargs.keys() <= _ORJSON_DUMPS_KWARGS:
+            return super().dumps(obj, **kwargs)
+        try:
+            return _orjson_dumps(obj, self.sort_keys, bool(kwargs.get("indent"))).decode("utf-8")
+        except orjson.JSONEncodeError:
+            # e.g. integers over 64 bits, which the stdlib encoder accepts
+            return super().dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        if orjson is None:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        try:
+            body = _orjson_dumps(obj, self.sort_keys, indent) + b"\n"
+        except orjson.JSONEncodeError:
+            return super().response(*args, **kwargs)
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+
+def init_app(app):
+    """
+    Serve every jsonify() response of the app through JSONProvider.
+    """
+    app.json = JSONProvider(app)
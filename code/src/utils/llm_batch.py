@@ -0,0 +1,129 @@
+# src/utils/llm_batch.py
+
+import os
+import time
+import queue
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.metrics import propagate_context
+
+logger = logging.getLogger(__name__)
+
+# Rough characters-per-token ratio used for prompt budgeting
+CHARS_PER_TOKEN = 4
+
+LLM_CHUNK_MAX_TOKENS = int(os.getenv("LLM_CHUNK_MAX_TOKENS", "6000"))
+LLM_MAX_WORKERS = int(os.getenv("LLM_MAX_WORKERS", "4"))
+
+# Queued by a streaming chunk worker once its chunk succeeded or failed
+_CHUNK_FINISHED = object()
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Cheap token estimate for a piece of prompt text.
+    """
+    if not text:
+        return 0
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def chunk_by_tokens(items, render, max_tokens: int = None):
+    """
+    Split items into chunks whose rendered lines fit within max_tokens.
+    :param items: the records to split (e.g. transactions)
+    :param render: callable turning one record into its prompt line
+    :return: list of (chunk_items, chunk_lines) tuples
+    """
+    max_tokens = max_tokens or LLM_CHUNK_MAX_TOKENS
+    chunks = []
+    current_items, current_lines, current_tokens = [], [], 0
+
+    for item in items:
+        line = render(item)
+        line_tokens = estimate_tokens(line)
+        if current_items and current_tokens + line_tokens > max_tokens:
+            chunks.append((current_items, current_lines))
+            current_items, current_lines, current_tokens = [], [], 0
+        current_items.append(item)
+        current_lines.append(line)
+        current_tokens += line_tokens
+
+    if current_items:
+        chunks.append((current_items, current_lines))
+    return chunks
+
+
+def stream_chunks_concurrently(chunks, fn, max_workers: int = None, on_progress=None, heartbeat=None,
+                               heartbeat_seconds: float = None):
+    """
+    Run fn(chunk, emit) for every chunk on a bounded thread pool. fn calls
+    emit(item) for each result item as soon as it has it, and raises if the
+    chunk failed. Chunks are not retried here: the LLM client already retries
+    transient provider errors, and the rest (4xx, an open circuit, invalid
+    output) would fail again. The generator yields lists of (chunk_index, item)
+    holding every item that arrived since the previous yield, so the caller
+    can act on results while slower chunks are still running.
+    heartbeat, if given, is called every heartbeat_seconds while chunks are
+    still running (e.g. to renew a lease on the rows being analyzed).
+    :return: (as the generator's return value) list of (chunk_index, error) of failed chunks
+    """
+    max_workers = max_workers or LLM_MAX_WORKERS
+
+    failures = []
+    if not chunks:
+        return failures
+
+    arrivals = queue.Queue()
+
+    def run(index, chunk):
+        emit = lambda item: arrivals.put((index, item, None))
+        try:
+            fn(chunk, emit)
+            arrivals.put((index, _CHUNK_FINISHED, None))
+        except Exception as e:
+            arrivals.put((index, _CHUNK_FINISHED, e))
+
+    executor = ThreadPoolExecutor(max_workers=min(max_workers, len(chunks)))
+    try:
+        for index, chunk in enumerate(chunks):
+            executor.submit(propagate_context(run), index, chunk)
+
+        running = len(chunks)
+        last_beat = time.monotonic()
+        while running:
+            if heartbeat and time.monotonic() - last_beat >= heartbeat_seconds:
+                heartbeat()
+                last_beat = time.monotonic()
+            try:
+                arrived = [arrivals.get(timeout=heartbeat_seconds if heartbeat else None)]
+            except queue.Empty:
+                continue
+            while True:
+                try:
+                    arrived.append(arrivals.get_nowait())
+                except queue.Empty:
+                    break
+
+            items = []
+            for index, item, error in arrived:
+                if item is not _CHUNK_FINISHED:
+                    items.append((index, item))
+                    continue
+                running -= 1
+                if error is not None:
+                    logger.warning(f"LLM chunk {index} failed: {error}")
+                    failures.append((index, str(error)))
+                if on_progress:
+                    on_progress({
+                        "chunks_total": len(chunks),
+                        "chunks_done": len(chunks) - running,
+                        "chunks_failed": len(failures),
+                    })
+            if items:
+                yield items
+    finally:
+        # A consumer that stops early does not wait for the remaining chunks
+        executor.shutdown(wait=False, cancel_futures=True)
+    return failures
@@ -0,0 +1,251 @@
+# src/utils/llm_cache.py
+
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+import logging
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from utils.metrics import count_cache
+
+logger = logging.getLogger(__name__)
+
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "1024"))
+LLM_CACHE_TTL_SECONDS = int(os.getenv("LLM_CACHE_TTL_SECONDS", "86400"))
+# Optional second tier: "disk" (SQLite file) or "mongo" (llm_cache collection)
+LLM_CACHE_BACKEND = os.getenv("LLM_CACHE_BACKEND", "").lower()
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "llm_cache.sqlite3")
+LLM_CACHE_DISK_MAX_ENTRIES = int(os.getenv("LLM_CACHE_DISK_MAX_ENTRIES", "100000"))
+
+
+def make_cache_key(model: str, temperature: float, messages: list) -> str:
+    """
+    Content-addressed key: SHA-256 over the model, temperature and messages.
+    """
+    payload = json.dumps(
+        {"model": model, "temperature": temperature, "messages": messages},
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class MemoryCache:
+    """
+    Thread-safe in-memory LRU cache with per-entry TTL.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: int):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class DiskCache:
+    """
+    SQLite-backed cache tier shared by all workers on one host.
+    """
+
+    def __init__(self, path: str, max_entries: int, ttl_seconds: int):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL, created_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_created_at ON llm_cache (created_at)")
+        conn.commit()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        row = self._conn().execute(
+            "SELECT value, expires_at FROM llm_cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        value, expires_at = row
+        if expires_at < time.time():
+            return None
+        return value
+
+    def set(self, key, value):
+        now = time.time()
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO llm_cache (key, value, expires_at, created_at) VALUES (?, ?, ?, ?)",
+            (key, value, now + self.ttl_seconds, now),
+        )
+        # Evict expired rows, then the oldest rows beyond the size limit
+        conn.execute("DELETE FROM llm_cache WHERE expires_at < ?", (now,))
+        conn.execute(
+            "DELETE FROM llm_cache WHERE key IN ("
+            " SELECT key FROM llm_cache ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+        conn.commit()
+
+    def clear(self):
+        conn = self._conn()
+        conn.execute("DELETE FROM llm_cache")
+        conn.commit()
+
+
+class MongoCache:
+    """
+    MongoDB-backed cache tier shared by all workers; expiry via a TTL index.
+    """
+
+    def __init__(self, ttl_seconds: int):
+        from utils.db_utils import get_database
+
+        self.ttl_seconds = ttl_seconds
+        self._coll = get_database()["llm_cache"]
+        self._coll.create_index("expires_at", expireAfterSeconds=0)
+
+    def get(self, key):
+        doc = self._coll.find_one({"_id": key}, {"value": 1, "expires_at": 1})
+        if doc is None or doc["expires_at"] < datetime.utcnow():
+            return None
+        return doc["value"]
+
+    def set(self, key, value):
+        self._coll.replace_one(
+            {"_id": key},
+            {"_id": key, "value": value, "expires_at": datetime.utcnow() + timedelta(seconds=self.ttl_seconds)},
+            upsert=True,
+        )
+
+    def clear(self):
+        self._coll.delete_many({})
+
+
+class LLMResponseCache:
+    """
+    Two-tier cache for LLM completions: in-memory LRU in front of an
+    optional disk or Mongo tier. Tracks hit/miss counters per tier.
+    """
+
+    def __init__(self, memory, backend=None):
+        self.memory = memory
+        self.backend = backend
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "memory_hits": 0, "backend_hits": 0, "misses": 0, "errors": 0}
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def get(self, key):
+        value = self.memory.get(key)
+        if value is not None:
+            self._count("hits")
+            self._count("memory_hits")
+            count_cache("llm", True)
+            return value
+
+        if self.backend is not None:
+            try:
+                value = self.backend.get(key)
+            except Exception as e:
+                logger.warning(f"LLM cache backend read failed: {e}")
+                self._count("errors")
+                value = None
+            if value is not None:
+                self.memory.set(key, value)
+                self._count("hits")
+                self._count("backend_hits")
+                count_cache("llm", True)
+                return value
+
+        self._count("misses")
+        count_cache("llm", False)
+        return None
+
+    def set(self, key, value):
+        self.memory.set(key, value)
+        if self.backend is not None:
+            try:
+                self.backend.set(key, value)
+            except Exception as e:
+                logger.warning(f"LLM cache backend write failed: {e}")
+                self._count("errors")
+
+    def clear(self):
+        self.memory.clear()
+        if self.backend is not None:
+            self.backend.clear()
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+        stats["memory_entries"] = len(self.memory)
+        stats["backend"] = LLM_CACHE_BACKEND or None
+        return stats
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_llm_cache():
+    """
+    Return the process-wide LLM response cache, or None if caching is disabled.
+    """
+    global _cache
+    if not LLM_CACHE_ENABLED:
+        return None
+    if _cache is not None:
+        return _cache
+
+    with _cache_lock:
+        if _cache is None:
+            backend = None
+            if LLM_CACHE_BACKEND == "disk":
+                backend = DiskCache(LLM_CACHE_PATH, LLM_CACHE_DISK_MAX_ENTRIES, LLM_CACHE_TTL_SECONDS)
+            elif LLM_CACHE_BACKEND == "mongo":
+                backend = MongoCache(LLM_CACHE_TTL_SECONDS)
+            _cache = LLMResponseCache(MemoryCache(LLM_CACHE_MAX_ENTRIES, LLM_CACHE_TTL_SECONDS), backend)
+    return _cache
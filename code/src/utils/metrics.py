@@ -0,0 +1,413 @@
+# src/utils/metrics.py
+
+import os
+import time
+import uuid
+import logging
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+# Spans of each request kept in memory (GET /api/health/traces), no collector needed
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "false").lower() == "true"
+TRACE_BUFFER_SIZE = int(os.getenv("TRACE_BUFFER_SIZE", "1000"))
+
+try:
+    # Spans are also reported to OpenTelemetry when its API is installed (no-op without an SDK)
+    from opentelemetry import trace as otel_trace
+except ImportError:
+    otel_trace = None
+
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+COUNT_BUCKETS = (0, 1, 10, 100, 1000, 10000, 100000, 1000000)
+TOKEN_BUCKETS = (100, 500, 1000, 2000, 4000, 8000, 16000, 32000, 64000)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    """
+    Monotonic counter per label set.
+    """
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {value}"
+
+
+class Histogram:
+    """
+    Cumulative-bucket histogram per label set, as Prometheus expects it.
+    """
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames=(), buckets=DURATION_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["buckets"][index] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def samples(self):
+        with self._lock:
+            series = {key: {**s, "buckets": list(s["buckets"])} for key, s in self._series.items()}
+        for key, s in sorted(series.items()):
+            for bound, count in zip(self.buckets, s["buckets"]):
+                le = f'le="{bound}"'
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {count}"
+            le = 'le="+Inf"'
+            yield f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {s['count']}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, key)} {s['sum']}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, key)} {s['count']}"
+
+
+class MetricsRegistry:
+    """
+    Metrics of this process, rendered in the Prometheus text format.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, help: str, labelnames=()) -> Counter:
+        return self._register(Counter(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames=(), buckets=DURATION_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help, labelnames, buckets))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "pipeline_stage_duration_seconds", "Duration of each stage of an analysis pipeline.", ("pipeline", "stage")
+)
+STAGE_DOCUMENTS = REGISTRY.histogram(
+    "pipeline_stage_documents", "Documents a pipeline stage read or produced.", ("pipeline", "stage"), COUNT_BUCKETS
+)
+HTTP_SECONDS = REGISTRY.histogram(
+    "http_request_duration_seconds", "Time to produce an API response.", ("endpoint", "method", "status")
+)
+MONGO_SECONDS = REGISTRY.histogram(
+    "mongodb_command_duration_seconds", "MongoDB command round trips.", ("command", "collection")
+)
+MONGO_DOCUMENTS = REGISTRY.histogram(
+    "mongodb_command_documents", "Documents returned (cursor batches) or written (n) per MongoDB command.",
+    ("command", "collection"), COUNT_BUCKETS
+)
+MONGO_FAILURES = REGISTRY.counter(
+    "mongodb_command_failures_total", "MongoDB commands that failed.", ("command", "collection")
+)
+LLM_TOKENS = REGISTRY.histogram(
+    "llm_tokens", "Tokens per LLM call, as reported by the provider.", ("model", "kind"), TOKEN_BUCKETS
+)
+LLM_FIRST_ITEM_SECONDS = REGISTRY.histogram(
+    "llm_first_item_seconds", "Time from the start of a streamed LLM call to its first parsed result item.", ("model",)
+)
+LLM_ROUTE_SECONDS = REGISTRY.histogram(
+    "llm_route_call_duration_seconds", "LLM provider calls by route, model and outcome.", ("route", "model", "outcome")
+)
+LLM_ROUTE_COST = REGISTRY.counter(
+    "llm_route_cost_usd_total", "Estimated LLM cost by route and model, from the token usage.", ("route", "model")
+)
+LLM_ESCALATIONS = REGISTRY.counter(
+    "llm_route_escalated_rows_total", "Rows a route handed to the escalation model.", ("route",)
+)
+CACHE_REQUESTS = REGISTRY.counter(
+    "cache_requests_total", "Cache lookups by cache and result (hit/miss).", ("cache", "result")
+)
+PREFILTER_ROWS = REGISTRY.counter(
+    "prefilter_rows_total", "Transactions through the rule pre-filter by outcome (dropped/auto_accepted/to_llm).",
+    ("outcome",)
+)
+
+
+def count_cache(cache: str, hit: bool):
+    if METRICS_ENABLED:
+        CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+def observe_tokens(model: str, usage: dict):
+    if METRICS_ENABLED and usage:
+        for kind in ("prompt", "completion"):
+            if usage.get(f"{kind}_tokens") is not None:
+                LLM_TOKENS.observe(usage[f"{kind}_tokens"], model=model, kind=kind)
+
+
+def observe_first_item(model: str, seconds: float):
+    if METRICS_ENABLED:
+        LLM_FIRST_ITEM_SECONDS.observe(seconds, model=model)
+
+
+def observe_llm_call(route: str, model: str, seconds: float, cost: float, outcome: str):
+    if METRICS_ENABLED:
+        LLM_ROUTE_SECONDS.observe(seconds, route=route, model=model, outcome=outcome)
+        if cost:
+            LLM_ROUTE_COST.inc(cost, route=route, model=model)
+
+
+def count_llm_escalation(route: str, rows: int):
+    if METRICS_ENABLED and rows:
+        LLM_ESCALATIONS.inc(rows, route=route)
+
+
+def count_prefilter_rows(stats: dict):
+    if METRICS_ENABLED:
+        for outcome in ("dropped", "auto_accepted", "to_llm"):
+            if stats.get(f"rows_{outcome}"):
+                PREFILTER_ROWS.inc(stats[f"rows_{outcome}"], outcome=outcome)
+
+
+def render_metrics() -> str:
+    return REGISTRY.render()
+
+
+class Span:
+    """
+    One timed operation of a trace, shaped like an OpenTelemetry span.
+    """
+
+    def __init__(self, name: str, parent=None, attributes: dict = None):
+        self.name = name
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent else None
+        self.attributes = dict(attributes or {})
+        self.status = "ok"
+        self.start_time = time.time()
+        self.duration_ms = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_time": self.start_time,
+            "duration_ms": self.duration_ms,
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+
+_pipeline = contextvars.ContextVar("metrics_pipeline", default="none")
+_current_span = contextvars.ContextVar("metrics_span", default=None)
+_finished_spans = deque(maxlen=TRACE_BUFFER_SIZE)
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """
+    Trace a block as a child of the current span (a no-op unless TRACING_ENABLED).
+    """
+    if not TRACING_ENABLED:
+        yield Span(name, attributes=attributes)
+        return
+
+    current = Span(name, _current_span.get(), attributes)
+    token = _current_span.set(current)
+    otel_context = otel_trace.get_tracer(__name__).start_as_current_span(name) if otel_trace else None
+    otel_span = otel_context.__enter__() if otel_context else None
+    started = time.perf_counter()
+    try:
+        yield current
+    except BaseException:
+        current.status = "error"
+        raise
+    finally:
+        current.duration_ms = round((time.perf_counter() - started) * 1000, 3)
+        _current_span.reset(token)
+        _finished_spans.append(current)
+        if otel_span is not None:
+            for key, value in current.attributes.items():
+                otel_span.set_attribute(key, value)
+            otel_context.__exit__(None, None, None)
+        logger.debug(f"span {current.name} {current.duration_ms}ms {current.attributes}")
+
+
+@contextmanager
+def stage(name: str, **attributes):
+    """
+    Time one stage of the current pipeline into pipeline_stage_duration_seconds
+    and trace it as a span. Setting documents=N on the yielded span also
+    records it in pipeline_stage_documents.
+    """
+    pipeline_name = _pipeline.get()
+    started = time.perf_counter()
+    with span(f"{pipeline_name}.{name}", **attributes) as current:
+        try:
+            yield current
+        finally:
+            if METRICS_ENABLED:
+                STAGE_SECONDS.observe(time.perf_counter() - started, pipeline=pipeline_name, stage=name)
+                if current.attributes.get("documents") is not None:
+                    STAGE_DOCUMENTS.observe(current.attributes["documents"], pipeline=pipeline_name, stage=name)
+
+
+@contextmanager
+def pipeline(name: str):
+    """
+    Label the stages run inside the block with this pipeline name and time
+    the whole block as its "total" stage.
+    """
+    token = _pipeline.set(name)
+    try:
+        with stage("total") as current:
+            yield current
+    finally:
+        _pipeline.reset(token)
+
+
+def propagate_context(fn):
+    """
+    Wrap fn so that it runs in a copy of the caller's context, keeping the
+    pipeline label and parent span when it is handed to a thread pool.
+    """
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.run(fn, *args, **kwargs)
+
+
+def get_recent_spans(trace_id: str = None, limit: int = 200) -> list:
+    spans = [s.to_dict() for s in list(_finished_spans) if trace_id is None or s.trace_id == trace_id]
+    return spans[-limit:]
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """
+    Command monitoring listener: round-trip time and documents returned or
+    written per command and collection.
+    """
+
+    _IGNORED = {"hello", "ismaster", "isMaster", "ping", "buildInfo", "endSessions", "saslStart", "saslContinue"}
+
+    def __init__(self):
+        self._collections = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _collection(event) -> str:
+        target = event.command.get("collection" if event.command_name == "getMore" else event.command_name)
+        return target if isinstance(target, str) else ""
+
+    @staticmethod
+    def _documents(reply: dict):
+        cursor = reply.get("cursor")
+        if isinstance(cursor, dict):
+            return len(cursor.get("firstBatch", cursor.get("nextBatch")) or [])
+        return reply.get("n")
+
+    def started(self, event):
+        if event.command_name in self._IGNORED:
+            return
+        with self._lock:
+            self._collections[(event.connection_id, event.request_id)] = self._collection(event)
+
+    def succeeded(self, event):
+        with self._lock:
+            collection = self._collections.pop((event.connection_id, event.request_id), None)
+        if collection is None:
+            return
+        MONGO_SECONDS.observe(event.duration_micros / 1e6, command=event.command_name, collection=collection)
+        documents = self._documents(event.reply)
+        if documents is not None:
+            MONGO_DOCUMENTS.observe(documents, command=event.command_name, collection=collection)
+
+    def failed(self, event):
+        with self._lock:
+            collection = self._collections.pop((event.connection_id, event.request_id), None)
+        if collection is None:
+            return
+        MONGO_SECONDS.observe(event.duration_micros / 1e6, command=event.command_name, collection=collection)
+        MONGO_FAILURES.inc(command=event.command_name, collection=collection)
+
+
+def init_app(app):
+    """
+    Time every API request into http_request_duration_seconds (labelled by
+    route, not by URL) and open a root span per request.
+    """
+    from flask import g, request
+
+    @app.before_request
+    def _start_request_timer():
+        g.metrics_started = time.perf_counter()
+        if TRACING_ENABLED:
+            g.metrics_span = span(f"{request.method} {request.url_rule.rule if request.url_rule else 'unmatched'}")
+            g.metrics_span.__enter__()
+
+    @app.after_request
+    def _observe_request(response):
+        started = g.pop("metrics_started", None)
+        if METRICS_ENABLED and started is not None:
+            HTTP_SECONDS.observe(
+                time.perf_counter() - started,
+                endpoint=request.url_rule.rule if request.url_rule else "unmatched",
+                method=request.method,
+                status=response.status_code,
+            )
+        return response
+
+    @app.teardown_request
+    def _finish_request_span(error=None):
+        request_span = g.pop("metrics_span", None)
+        if request_span is not None:
+            request_span.__exit__(None, None, None)
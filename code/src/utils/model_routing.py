@@ -0,0 +1,142 @@
+# src/utils/model_routing.py
+
+import os
+import json
+import threading
+import logging
+
+from utils.metrics import count_llm_escalation, observe_llm_call
+
+logger = logging.getLogger(__name__)
+
+# Default chat model, used by every route that is not configured below
+LLM_MODEL = os.getenv("LLM_MODEL", "deepseek-reasoner")
+# Fast model for the high-volume transaction triage; the reasoning model ranks products
+LLM_TRIAGE_MODEL = os.getenv("LLM_TRIAGE_MODEL", "deepseek-chat")
+LLM_RANKING_MODEL = os.getenv("LLM_RANKING_MODEL", LLM_MODEL)
+# Triage rows the fast model is unsure about are re-analyzed by this model
+LLM_ESCALATION_MODEL = os.getenv("LLM_ESCALATION_MODEL", LLM_RANKING_MODEL)
+LLM_ESCALATION_CONFIDENCE = float(os.getenv("LLM_ESCALATION_CONFIDENCE", "0.6"))
+# USD per million prompt and completion tokens, e.g. {"my-model": [0.5, 1.5]}
+LLM_MODEL_PRICES_JSON = os.getenv("LLM_MODEL_PRICES")
+
+ROUTE_DEFAULT = "default"
+ROUTE_TRIAGE = "triage"
+ROUTE_RANKING = "ranking"
+ROUTE_ESCALATION = "escalation"
+
+ROUTE_MODELS = {
+    ROUTE_DEFAULT: LLM_MODEL,
+    ROUTE_TRIAGE: LLM_TRIAGE_MODEL,
+    ROUTE_RANKING: LLM_RANKING_MODEL,
+    ROUTE_ESCALATION: LLM_ESCALATION_MODEL,
+}
+
+DEFAULT_MODEL_PRICES = {
+    "deepseek-chat": (0.27, 1.10),
+    "deepseek-reasoner": (0.55, 2.19),
+}
+
+
+def load_model_prices() -> dict:
+    """
+    Built-in prices merged with LLM_MODEL_PRICES (a JSON object of
+    model -> [prompt, completion] USD per million tokens).
+    """
+    prices = dict(DEFAULT_MODEL_PRICES)
+    if LLM_MODEL_PRICES_JSON:
+        try:
+            prices.update({model: tuple(price) for model, price in json.loads(LLM_MODEL_PRICES_JSON).items()})
+        except (ValueError, TypeError) as e:
+            logger.warning(f"Ignoring invalid LLM_MODEL_PRICES: {e}")
+    return prices
+
+
+MODEL_PRICES = load_model_prices()
+
+
+def model_for(route: str) -> str:
+    """
+    The chat model configured for a route (LLM_MODEL for unknown routes).
+    """
+    return ROUTE_MODELS.get(route) or LLM_MODEL
+
+
+def should_escalate(route: str) -> bool:
+    """
+    Escalation only helps when it goes to a different model.
+    """
+    return model_for(ROUTE_ESCALATION) != model_for(route)
+
+
+def llm_cost(model: str, usage: dict) -> float:
+    """
+    USD cost of one call from its token usage (0 for models without a price).
+    """
+    prompt_price, completion_price = MODEL_PRICES.get(model, (0.0, 0.0))
+    usage = usage or {}
+    return (
+        (usage.get("prompt_tokens") or 0) * prompt_price
+        + (usage.get("completion_tokens") or 0) * completion_price
+    ) / 1_000_000
+
+
+_stats_lock = threading.Lock()
+_stats = {}
+
+
+def _route_stats(route: str, model: str) -> dict:
+    return _stats.setdefault((route, model), {
+        "calls": 0,
+        "errors": 0,
+        "seconds": 0.0,
+        "prompt_tokens": 0,
+        "completion_tokens": 0,
+        "cost_usd": 0.0,
+        "escalated_rows": 0,
+    })
+
+
+def record_llm_call(route: str, model: str, seconds: float, usage: dict = None, failed: bool = False):
+    """
+    Count one provider call of a route: latency, tokens and cost.
+    """
+    cost = 0.0 if failed else llm_cost(model, usage)
+    observe_llm_call(route, model, seconds, cost, "error" if failed else "ok")
+    with _stats_lock:
+        stats = _route_stats(route, model)
+        stats["calls"] += 1
+        stats["errors"] += int(failed)
+        stats["seconds"] += seconds
+        if usage and not failed:
+            stats["prompt_tokens"] += usage.get("prompt_tokens") or 0
+            stats["completion_tokens"] += usage.get("completion_tokens") or 0
+        stats["cost_usd"] += cost
+
+
+def record_escalation(route: str, rows: int):
+    """
+    Count rows a route handed to the escalation model.
+    """
+    count_llm_escalation(route, rows)
+    with _stats_lock:
+        _route_stats(route, model_for(route))["escalated_rows"] += rows
+
+
+def get_route_stats() -> dict:
+    """
+    Configured models and cumulative per-route counters for this process.
+    """
+    with _stats_lock:
+        routes = [
+            {
+                "route": route,
+                "model": model,
+                **stats,
+                "seconds": round(stats["seconds"], 3),
+                "mean_seconds": round(stats["seconds"] / stats["calls"], 3) if stats["calls"] else None,
+                "cost_usd": round(stats["cost_usd"], 6),
+            }
+            for (route, model), stats in sorted(_stats.items())
+        ]
+    return {"models": dict(ROUTE_MODELS), "escalation_confidence": LLM_ESCALATION_CONFIDENCE, "routes": routes}
@@ -1,22 +1,286 @@
 # src/utils/openai_util.py
 
 import os
-import openai
+import time
+import random
+import atexit
+import asyncio
+import threading
+import logging
+import httpx
 
-def get_openai_client(api_key: str = None, base_url: str = None):
+from utils.json_provider import loads
+
+logger = logging.getLogger(__name__)
+
+LLM_CONNECT_TIMEOUT_SECONDS = float(os.getenv("LLM_CONNECT_TIMEOUT_SECONDS", "10"))
+LLM_READ_TIMEOUT_SECONDS = float(os.getenv("LLM_READ_TIMEOUT_SECONDS", "180"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_BACKOFF_BASE_SECONDS = float(os.getenv("LLM_BACKOFF_BASE_SECONDS", "0.5"))
+LLM_BACKOFF_MAX_SECONDS = float(os.getenv("LLM_BACKOFF_MAX_SECONDS", "30"))
+# Requests in flight per process, across all threads (and per event loop for asyncio callers)
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class LLMHTTPError(Exception):
+    """
+    Raised when the chat completions endpoint fails after all retries.
+    """
+    def __init__(self, message: str, status_code: int = None, body: str = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.body = body
+
+
+class LLMClient:
+    """
+    Long-lived client for an OpenAI-compatible chat completions API.
+    Connections are pooled by httpx and reused across calls. Every request
+    has connect/read timeouts, is retried with jittered exponential backoff
+    on 429/5xx and transport errors, and waits for a slot of the concurrency
+    limiter. chat_completion() is the sync interface and achat_completion()
+    the asyncio one; both return the decoded JSON response.
+    stream_chat_completion() yields the chunks of a streamed completion.
+    """
+
+    def __init__(self, api_key: str = None, base_url: str = None, max_retries: int = None,
+                 max_concurrency: int = None, timeout: httpx.Timeout = None):
+        self.api_key = api_key if api_key is not None else os.getenv("OPENAI_API_KEY", "")
+        self.base_url = (base_url or os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")).rstrip("/")
+        self.max_retries = LLM_MAX_RETRIES if max_retries is None else max_retries
+        self.max_concurrency = max_concurrency or LLM_MAX_CONCURRENCY
+        self.timeout = timeout or httpx.Timeout(LLM_READ_TIMEOUT_SECONDS, connect=LLM_CONNECT_TIMEOUT_SECONDS)
+        self.limits = httpx.Limits(max_connections=LLM_MAX_CONNECTIONS, max_keepalive_connections=LLM_MAX_CONNECTIONS)
+
+        self._client = httpx.Client(
+            base_url=self.base_url, headers=self._headers(), timeout=self.timeout, limits=self.limits
+        )
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+        # httpx.AsyncClient and asyncio.Semaphore are bound to the event loop they are used on
+        self._async_client = None
+        self._async_slots = None
+        self._async_loop = None
+
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "retries": 0, "failures": 0}
+
+    def _headers(self) -> dict:
+        return {"Authorization": f"Bearer {self.api_key}", "Content-Type": "application/json"}
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def _backoff(self, attempt: int, response: httpx.Response = None) -> float:
+        """
+        Full-jitter exponential backoff, honouring a numeric Retry-After header.
+        """
+        if response is not None:
+            retry_after = response.headers.get("Retry-After")
+            if retry_after and retry_after.replace(".", "", 1).isdigit():
+                return min(float(retry_after), LLM_BACKOFF_MAX_SECONDS)
+        return random.uniform(0, min(LLM_BACKOFF_MAX_SECONDS, LLM_BACKOFF_BASE_SECONDS * (2 ** attempt)))
+
+    @staticmethod
+    def _payload(model: str, messages: list, temperature: float = None, **kwargs) -> dict:
+        payload = {"model": model, "messages": messages, **kwargs}
+        if temperature is not None:
+            payload["temperature"] = temperature
+        return payload
+
+    @staticmethod
+    def _error(response: httpx.Response) -> LLMHTTPError:
+        return LLMHTTPError(
+            f"Chat completion failed with HTTP {response.status_code}",
+            status_code=response.status_code,
+            body=response.text[:1000],
+        )
+
+    def _decode(self, response: httpx.Response) -> dict:
+        """
+        The JSON body of a successful response; a body that is not JSON is an LLMHTTPError.
+        """
+        try:
+            return loads(response.content)
+        except ValueError:
+            raise self._fail(LLMHTTPError(
+                f"Chat completion response (HTTP {response.status_code}) is not valid JSON",
+                status_code=response.status_code,
+                body=response.text[:1000],
+            ))
+
+    def _fail(self, error: LLMHTTPError) -> LLMHTTPError:
+        self._count("failures")
+        return error
+
+    def chat_completion(self, model: str, messages: list, temperature: float = None, **kwargs) -> dict:
+        """
+        POST /chat/completions and return the decoded response.
+        Raises LLMHTTPError once retries are exhausted.
+        """
+        payload = self._payload(model, messages, temperature, **kwargs)
+        attempt = 0
+        while True:
+            response = None
+            try:
+                self._count("requests")
+                with self._slots:
+                    response = self._client.post("/chat/completions", json=payload)
+                if response.status_code < 400:
+                    return self._decode(response)
+                if response.status_code not in RETRYABLE_STATUS_CODES:
+                    raise self._fail(self._error(response))
+                error = self._error(response)
+            except httpx.TransportError as e:
+                error = LLMHTTPError(f"Chat completion request failed: {e!r}")
+
+            if attempt >= self.max_retries:
+                raise self._fail(error)
+            delay = self._backoff(attempt, response)
+            logger.warning(f"LLM request failed ({error}), retry {attempt + 1}/{self.max_retries} in {delay:.2f}s")
+            self._count("retries")
+            attempt += 1
+            time.sleep(delay)
+
+    def stream_chat_completion(self, model: str, messages: list, temperature: float = None, **kwargs):
+        """
+        POST /chat/completions with "stream": true and yield every decoded
+        chunk of the server-sent event stream as it arrives; the last one
+        carries the token usage. The request is retried like chat_completion()
+        until the first chunk is yielded. After that a failure raises
+        LLMHTTPError right away, since the caller has already used part of
+        the answer.
+        """
+        payload = self._payload(
+            model, messages, temperature, stream=True, stream_options={"include_usage": True}, **kwargs
+        )
+        attempt = 0
+        yielded = False
+        while True:
+            response = None
+            try:
+                self._count("requests")
+                with self._slots, self._client.stream("POST", "/chat/completions", json=payload) as response:
+                    if response.status_code < 400:
+                        for chunk in self._iter_events(response):
+                            yielded = True
+                            yield chunk
+                        return
+                    response.read()
+                    if response.status_code not in RETRYABLE_STATUS_CODES:
+                        raise self._fail(self._error(response))
+                    error = self._error(response)
+            except httpx.TransportError as e:
+                error = LLMHTTPError(f"Chat completion stream failed: {e!r}")
+                if yielded:
+                    raise self._fail(error)
+
+            if attempt >= self.max_retries:
+                raise self._fail(error)
+            delay = self._backoff(attempt, response)
+            logger.warning(f"LLM stream failed ({error}), retry {attempt + 1}/{self.max_retries} in {delay:.2f}s")
+            self._count("retries")
+            attempt += 1
+            time.sleep(delay)
+
+    def _iter_events(self, response: httpx.Response):
+        """
+        Decode the "data:" lines of a server-sent event stream up to [DONE].
+        Raises LLMHTTPError on an event that is not valid JSON.
+        """
+        for line in response.iter_lines():
+            if not line.startswith("data:"):
+                continue
+            data = line[5:].strip()
+            if data == "[DONE]":
+                return
+            if not data:
+                continue
+            try:
+                chunk = loads(data)
+            except ValueError:
+                raise self._fail(LLMHTTPError(
+                    "Chat completion stream event is not valid JSON", status_code=response.status_code,
+                    body=data[:1000],
+                ))
+            yield chunk
+
+    def _async_resources(self):
+        loop = asyncio.get_running_loop()
+        if self._async_loop is not loop:
+            self._async_client = httpx.AsyncClient(
+                base_url=self.base_url, headers=self._headers(), timeout=self.timeout, limits=self.limits
+            )
+            self._async_slots = asyncio.Semaphore(self.max_concurrency)
+            self._async_loop = loop
+        return self._async_client, self._async_slots
+
+    async def achat_completion(self, model: str, messages: list, temperature: float = None, **kwargs) -> dict:
+        """
+        asyncio version of chat_completion(), retried the same way.
+        """
+        client, slots = self._async_resources()
+        payload = self._payload(model, messages, temperature, **kwargs)
+        attempt = 0
+        while True:
+            response = None
+            try:
+                self._count("requests")
+                async with slots:
+                    response = await client.post("/chat/completions", json=payload)
+                if response.status_code < 400:
+                    return self._decode(response)
+                if response.status_code not in RETRYABLE_STATUS_CODES:
+                    raise self._fail(self._error(response))
+                error = self._error(response)
+            except httpx.TransportError as e:
+                error = LLMHTTPError(f"Chat completion request failed: {e!r}")
+
+            if attempt >= self.max_retries:
+                raise self._fail(error)
+            delay = self._backoff(attempt, response)
+            logger.warning(f"LLM request failed ({error}), retry {attempt + 1}/{self.max_retries} in {delay:.2f}s")
+            self._count("retries")
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    async def aclose(self):
+        """
+        Close the connections of the asyncio client, from the loop that used it.
+        """
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+            self._async_loop = None
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return dict(self.stats)
+
+    def close(self):
+        self._client.close()
+
+
+_llm_client = None
+_llm_client_pid = None
+_llm_client_lock = threading.Lock()
+
+
+def get_llm_client() -> LLMClient:
     """
-    Initialize the openai module with an API key and a base URL.
-    If not provided, it falls back to environment variables:
-      - OPENAI_API_KEY
-      - OPENAI_BASE_URL (defaults to "https://api.openai.com/v1" if not set)
-    Returns the openai module with the configuration applied.
+    Return the per-process LLM client (connection pools do not survive a fork).
+    Configured from OPENAI_API_KEY and OPENAI_BASE_URL
+    (defaults to "https://api.openai.com/v1").
     """
-    if not api_key:
-        api_key = os.getenv("OPENAI_API_KEY", "")
-    if not base_url:
-        base_url = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
-    
-    openai.api_key = api_key
-    openai.api_base = base_url
-    
-    return openai
+    global _llm_client, _llm_client_pid
+    pid = os.getpid()
+    if _llm_client is None or _llm_client_pid != pid:
+        with _llm_client_lock:
+            if _llm_client is None or _llm_client_pid != pid:
+                _llm_client = LLMClient()
+                _llm_client_pid = pid
+                atexit.register(_llm_client.close)
+    return _llm_client
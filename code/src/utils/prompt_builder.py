@@ -0,0 +1,175 @@
+# src/utils/prompt_builder.py
+
+import os
+from collections import Counter, OrderedDict
+
+from utils.llm_batch import estimate_tokens
+
+PROMPT_MAX_TOKENS = int(os.getenv("PROMPT_MAX_TOKENS", "12000"))
+# Descriptions seen at least this many times are listed once and referenced
+PROMPT_DEDUPE_MIN_REPEATS = int(os.getenv("PROMPT_DEDUPE_MIN_REPEATS", "2"))
+
+REFERENCES_HEADING = "Repeated descriptions (referenced as [Dn]):"
+SUMMARY_HEADING = "Transactions not listed above, summarized by merchant category:"
+
+
+def _summary_line(category: str, transactions: list) -> str:
+    amounts = [float(tx["amount"]) for tx in transactions]
+    debits = sum(1 for tx in transactions if tx.get("transaction_type") == "Debit")
+    return (
+        f"  {category}: {len(transactions)} transactions, total {sum(amounts):.2f}, "
+        f"largest {max(amounts):.2f}, debits {debits}, credits {len(transactions) - debits}"
+    )
+
+
+class PromptBuilder:
+    """
+    Assemble a (system_prompt, user_message) pair within a token budget.
+    The system prompt must hold only static instructions, so the provider
+    can cache it as a shared prefix; everything specific to the request
+    (customer, products, transactions) goes into the user message.
+
+    Transactions are grouped by merchant category and repeated descriptions
+    are listed once. Transactions that do not fit the budget are replaced by
+    one summary line per merchant category; they are kept in self.summarized.
+    """
+
+    def __init__(self, system_prompt: str, footer: str = "", max_tokens: int = None):
+        self.system_prompt = system_prompt
+        self.footer = footer
+        self.max_tokens = max_tokens or PROMPT_MAX_TOKENS
+        self.sections = []
+        self.summarized = []
+        self.used = estimate_tokens(system_prompt) + estimate_tokens(footer)
+        self.stats = {
+            "budget_tokens": self.max_tokens,
+            "transactions_listed": 0,
+            "transactions_summarized": 0,
+            "descriptions_deduplicated": 0,
+            "lines_dropped": 0,
+        }
+
+    def remaining(self) -> int:
+        return self.max_tokens - self.used
+
+    def add_text(self, text: str):
+        """
+        Add a section unconditionally (small, required content).
+        """
+        self.sections.append(text)
+        self.used += estimate_tokens(text)
+
+    def add_lines(self, heading: str, lines: list) -> int:
+        """
+        Add a heading followed by as many lines as fit the remaining budget.
+        :return: number of lines added
+        """
+        kept = [heading]
+        used = estimate_tokens(heading)
+        for line in lines:
+            line_tokens = estimate_tokens(line)
+            if used + line_tokens > self.remaining():
+                break
+            kept.append(line)
+            used += line_tokens
+        self.sections.append("\n".join(kept))
+        self.used += used
+        self.stats["lines_dropped"] += len(lines) - (len(kept) - 1)
+        return len(kept) - 1
+
+    def add_transactions(self, transactions: list, heading: str = "Transactions:"):
+        """
+        Add transactions in compressed form. The largest amounts are listed
+        first; the rest are summarized per merchant category.
+        """
+        transactions = list(transactions)
+        if not transactions:
+            self.add_text(f"{heading}\nNone")
+            return
+
+        repeats = Counter(tx.get("description") for tx in transactions)
+        references = {}
+
+        by_category = OrderedDict()
+        for tx in transactions:
+            by_category.setdefault(tx.get("merchant_category") or "Unknown", []).append(tx)
+
+        # Room kept for summarizing every category, so the fallback always fits
+        summary_reserve = estimate_tokens(SUMMARY_HEADING) + sum(
+            estimate_tokens(_summary_line(c, txs)) for c, txs in by_category.items()
+        )
+        available = self.remaining() - estimate_tokens(heading) - summary_reserve
+
+        listed, listed_ids, used = [], set(), 0
+        seen_categories = set()
+        for tx in sorted(transactions, key=lambda t: -float(t["amount"])):
+            description = tx.get("description")
+            category = tx.get("merchant_category") or "Unknown"
+            reference = references.get(description)
+            new_reference = reference is None and repeats[description] >= PROMPT_DEDUPE_MIN_REPEATS
+            cost = 0
+            if new_reference:
+                reference = f"D{len(references) + 1}"
+                cost += estimate_tokens(f"  {reference}: {description}")
+                if not references:
+                    cost += estimate_tokens(REFERENCES_HEADING)
+            cost += estimate_tokens(self._render_transaction(tx, reference))
+            if category not in seen_categories:
+                cost += estimate_tokens(f"Merchant Category: {category}")
+            if used + cost > available:
+                break
+            if new_reference:
+                references[description] = reference
+            seen_categories.add(category)
+            listed.append(tx)
+            listed_ids.add(id(tx))
+            used += cost
+
+        lines = [heading]
+        if references:
+            lines.append(REFERENCES_HEADING)
+            lines.extend(f"  {ref}: {description}" for description, ref in references.items())
+        for category, category_txs in by_category.items():
+            category_listed = [tx for tx in category_txs if id(tx) in listed_ids]
+            if category_listed:
+                lines.append(f"Merchant Category: {category}")
+                lines.extend(
+                    self._render_transaction(tx, references.get(tx.get("description")))
+                    for tx in category_listed
+                )
+
+        summarized = {
+            category: [tx for tx in category_txs if id(tx) not in listed_ids]
+            for category, category_txs in by_category.items()
+        }
+        summarized = {category: txs for category, txs in summarized.items() if txs}
+        if summarized:
+            lines.append(SUMMARY_HEADING)
+            lines.extend(_summary_line(category, txs) for category, txs in summarized.items())
+            self.summarized.extend(tx for txs in summarized.values() for tx in txs)
+
+        self.add_text("\n".join(lines))
+        self.stats["transactions_listed"] += len(listed)
+        self.stats["transactions_summarized"] += len(transactions) - len(listed)
+        self.stats["descriptions_deduplicated"] += sum(1 for tx in listed if tx.get("description") in references)
+
+    @staticmethod
+    def _render_transaction(tx: dict, reference: str = None) -> str:
+        description = f"[{reference}]" if reference else tx.get("description")
+        return (
+            f"  TransactionID: {tx['transaction_id']}, "
+            f"Transaction Type: {tx['transaction_type']}, "
+            f"Amount: {tx['amount']}, "
+            f"Balance After Transaction: {tx['balance_after_transaction']}, "
+            f"Description: {description}"
+        )
+
+    def build(self):
+        """
+        :return: (system_prompt, user_message); token counts are left in self.stats
+        """
+        user_message = "\n".join(self.sections + ([self.footer] if self.footer else []))
+        self.stats["system_tokens"] = estimate_tokens(self.system_prompt)
+        self.stats["user_tokens"] = estimate_tokens(user_message)
+        self.stats["total_tokens"] = self.stats["system_tokens"] + self.stats["user_tokens"]
+        return self.system_prompt, user_message
@@ -0,0 +1,238 @@
+# src/utils/singleflight.py
+
+import os
+import time
+import uuid
+import socket
+import threading
+import logging
+from datetime import datetime, timedelta
+from pymongo.errors import DuplicateKeyError
+
+from utils.db_utils import get_database
+
+logger = logging.getLogger(__name__)
+
+SINGLEFLIGHT_ENABLED = os.getenv("SINGLEFLIGHT_ENABLED", "true").lower() == "true"
+# Lease held by the worker computing a key; renewed while it runs
+SINGLEFLIGHT_LEASE_SECONDS = int(os.getenv("SINGLEFLIGHT_LEASE_SECONDS", "60"))
+# How long a finished result is handed to requests arriving after it completed
+SINGLEFLIGHT_RESULT_TTL_SECONDS = int(os.getenv("SINGLEFLIGHT_RESULT_TTL_SECONDS", "10"))
+SINGLEFLIGHT_WAIT_SECONDS = float(os.getenv("SINGLEFLIGHT_WAIT_SECONDS", "900"))
+SINGLEFLIGHT_POLL_SECONDS = float(os.getenv("SINGLEFLIGHT_POLL_SECONDS", "0.5"))
+
+SINGLEFLIGHT_COLLECTION = "singleflight"
+
+STATUS_RUNNING = "running"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+
+class SingleFlightTimeoutError(Exception):
+    """
+    Raised when a waiter gives up on another worker's in-flight computation.
+    """
+
+
+class SingleFlightError(Exception):
+    """
+    Raised in waiters when the computation they joined failed.
+    """
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls for the same key into one computation.
+
+    Threads of one process share an in-flight call directly. Across processes
+    (gunicorn workers, nodes) the first caller takes a lease on the key in the
+    singleflight collection and stores the result there; the others poll the
+    document until it is done. A lease that is not renewed (crashed worker)
+    expires and the next waiter takes over.
+    """
+
+    def __init__(self, lease_seconds: int = None, result_ttl_seconds: int = None,
+                 wait_seconds: float = None, poll_seconds: float = None):
+        self.lease_seconds = lease_seconds or SINGLEFLIGHT_LEASE_SECONDS
+        self.result_ttl_seconds = SINGLEFLIGHT_RESULT_TTL_SECONDS if result_ttl_seconds is None else result_ttl_seconds
+        self.wait_seconds = wait_seconds or SINGLEFLIGHT_WAIT_SECONDS
+        self.poll_seconds = poll_seconds or SINGLEFLIGHT_POLL_SECONDS
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.stats = {"leader": 0, "joined_local": 0, "joined_remote": 0, "takeovers": 0}
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def do(self, key: str, fn):
+        """
+        Return fn() for key, sharing the computation with concurrent callers.
+        Raises SingleFlightTimeoutError or SingleFlightError in waiters.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            self._count("joined_local")
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = self._do_distributed(key, fn)
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+    def _acquire(self, coll, key: str, owner: str) -> bool:
+        now = datetime.utcnow()
+        lease_expires_at = now + timedelta(seconds=self.lease_seconds)
+        try:
+            coll.find_one_and_update(
+                {
+                    "_id": key,
+                    "$or": [
+                        {"status": STATUS_RUNNING, "lease_expires_at": {"$lt": now}},
+                        {"status": STATUS_DONE, "finished_at": {"$lt": now - timedelta(seconds=self.result_ttl_seconds)}},
+                        {"status": STATUS_FAILED},
+                    ],
+                },
+                {
+                    "$set": {
+                        "status": STATUS_RUNNING,
+                        "owner": owner,
+                        "lease_expires_at": lease_expires_at,
+                        "started_at": now,
+                        # Collected by the TTL index if the owner never finishes
+                        "expires_at": lease_expires_at + timedelta(hours=1),
+                    },
+                    "$unset": {"result": "", "error": "", "finished_at": ""},
+                },
+                upsert=True,
+            )
+            return True
+        except DuplicateKeyError:
+            # The document exists but is running under a live lease or holds a fresh result
+            return False
+
+    def _renew(self, coll, key: str, owner: str, stop: threading.Event):
+        while not stop.wait(self.lease_seconds / 3):
+            lease_expires_at = datetime.utcnow() + timedelta(seconds=self.lease_seconds)
+            result = coll.update_one(
+                {"_id": key, "owner": owner, "status": STATUS_RUNNING},
+                {"$set": {"lease_expires_at": lease_expires_at, "expires_at": lease_expires_at + timedelta(hours=1)}},
+            )
+            if result.matched_count == 0:
+                logger.warning(f"Lost the singleflight lease on {key}")
+                return
+
+    def _run_as_leader(self, coll, key: str, owner: str, fn):
+        self._count("leader")
+        stop = threading.Event()
+        renewer = threading.Thread(target=self._renew, args=(coll, key, owner, stop), daemon=True)
+        renewer.start()
+        try:
+            result = fn()
+        except Exception as e:
+            coll.update_one(
+                {"_id": key, "owner": owner},
+                {"$set": {"status": STATUS_FAILED, "error": str(e), "finished_at": datetime.utcnow()}},
+            )
+            raise
+        finally:
+            stop.set()
+
+        finished_at = datetime.utcnow()
+        try:
+            coll.update_one(
+                {"_id": key, "owner": owner},
+                {"$set": {
+                    "status": STATUS_DONE,
+                    "result": result,
+                    "finished_at": finished_at,
+                    "expires_at": finished_at + timedelta(seconds=self.result_ttl_seconds),
+                }},
+            )
+        except Exception as e:
+            # e.g. a result too large or not BSON encodable: remote waiters get an error
+            logger.warning(f"Could not share the result of {key}: {e}")
+            coll.update_one(
+                {"_id": key, "owner": owner},
+                {"$set": {"status": STATUS_FAILED, "error": str(e), "finished_at": finished_at}},
+            )
+        return result
+
+    def _do_distributed(self, key: str, fn):
+        coll = get_database()[SINGLEFLIGHT_COLLECTION]
+        owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+        if self._acquire(coll, key, owner):
+            return self._run_as_leader(coll, key, owner, fn)
+
+        self._count("joined_remote")
+        deadline = time.monotonic() + self.wait_seconds
+        while time.monotonic() < deadline:
+            doc = coll.find_one({"_id": key}, {"status": 1, "result": 1, "error": 1, "lease_expires_at": 1})
+            if doc is not None and doc["status"] == STATUS_DONE:
+                return doc.get("result")
+            if doc is not None and doc["status"] == STATUS_FAILED:
+                raise SingleFlightError(doc.get("error") or f"Computation of {key} failed")
+            if doc is None or doc["lease_expires_at"] < datetime.utcnow():
+                # The leader crashed or the result was already collected: take over
+                if self._acquire(coll, key, owner):
+                    self._count("takeovers")
+                    return self._run_as_leader(coll, key, owner, fn)
+            time.sleep(self.poll_seconds)
+
+        raise SingleFlightTimeoutError(f"Timed out after {self.wait_seconds}s waiting for {key}")
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats)
+            stats["in_flight"] = len(self._calls)
+        return stats
+
+
+_singleflight = None
+_singleflight_pid = None
+_singleflight_lock = threading.Lock()
+
+
+def get_singleflight() -> SingleFlight:
+    """
+    Return the per-process singleflight group.
+    """
+    global _singleflight, _singleflight_pid
+    pid = os.getpid()
+    if _singleflight is None or _singleflight_pid != pid:
+        with _singleflight_lock:
+            if _singleflight is None or _singleflight_pid != pid:
+                _singleflight = SingleFlight()
+                _singleflight_pid = pid
+    return _singleflight
+
+
+def coalesce(key: str, fn):
+    """
+    Run fn() through the singleflight group, or directly when SINGLEFLIGHT_ENABLED is off.
+    """
+    if not SINGLEFLIGHT_ENABLED:
+        return fn()
+    return get_singleflight().do(key, fn)
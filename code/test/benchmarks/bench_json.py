@@ -0,0 +1,142 @@
+# test/benchmarks/bench_json.py
+
+import os
+import sys
+import json
+import argparse
+from bson import ObjectId
+
+sys.path.append(os.path.dirname(__file__))
+
+import harness
+from harness import Scenario, run_scenario
+from fake_llm_server import fake_completion_body
+from synthetic_data import iter_transactions
+
+harness.configure_environment("mongomock")
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+from utils import json_provider
+
+
+def legacy_clean_completion_text(text: str) -> str:
+    """
+    The fence stripping used before utils.json_provider (split into lines,
+    drop the fence lines, join again), kept here as the baseline.
+    """
+    text = text.strip()
+    if text.startswith("```"):
+        lines = text.splitlines()
+        if lines[0].startswith("```"):
+            lines = lines[1:]
+        if lines and lines[-1].startswith("```"):
+            lines = lines[:-1]
+        text = "\n".join(lines).strip()
+    return text
+
+
+def make_pages(rows: int, page_size: int) -> list:
+    """
+    Transaction documents as they come back from MongoDB, split into pages.
+    """
+    docs = [{"_id": ObjectId(), **doc} for doc in iter_transactions(rows, max(1, rows // 100), 30)]
+    return [docs[start:start + page_size] for start in range(0, len(docs), page_size)]
+
+
+def make_completions(count: int, transactions_per_prompt: int) -> list:
+    """
+    Fenced completions as the fake LLM server returns them for the by-date analysis.
+    """
+    completions = []
+    for i in range(count):
+        ids = "\n".join(f"TransactionID: tx{i * transactions_per_prompt + n:09d}" for n in range(transactions_per_prompt))
+        body = fake_completion_body([
+            {"role": "system", "content": "Return valid_transactions"},
+            {"role": "user", "content": ids},
+        ])
+        completions.append("```json\n" + json.dumps(body, indent=2) + "\n```\n")
+    return completions
+
+
+def serialization_scenarios(pages: list) -> list:
+    app = Flask(__name__)
+    default_provider = DefaultJSONProvider(app)
+    provider = json_provider.JSONProvider(app)
+
+    def before(i, context):
+        # The services converted every _id to str before jsonify()
+        page = [dict(doc) for doc in pages[i % len(pages)]]
+        for doc in page:
+            doc["_id"] = str(doc["_id"])
+        with app.app_context():
+            default_provider.response({"transactions": page, "count": len(page)}).get_data()
+        return len(page)
+
+    def after(i, context):
+        page = pages[i % len(pages)]
+        with app.app_context():
+            provider.response({"transactions": page, "count": len(page)}).get_data()
+        return len(page)
+
+    iterations = max(len(pages), 20)
+    return [
+        Scenario("serialize_rows_before", before, iterations, unit="rows", warmup=2),
+        Scenario("serialize_rows_after", after, iterations, unit="rows", warmup=2),
+    ]
+
+
+def parse_scenarios(completions: list) -> list:
+    def before(i, context):
+        parsed = json.loads(legacy_clean_completion_text(completions[i % len(completions)]))
+        return len(parsed["valid_transactions"])
+
+    def after(i, context):
+        parsed = json_provider.parse_completion_json(completions[i % len(completions)])
+        return len(parsed["valid_transactions"])
+
+    return [
+        Scenario("parse_completion_before", before, len(completions), unit="transactions", warmup=2),
+        Scenario("parse_completion_after", after, len(completions), unit="transactions", warmup=2),
+    ]
+
+
+def with_allocations(result: dict, scenario: Scenario, per_operation: int) -> dict:
+    """
+    Add the per-item time and the peak allocation of one operation to a result.
+    """
+    allocations = harness.measure_allocations(lambda: scenario.operation(0, None))
+    return {
+        **result,
+        "ns_per_item": round(result["seconds"] * 1e9 / (result["items"] or 1)),
+        **allocations,
+        "alloc_peak_bytes_per_item": round(allocations["alloc_peak_bytes"] / per_operation),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Response serialization and completion parsing, before and after utils.json_provider.")
+    parser.add_argument("--rows", type=int, default=20000, help="Synthetic transactions to serialize.")
+    parser.add_argument("--page-size", type=int, default=500)
+    parser.add_argument("--completions", type=int, default=500, help="Fenced completions to parse.")
+    parser.add_argument("--transactions-per-prompt", type=int, default=200)
+    parser.add_argument("--output", help="Write the JSON report to this file.")
+    args = parser.parse_args()
+
+    pages = make_pages(args.rows, args.page_size)
+    completions = make_completions(args.completions, args.transactions_per_prompt)
+
+    results = []
+    for scenario in serialization_scenarios(pages):
+        print(f"Running {scenario.name}...", file=sys.stderr)
+        results.append(with_allocations(run_scenario(scenario), scenario, len(pages[0])))
+    for scenario in parse_scenarios(completions):
+        print(f"Running {scenario.name}...", file=sys.stderr)
+        results.append(with_allocations(run_scenario(scenario), scenario, args.transactions_per_prompt // 2))
+
+    dataset = {"rows": args.rows, "pages": len(pages), "completions": len(completions)}
+    harness.write_report(harness.build_report(vars(args), dataset, results, {"orjson": json_provider.orjson is not None}), args.output)
+
+
+if __name__ == "__main__":
+    main()
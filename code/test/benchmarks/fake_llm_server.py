@@ -0,0 +1,212 @@
+# test/benchmarks/fake_llm_server.py
+
+import re
+import json
+import time
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_TRANSACTION_ID_RE = re.compile(r"TransactionID: ([\w-]+)")
+_PRODUCT_ID_RE = re.compile(r"product_id: ([\w-]+)")
+# Characters of completion text per streamed chunk (about 4 tokens)
+STREAM_CHUNK_CHARS = 16
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def fake_completion_body(messages: list, pick_every: int = 2, max_products: int = 5, unsure_every: int = 5) -> dict:
+    """
+    Answer in the shape the prompt asks for, using ids found in the prompt:
+    every pick_every-th transaction, or the first max_products products.
+    When the prompt asks for confidences, every unsure_every-th pick gets a
+    low one and every unsure_every-th other transaction is listed as uncertain.
+    """
+    system = messages[0]["content"] if messages else ""
+    user = messages[-1]["content"] if messages else ""
+    if "valid_products" in system:
+        product_ids = _PRODUCT_ID_RE.findall(user)
+        return {"valid_products": [
+            {"product_id": product_id, "product_name": product_id, "reason": "Synthetic match", "priority": priority}
+            for priority, product_id in enumerate(product_ids[:max_products], start=1)
+        ]}
+    transaction_ids = _TRANSACTION_ID_RE.findall(user)
+    picked = [
+        {"transaction_id": transaction_id, "reason": "Synthetic pick"}
+        for transaction_id in transaction_ids[::pick_every]
+    ]
+    if "uncertain_transactions" in system:
+        for index, item in enumerate(picked):
+            item["confidence"] = 0.4 if index % unsure_every == unsure_every - 1 else 0.9
+        others = [transaction_id for index, transaction_id in enumerate(transaction_ids) if index % pick_every]
+        return {"valid_transactions": picked, "uncertain_transactions": others[::unsure_every]}
+    if "valid_transactions" in system:
+        return {"valid_transactions": picked}
+    return picked
+
+
+class FakeLLMServer:
+    """
+    OpenAI-compatible POST /v1/chat/completions served from a background thread.
+    Each response waits latency_ms plus per_token_ms per completion token and
+    echoes the token usage of the request (prompt tokens estimated at 4 chars
+    per token), so LLM time and prompt size show up in the benchmarks without
+    a provider. error_rate makes that share of requests answer 503.
+    Requests with "stream": true get server-sent event chunks instead: the
+    first after latency_ms, the following ones per_token_ms per token apart.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency_ms: float = 0.0,
+                 per_token_ms: float = 0.0, error_rate: float = 0.0):
+        self.latency_ms = latency_ms
+        self.per_token_ms = per_token_ms
+        self.error_rate = error_rate
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "errors": 0, "prompt_tokens": 0, "completion_tokens": 0, "models": {}}
+        self._httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, status: int, body: dict):
+                payload = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _send_events(self, events):
+                # No Content-Length: the stream ends when the connection closes
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                self.close_connection = True
+                for event in events:
+                    self.wfile.write(b"data: " + json.dumps(event).encode("utf-8") + b"\n\n")
+                    self.wfile.flush()
+                self.wfile.write(b"data: [DONE]\n\n")
+
+            def do_POST(self):
+                request = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+                if self.path.rstrip("/") not in ("/v1/chat/completions", "/chat/completions"):
+                    self._send(404, {"error": {"message": f"Unknown path {self.path}"}})
+                    return
+                status, body = server.complete(request)
+                if status == 200 and request.get("stream"):
+                    self._send_events(body)
+                else:
+                    self._send(status, body)
+
+        return Handler
+
+    def _should_fail(self, request_number: int) -> bool:
+        return self.error_rate > 0 and request_number % max(1, round(1 / self.error_rate)) == 0
+
+    def complete(self, request: dict):
+        """
+        :return: (status, response body) for one chat completions request
+        """
+        messages = request.get("messages") or []
+        with self._lock:
+            self.stats["requests"] += 1
+            request_number = self.stats["requests"]
+            models = self.stats["models"]
+            models[request.get("model")] = models.get(request.get("model"), 0) + 1
+        if self._should_fail(request_number):
+            with self._lock:
+                self.stats["errors"] += 1
+            return 503, {"error": {"message": "Synthetic overload"}}
+
+        content = "```json\n" + json.dumps(fake_completion_body(messages)) + "\n```"
+        prompt_tokens = sum(estimate_tokens(m.get("content") or "") for m in messages)
+        completion_tokens = estimate_tokens(content)
+        with self._lock:
+            self.stats["prompt_tokens"] += prompt_tokens
+            self.stats["completion_tokens"] += completion_tokens
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+        if request.get("stream"):
+            return 200, self._stream_chunks(request_number, request.get("model"), content, usage)
+
+        time.sleep((self.latency_ms + self.per_token_ms * completion_tokens) / 1000.0)
+        return 200, {
+            "id": f"chatcmpl-bench-{request_number}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": usage,
+        }
+
+    def _stream_chunks(self, request_number: int, model: str, content: str, usage: dict):
+        """
+        Yield chat.completion.chunk events of content, paced like a provider.
+        """
+        base = {"id": f"chatcmpl-bench-{request_number}", "object": "chat.completion.chunk",
+                "created": int(time.time()), "model": model}
+        time.sleep(self.latency_ms / 1000.0)
+        for start in range(0, len(content), STREAM_CHUNK_CHARS):
+            piece = content[start:start + STREAM_CHUNK_CHARS]
+            if start:
+                time.sleep(self.per_token_ms * estimate_tokens(piece) / 1000.0)
+            yield {**base, "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]}
+        yield {**base, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+        yield {**base, "choices": [], "usage": usage}
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {**self.stats, "models": dict(self.stats["models"])}
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="fake-llm-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self._httpd.serve_forever()
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a fake OpenAI-compatible chat completions API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency-ms", type=float, default=200.0, help="Fixed delay of every response.")
+    parser.add_argument("--per-token-ms", type=float, default=0.0, help="Extra delay per completion token.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with HTTP 503.")
+    args = parser.parse_args()
+    server = FakeLLMServer(args.host, args.port, args.latency_ms, args.per_token_ms, args.error_rate)
+    print(f"Fake LLM listening on {server.base_url} (set OPENAI_BASE_URL to this)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
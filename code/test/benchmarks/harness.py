@@ -0,0 +1,223 @@
+# test/benchmarks/harness.py
+
+import os
+import sys
+import json
+import time
+import platform
+import resource
+import subprocess
+import threading
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+SRC_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "src"))
+
+
+def configure_environment(backend: str, mongo_uri: str = None, db_name: str = "benchmarks",
+                          llm_base_url: str = None, llm_cache: bool = False, work_dir: str = None):
+    """
+    Set the app's env config for a benchmark run. Must run before any app
+    module is imported, since they read their settings at import time.
+    """
+    if SRC_DIR not in sys.path:
+        sys.path.append(SRC_DIR)
+    os.environ["DB_NAME"] = db_name
+    os.environ["OPENAI_API_KEY"] = os.environ.get("OPENAI_API_KEY") or "benchmark"
+    if llm_base_url:
+        os.environ["OPENAI_BASE_URL"] = llm_base_url
+    os.environ["LLM_CACHE_ENABLED"] = "true" if llm_cache else "false"
+    if work_dir:
+        os.environ["JOBS_DB_PATH"] = os.path.join(work_dir, "jobs.sqlite3")
+        os.environ["LLM_CACHE_PATH"] = os.path.join(work_dir, "llm_cache.sqlite3")
+    if backend == "mongod":
+        if not mongo_uri:
+            raise ValueError("--mongo-uri is required with the mongod backend")
+        os.environ["MONGO_URI"] = mongo_uri
+    else:
+        # mongomock has no change streams
+        os.environ["MONGO_URI"] = "mongodb://mongomock"
+        os.environ["CATALOG_CHANGE_STREAM"] = "false"
+
+
+def connect_database(backend: str):
+    """
+    Return the database the app will use. With the mongomock backend the
+    shared client of utils.db_utils is replaced by an in-memory one.
+    """
+    from utils import db_utils
+    if backend == "mongomock":
+        import mongomock
+        with db_utils._client_lock:
+            db_utils._client = mongomock.MongoClient()
+            db_utils._client_pid = os.getpid()
+    return db_utils.get_database()
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=SRC_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def reset_peak_rss() -> bool:
+    """
+    Reset the kernel's peak RSS counter (Linux only) so each scenario reports
+    its own peak rather than the process-wide one.
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_mb() -> float:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def measure_allocations(fn) -> dict:
+    """
+    Run fn() once under tracemalloc and return the peak bytes it allocated.
+    Python has no cumulative allocation counter; the peak is what the
+    temporary objects of one call add up to.
+    """
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        base, _ = tracemalloc.get_traced_memory()
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"alloc_peak_bytes": peak - base}
+
+
+def percentile(sorted_values: list, pct: float):
+    """
+    Nearest-rank percentile of an ascending list.
+    """
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * pct // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def latency_summary(latencies: list) -> dict:
+    ordered = sorted(latencies)
+    as_ms = lambda value: None if value is None else round(value * 1000, 3)
+    return {
+        "p50_ms": as_ms(percentile(ordered, 50)),
+        "p95_ms": as_ms(percentile(ordered, 95)),
+        "p99_ms": as_ms(percentile(ordered, 99)),
+        "max_ms": as_ms(ordered[-1] if ordered else None),
+        "mean_ms": as_ms(sum(ordered) / len(ordered) if ordered else None),
+    }
+
+
+class Scenario:
+    """
+    One benchmark: setup() once, then operation(i, context) for i in
+    range(iterations) across `concurrency` threads, context being what setup()
+    returned. operation returns the number of items it handled (rows,
+    requests) or raises / returns None on failure.
+    """
+
+    def __init__(self, name: str, operation, iterations: int, concurrency: int = 1, setup=None,
+                 unit: str = "requests", warmup: int = 0):
+        self.name = name
+        self.operation = operation
+        self.iterations = iterations
+        self.concurrency = concurrency
+        self.setup = setup
+        self.unit = unit
+        self.warmup = warmup
+
+
+def run_scenario(scenario: Scenario) -> dict:
+    """
+    Run a scenario and return its throughput, latency percentiles and peak RSS.
+    """
+    context = scenario.setup() if scenario.setup else None
+    for i in range(scenario.warmup):
+        scenario.operation(i, context)
+
+    latencies = []
+    items = 0
+    errors = []
+    lock = threading.Lock()
+
+    def timed(i):
+        nonlocal items
+        started = time.perf_counter()
+        try:
+            handled = scenario.operation(scenario.warmup + i, context)
+            error = None if handled is not None else "operation returned no result"
+        except Exception as e:
+            handled, error = None, repr(e)
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies.append(elapsed)
+            if error:
+                errors.append(error)
+            else:
+                items += handled
+
+    rss_reset = reset_peak_rss()
+    started = time.perf_counter()
+    if scenario.concurrency > 1:
+        with ThreadPoolExecutor(max_workers=scenario.concurrency) as pool:
+            list(pool.map(timed, range(scenario.iterations)))
+    else:
+        for i in range(scenario.iterations):
+            timed(i)
+    seconds = time.perf_counter() - started
+
+    return {
+        "scenario": scenario.name,
+        "iterations": scenario.iterations,
+        "concurrency": scenario.concurrency,
+        "unit": scenario.unit,
+        "items": items,
+        "errors": len(errors),
+        "first_error": errors[0] if errors else None,
+        "seconds": round(seconds, 3),
+        "throughput_per_sec": round(items / seconds, 2) if seconds else None,
+        **latency_summary(latencies),
+        "peak_rss_mb": peak_rss_mb(),
+        "peak_rss_scope": "scenario" if rss_reset else "process",
+    }
+
+
+def build_report(params: dict, dataset: dict, results: list, extra: dict = None) -> dict:
+    return {
+        "commit": git_commit(),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": params,
+        "dataset": dataset,
+        "results": results,
+        **(extra or {}),
+    }
+
+
+def write_report(report: dict, path: str = None):
+    encoded = json.dumps(report, indent=2, default=str)
+    if path:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(encoded + "\n")
+    print(encoded)
@@ -0,0 +1,203 @@
+# test/benchmarks/run_benchmarks.py
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+from datetime import timedelta
+
+sys.path.append(os.path.dirname(__file__))
+
+import harness
+from harness import Scenario, run_scenario
+from fake_llm_server import FakeLLMServer
+from synthetic_data import BENCH_START_DATE, customer_id_for, dataset_shape, day_of, load_dataset, write_transactions_csv
+
+
+def _api_date(day) -> str:
+    return day.strftime("%m/%d/%Y")
+
+
+def _client_per_thread(app):
+    """
+    setup() returning a getter of one Flask test client per worker thread.
+    """
+    def setup():
+        local = threading.local()
+
+        def get_client():
+            if not hasattr(local, "client"):
+                local.client = app.test_client()
+            return local.client
+        return get_client
+    return setup
+
+
+def _ok(response, *statuses):
+    if response.status_code not in (statuses or (200,)):
+        raise RuntimeError(f"HTTP {response.status_code}: {response.get_data(as_text=True)[:200]}")
+    return response
+
+
+def endpoint_scenarios(app, shape: dict, iterations: int, concurrency: int, page_size: int) -> list:
+    """
+    One scenario per API endpoint, in an order where each one finds the data
+    it needs: the by-date analysis marks transactions processed, which the
+    customer ranking then reads, which stores the recommendations served last.
+    """
+    days, customers = shape["days"], shape["customers"]
+    window = f"start_date={_api_date(BENCH_START_DATE)}&end_date={_api_date(day_of(days - 1, days))}"
+    setup = _client_per_thread(app)
+
+    def fetch_page(i, client):
+        response = _ok(client().get(f"/api/transactions/fetch/by_date?date={_api_date(day_of(i, days))}&limit={page_size}"))
+        return response.get_json()["count"]
+
+    def fetch_ndjson(i, client):
+        response = _ok(client().get(f"/api/transactions/fetch/by_date?date={_api_date(day_of(i, days))}&format=ndjson"))
+        return sum(1 for line in response.get_data().splitlines() if line)
+
+    def analyze_by_date(i, client):
+        _ok(client().post("/api/transactions/analyze/by_date", json={"date": _api_date(day_of(i, days))}))
+        return 1
+
+    def analyze_recommendable(i, client):
+        response = _ok(client().post(
+            "/api/transactions/analyze_recommendable_transactions/by_date", json={"date": _api_date(day_of(i, days))}
+        ))
+        return len(response.get_json()["result"])
+
+    def analyze_customer_product(i, client):
+        _ok(client().get(f"/api/transactions/analyze_customer_product?customer_id={customer_id_for(i % customers)}&{window}"))
+        return 1
+
+    def first_streamed_product(i, client):
+        # Time to the first ranked product; closing the stream early stores nothing
+        response = _ok(client().get(
+            f"/api/transactions/analyze_customer_product?customer_id={customer_id_for(i % customers)}&{window}&format=ndjson",
+            buffered=False,
+        ))
+        try:
+            for line in response.response:
+                if b'"event": "product"' in line or b'"event":"product"' in line:
+                    return 1
+        finally:
+            response.close()
+        raise RuntimeError("stream ended without a product")
+
+    def latest_recommendation(i, client):
+        _ok(client().get(f"/api/recommendations/{customer_id_for(i % customers)}/latest"), 200, 404)
+        return 1
+
+    distinct_customers = min(iterations, customers)
+    return [
+        Scenario("fetch_page", fetch_page, iterations, concurrency, setup, unit="rows"),
+        Scenario("fetch_ndjson", fetch_ndjson, iterations, concurrency, setup, unit="rows"),
+        Scenario("analyze_by_date", analyze_by_date, iterations, concurrency, setup),
+        # Each day can only be analyzed once: its rows are claimed and marked done
+        Scenario("analyze_recommendable_transactions", analyze_recommendable, min(iterations, days), concurrency, setup,
+                 unit="valid transactions"),
+        Scenario("analyze_customer_product_first_product", first_streamed_product, distinct_customers, concurrency, setup),
+        # First call per customer ranks with the LLM, the repeat is served from the recommendations store
+        Scenario("analyze_customer_product", analyze_customer_product, distinct_customers, concurrency, setup),
+        Scenario("analyze_customer_product_stored", analyze_customer_product, distinct_customers, concurrency, setup),
+        Scenario("recommendations_latest", latest_recommendation, iterations, concurrency, setup),
+    ]
+
+
+def ingestion_scenario(db, shape: dict, work_dir: str, batch_size: int, concurrency: int, seed: int) -> Scenario:
+    """
+    Bulk ingestion of a synthetic transactions CSV through the loaders'
+    parse and insert path, one operation per batch.
+    """
+    from scripts.populate_transactions import parse_transaction_row
+    from utils.csv_ingestion import chunked, insert_batch, iter_csv_rows
+
+    csv_path = os.path.join(work_dir, "transactions.csv")
+    rows = write_transactions_csv(csv_path, shape, seed)
+    collection = db["bench_ingest_transactions"]
+
+    def setup():
+        collection.delete_many({})
+        return {"batches": chunked(iter_csv_rows(csv_path), batch_size), "lock": threading.Lock()}
+
+    def ingest_batch(i, context):
+        with context["lock"]:
+            batch = next(context["batches"], None)
+        if batch is None:
+            return 0
+        return insert_batch(collection, [doc for doc in map(parse_transaction_row, batch) if doc is not None])
+
+    return Scenario("ingest_transactions", ingest_batch, -(-rows // batch_size), concurrency, setup, unit="rows")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmarks of the API endpoints and bulk ingestion.")
+    parser.add_argument("--scale", type=int, default=1000, help="Synthetic transactions (10^3 - 10^7).")
+    parser.add_argument("--customers", type=int, help="Synthetic customers (default: scale / 100).")
+    parser.add_argument("--days", type=int, help="Days the transactions are spread over (default: 30).")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--backend", choices=["mongomock", "mongod"], default="mongomock")
+    parser.add_argument("--mongo-uri", help="Local mongod to use with --backend mongod.")
+    parser.add_argument("--db-name", default="benchmarks")
+    parser.add_argument("--skip-load", action="store_true", help="Reuse the dataset already in --db-name (mongod only).")
+    parser.add_argument("--llm-latency-ms", type=float, default=50.0, help="Fake LLM fixed response delay.")
+    parser.add_argument("--llm-per-token-ms", type=float, default=0.0, help="Fake LLM delay per completion token.")
+    parser.add_argument("--llm-error-rate", type=float, default=0.0, help="Share of fake LLM requests answered 503.")
+    parser.add_argument("--llm-cache", action="store_true", help="Keep the LLM response cache enabled.")
+    parser.add_argument("--iterations", type=int, default=30, help="Requests per endpoint scenario.")
+    parser.add_argument("--concurrency", type=int, default=1, help="Threads issuing requests.")
+    parser.add_argument("--page-size", type=int, default=500, help="limit of the paginated fetch.")
+    parser.add_argument("--ingest-batch-size", type=int, default=5000)
+    parser.add_argument("--scenarios", help="Comma-separated scenario names (default: all).")
+    parser.add_argument("--output", help="Write the JSON report to this file.")
+    args = parser.parse_args()
+    if args.backend == "mongomock" and args.concurrency > 1:
+        parser.error("mongomock is not thread-safe, use --backend mongod with --concurrency > 1")
+
+    selected = set(args.scenarios.split(",")) if args.scenarios else None
+    shape = dataset_shape(args.scale, args.customers, args.days)
+    work_dir = tempfile.mkdtemp(prefix="benchmarks-")
+    llm = FakeLLMServer(latency_ms=args.llm_latency_ms, per_token_ms=args.llm_per_token_ms,
+                        error_rate=args.llm_error_rate).start()
+
+    harness.configure_environment(
+        args.backend, args.mongo_uri, args.db_name, llm_base_url=llm.base_url, llm_cache=args.llm_cache,
+        work_dir=work_dir,
+    )
+    db = harness.connect_database(args.backend)
+
+    started = time.perf_counter()
+    if args.skip_load and args.backend == "mongod":
+        dataset = {name: db[name].estimated_document_count() for name in ("segments", "products", "customers", "transactions")}
+    else:
+        dataset = load_dataset(db, shape, args.seed)
+    dataset["load_seconds"] = round(time.perf_counter() - started, 3)
+
+    from app import create_app
+    app = create_app()
+
+    scenarios = endpoint_scenarios(app, shape, args.iterations, args.concurrency, args.page_size)
+    if not selected or "ingest_transactions" in selected:
+        scenarios.append(ingestion_scenario(db, shape, work_dir, args.ingest_batch_size, args.concurrency, args.seed))
+
+    results = []
+    for scenario in scenarios:
+        if selected and scenario.name not in selected:
+            continue
+        print(f"Running {scenario.name} ({scenario.iterations} x {scenario.unit})...", file=sys.stderr)
+        results.append(run_scenario(scenario))
+
+    llm.stop()
+    shutil.rmtree(work_dir, ignore_errors=True)
+    params = {**vars(args), "shape": shape, "window": [str(BENCH_START_DATE), str(BENCH_START_DATE + timedelta(days=shape["days"] - 1))]}
+    from utils.model_routing import get_route_stats
+    extra = {"fake_llm": llm.get_stats(), "llm_routes": get_route_stats()}
+    harness.write_report(harness.build_report(params, dataset, results, extra), args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+# test/benchmarks/synthetic_data.py
+
+import csv
+import random
+from datetime import datetime, timedelta
+
+BENCH_START_DATE = datetime(2025, 2, 1)
+INSERT_BATCH_SIZE = 10000
+
+CUSTOMER_TYPES = ["Individual", "Small Business", "Corporate"]
+INTERESTS = ["Travel", "Fitness", "Dining", "Technology", "Real Estate", "Education", "Investing", "Shopping", "Music"]
+MERCHANT_CATEGORIES = {
+    "Groceries": ["Grocery shopping at local market", "Weekly groceries", "Supermarket purchase"],
+    "Dining": ["Lunch at cafe", "Dinner with family", "Brunch expense", "Coffee shop"],
+    "Travel": ["Flight booking", "Hotel reservation", "Car rental", "Train tickets"],
+    "Utilities": ["Electricity bill", "Water bill", "Internet service"],
+    "Real Estate": ["Mortgage payment", "Property tax", "Office lease payment"],
+    "Education": ["Tuition fee", "Online course subscription", "Textbooks"],
+    "Electronics": ["Laptop purchase", "Phone upgrade", "Office equipment"],
+    "Salary": ["Monthly salary", "Payroll deposit", "Consulting income"],
+}
+PRODUCT_TEMPLATES = [
+    ("Checking", "Checking Account", "Online banking; Debit card; Overdraft services", "Age 18+; $25 minimum opening deposit"),
+    ("Travel Rewards Card", "Credit Card", "Travel rewards; No foreign transaction fees; Airline miles", "Credit score 700+"),
+    ("Cash Back Card", "Credit Card", "Cash back on groceries and dining; No annual fee", "Credit score 650+"),
+    ("Savings", "Savings Account", "High yield savings; Automatic transfers", "No minimum credit score"),
+    ("Home Mortgage", "Loan", "Fixed rate mortgage for real estate purchases", "Credit score 680+; Proof of income"),
+    ("Student Loan", "Loan", "Education financing with flexible repayment", "Enrolled student; US resident"),
+    ("Equipment Financing", "Loan", "Financing for electronics and office equipment", "Business registered 1+ year"),
+    ("Investment Account", "Investment", "Brokerage and retirement investing", "Age 18+"),
+    ("Utility Autopay", "Service", "Automatic bill payment for utilities", "Active checking account"),
+    ("Premium Dining Card", "Credit Card", "Dining and entertainment rewards", "Credit score 720+"),
+]
+TRANSACTION_CSV_FIELDS = [
+    "customer_id", "transaction_date", "transaction_type", "amount", "merchant_category", "description",
+    "balance_after_transaction",
+]
+
+
+def dataset_shape(transactions: int, customers: int = None, days: int = None, products_per_segment: int = None) -> dict:
+    """
+    Sizes of a synthetic dataset scaled from the number of transactions
+    (about 100 transactions per customer over 30 days by default).
+    """
+    return {
+        "transactions": transactions,
+        "customers": customers or max(10, transactions // 100),
+        "days": days or 30,
+        "products_per_segment": products_per_segment or 2 * len(PRODUCT_TEMPLATES),
+    }
+
+
+def customer_id_for(index: int) -> str:
+    return str(1000 + index)
+
+
+def day_of(index: int, days: int) -> datetime:
+    return BENCH_START_DATE + timedelta(days=index % days)
+
+
+def generate_segments(now: datetime = None) -> list:
+    now = now or datetime.utcnow()
+    return [
+        {
+            "segment_id": f"seg-{customer_type.lower().replace(' ', '-')}",
+            "segment_name": f"{customer_type} Customers",
+            "customer_type": customer_type,
+            "description": f"Synthetic segment for {customer_type} customers.",
+            "created_at": now,
+        }
+        for customer_type in CUSTOMER_TYPES
+    ]
+
+
+def generate_products(segments: list, per_segment: int, now: datetime = None) -> list:
+    now = now or datetime.utcnow()
+    products = []
+    for segment in segments:
+        for index in range(per_segment):
+            name, product_type, description, eligibility = PRODUCT_TEMPLATES[index % len(PRODUCT_TEMPLATES)]
+            products.append({
+                "product_id": f"{segment['segment_id']}-p{index:03d}",
+                "product_name": f"{name} {index // len(PRODUCT_TEMPLATES) + 1}",
+                "product_type": product_type,
+                "description": description,
+                "eligibility_criteria": eligibility,
+                "segment_id": segment["segment_id"],
+                "created_at": now,
+            })
+    return products
+
+
+def iter_customers(count: int, segments: list, products: list, seed: int = 0, now: datetime = None):
+    """
+    Yield customer documents with the fields of models.customer.Customer.
+    """
+    rng = random.Random(seed)
+    now = now or datetime.utcnow()
+    products_by_segment = {}
+    for product in products:
+        products_by_segment.setdefault(product["segment_id"], []).append(product["product_id"])
+    for index in range(count):
+        segment = segments[index % len(segments)]
+        customer_id = customer_id_for(index)
+        yield {
+            "customer_id": customer_id,
+            "customer_name": f"Customer {customer_id}",
+            "customer_type": segment["customer_type"],
+            "segment_id": segment["segment_id"],
+            "email": f"customer{customer_id}@example.com",
+            "phone_number": f"(555) 555-{index % 10000:04d}",
+            "annual_income": float(rng.randrange(20000, 500000, 1000)),
+            "credit_score": rng.randint(550, 850),
+            "interests": rng.sample(INTERESTS, 2),
+            "available_balance": round(rng.uniform(0, 50000), 2),
+            "product_ids": rng.sample(products_by_segment[segment["segment_id"]], 2),
+            "created_at": now,
+            "updated_at": now,
+        }
+
+
+def iter_transaction_rows(count: int, customers: int, days: int, seed: int = 0):
+    """
+    Yield (index, customer_id, day, type, amount, category, description, balance) tuples.
+    Transactions are spread round-robin over the days and randomly over customers.
+    """
+    rng = random.Random(seed)
+    categories = list(MERCHANT_CATEGORIES)
+    for index in range(count):
+        category = rng.choice(categories)
+        transaction_type = "Credit" if category == "Salary" else "Debit"
+        yield (
+            index,
+            customer_id_for(rng.randrange(customers)),
+            day_of(index, days),
+            transaction_type,
+            round(rng.uniform(5, 5000), 2),
+            category,
+            rng.choice(MERCHANT_CATEGORIES[category]),
+            round(rng.uniform(0, 50000), 2),
+        )
+
+
+def iter_transactions(count: int, customers: int, days: int, seed: int = 0, now: datetime = None):
+    """
+    Yield pending transaction documents with the fields of models.transaction.Transaction.
+    """
+    now = now or datetime.utcnow()
+    for index, customer_id, day, transaction_type, amount, category, description, balance in iter_transaction_rows(
+            count, customers, days, seed):
+        yield {
+            "transaction_id": f"tx{index:09d}",
+            "customer_id": customer_id,
+            "transaction_date": day,
+            "transaction_type": transaction_type,
+            "amount": amount,
+            "merchant_category": category,
+            "description": description,
+            "balance_after_transaction": balance,
+            "is_processed_for_recommendation": False,
+            "processing_status": "pending",
+            "claim_owner": None,
+            "claim_token": None,
+            "claim_expires_at": None,
+            "verdict": None,
+            "processed_at": None,
+            "created_at": now,
+            "updated_at": now,
+        }
+
+
+def _insert_batched(collection, docs, batch_size: int) -> int:
+    inserted = 0
+    batch = []
+    for doc in docs:
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            collection.insert_many(batch, ordered=False)
+            inserted += len(batch)
+            batch = []
+    if batch:
+        collection.insert_many(batch, ordered=False)
+        inserted += len(batch)
+    return inserted
+
+
+def load_dataset(db, shape: dict, seed: int = 0, batch_size: int = None) -> dict:
+    """
+    Replace the segments, products, customers and transactions collections
+    with a synthetic dataset of the given shape, streamed in batches so that
+    10^7 transactions load in bounded memory.
+    :return: inserted document counts per collection
+    """
+    batch_size = batch_size or INSERT_BATCH_SIZE
+    for name in ("segments", "products", "customers", "transactions", "customer_aggregates", "recommendations"):
+        db[name].delete_many({})
+
+    segments = generate_segments()
+    products = generate_products(segments, shape["products_per_segment"])
+    db["segments"].insert_many(segments)
+    db["products"].insert_many(products)
+    return {
+        "segments": len(segments),
+        "products": len(products),
+        "customers": _insert_batched(
+            db["customers"], iter_customers(shape["customers"], segments, products, seed), batch_size
+        ),
+        "transactions": _insert_batched(
+            db["transactions"],
+            iter_transactions(shape["transactions"], shape["customers"], shape["days"], seed),
+            batch_size,
+        ),
+    }
+
+
+def write_transactions_csv(path: str, shape: dict, seed: int = 0) -> int:
+    """
+    Write transactions in the CSV format read by scripts/populate_transactions.py.
+    :return: number of rows written
+    """
+    rows = 0
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f, quoting=csv.QUOTE_ALL)
+        writer.writerow(TRANSACTION_CSV_FIELDS)
+        for _, customer_id, day, transaction_type, amount, category, description, balance in iter_transaction_rows(
+                shape["transactions"], shape["customers"], shape["days"], seed):
+            writer.writerow([
+                customer_id, day.strftime("%m/%d/%Y"), transaction_type, f"{amount:.2f}", category, description,
+                f"{balance:.2f}",
+            ])
+            rows += 1
+    return rows
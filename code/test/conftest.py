@@ -0,0 +1,55 @@
+# test/conftest.py
+
+import os
+import sys
+
+SRC_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src"))
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+# The app reads its settings at import time; keep the tests offline and in memory
+os.environ.setdefault("MONGO_URI", "mongodb://mongomock")
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ["OPENAI_BASE_URL"] = "http://127.0.0.1:9/v1"
+os.environ["LLM_CACHE_ENABLED"] = "false"
+os.environ["CATALOG_CHANGE_STREAM"] = "false"
+os.environ["MONGO_ENSURE_INDEXES"] = "false"
+
+import mongomock
+import pytest
+from datetime import datetime
+
+from utils import circuit_breaker, db_utils
+
+
+@pytest.fixture
+def db(monkeypatch):
+    """
+    A fresh in-memory database, returned by every get_database() call of the test.
+    """
+    monkeypatch.setattr(db_utils, "_client", mongomock.MongoClient())
+    monkeypatch.setattr(db_utils, "_client_pid", os.getpid())
+    return db_utils.get_database()
+
+
+@pytest.fixture(autouse=True)
+def fresh_circuit_breakers(monkeypatch):
+    monkeypatch.setattr(circuit_breaker, "_breakers", {})
+
+
+def make_transaction(index: int, **fields) -> dict:
+    """
+    An unprocessed transaction as populate_transactions loads it.
+    """
+    return {
+        "transaction_id": f"tx{index:04d}",
+        "customer_id": "101",
+        "transaction_date": datetime(2025, 2, 1, 9, 0),
+        "transaction_type": "Debit" if index % 2 else "Credit",
+        "amount": 100.0 + index,
+        "merchant_category": "Travel",
+        "description": f"Transaction {index}",
+        "balance_after_transaction": 5000.0 - index,
+        "is_processed_for_recommendation": False,
+        **fields,
+    }
@@ -0,0 +1,78 @@
+# test/test_batch_recommendations.py
+
+from datetime import datetime
+
+import pytest
+
+from conftest import make_transaction
+from services import batch_recommendation_service, customer_aggregates, transaction_service
+from services.batch_recommendation_service import run_batch_recommendations
+from services.catalog_cache import CatalogCache
+
+CUSTOMER_IDS = ["101", "102", "103"]
+
+
+@pytest.fixture
+def bank(db, monkeypatch):
+    db.customers.insert_many([
+        {"customer_id": customer_id, "segment_id": "S1", "product_ids": ["P1"], "customer_type": "Retail"}
+        for customer_id in CUSTOMER_IDS
+    ])
+    db.products.insert_many([
+        {"product_id": product_id, "product_name": f"Product {product_id}", "segment_id": "S1"}
+        for product_id in ("P1", "P2", "P3")
+    ])
+    db.transactions.insert_many([
+        make_transaction(i, customer_id=CUSTOMER_IDS[i % 3], transaction_date=datetime(2025, 2, 3 + i % 5, 9),
+                         is_processed_for_recommendation=True)
+        for i in range(12)
+    ])
+    monkeypatch.setattr(transaction_service, "get_catalog_cache", lambda: CatalogCache(300))
+    return db
+
+
+@pytest.fixture
+def rankings(monkeypatch):
+    ranked = []
+
+    def rank(customer, valid_transactions, eligible_products, transaction_summary=None):
+        ranked.append(customer["customer_id"])
+        return {"valid_products": [{"product_id": eligible_products[0]["product_id"], "priority": 1}],
+                "model": transaction_service.model_for(transaction_service.ROUTE_RANKING), "prompt_hash": "h"}
+
+    monkeypatch.setattr(batch_recommendation_service, "rank_products_with_metadata", rank)
+    return ranked
+
+
+def test_aggregates_are_loaded_once_per_page(bank, rankings, monkeypatch):
+    pages = []
+    load_page = customer_aggregates.get_customer_aggregates
+
+    def get_customer_aggregates(db, customer_ids, *window):
+        pages.append(list(customer_ids))
+        return load_page(db, customer_ids, *window)
+
+    def get_customer_aggregate(*args):
+        raise AssertionError("aggregate loaded for a single customer")
+
+    monkeypatch.setattr(batch_recommendation_service, "get_customer_aggregates", get_customer_aggregates)
+    monkeypatch.setattr(transaction_service, "get_customer_aggregate", get_customer_aggregate)
+
+    run = run_batch_recommendations(run_id="r1", page_size=2, max_workers=2)
+
+    assert run["status"] == "completed" and run["processed"] == 3 and run["failed"] == 0
+    assert pages == [["101", "102"], ["103"]]
+    assert sorted(rankings) == CUSTOMER_IDS
+    stored = {doc["customer_id"]: doc for doc in bank.recommendations.find({"run_id": "r1"})}
+    assert set(stored) == set(CUSTOMER_IDS)
+    assert stored["101"]["valid_products"] == [{"product_id": "P2", "priority": 1}]
+
+
+def test_unchanged_customers_reuse_their_latest_recommendation(bank, rankings):
+    run_batch_recommendations(run_id="r1", page_size=2)
+
+    run = run_batch_recommendations(run_id="r2", page_size=2)
+
+    assert run["processed"] == 3 and run["reused"] == 3
+    assert len(rankings) == 3
+    assert bank.recommendations.find_one({"run_id": "r2", "customer_id": "102"})["reused_from"] == "r1"
@@ -0,0 +1,97 @@
+# test/test_catalog_cache.py
+
+import pytest
+
+from services import catalog_cache
+from services.catalog_cache import CatalogCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """
+    A controllable time.monotonic() for the cache.
+    """
+    now = [1000.0]
+    monkeypatch.setattr(catalog_cache.time, "monotonic", lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def products(db):
+    db.products.insert_many([
+        {"product_id": "P1", "product_name": "Card", "segment_id": "S1"},
+        {"product_id": "P2", "product_name": "Loan", "segment_id": "S1"},
+        {"product_id": "P3", "product_name": "Lease", "segment_id": "S2"},
+    ])
+    return db.products
+
+
+def product_ids(products: list) -> list:
+    return [product["product_id"] for product in products]
+
+
+def test_eligible_products_exclude_the_owned_ones(products, clock):
+    cache = CatalogCache(ttl_seconds=60)
+
+    assert product_ids(cache.get_eligible_products("S1", ["P1"])) == ["P2"]
+    assert product_ids(cache.get_eligible_products("S1", None)) == ["P1", "P2"]
+    assert product_ids(cache.get_eligible_products("S2", ["P1"])) == ["P3"]
+    assert "_id" not in cache.get_eligible_products("S1", [])[0]
+
+
+def test_segment_is_read_once_until_the_ttl_expires(products, clock):
+    cache = CatalogCache(ttl_seconds=60)
+    first = cache.get_eligible_products("S1", ["P1"])
+    products.insert_one({"product_id": "P4", "product_name": "Deposit", "segment_id": "S1"})
+
+    clock[0] += 59
+    assert cache.get_eligible_products("S1", ["P1"]) is first
+    clock[0] += 1
+    assert product_ids(cache.get_eligible_products("S1", ["P1"])) == ["P2", "P4"]
+
+    assert cache.get_stats()["hits"] == 1
+    assert cache.get_stats()["misses"] == 2
+
+
+def test_invalidate_drops_segments_and_derived_data(products, clock):
+    cache = CatalogCache(ttl_seconds=60)
+    builds = []
+    cache.get_eligible_products("S1", [])
+    cache.get_derived("S1", "names", lambda loaded: builds.append(product_ids(loaded)))
+    products.update_one({"product_id": "P2"}, {"$set": {"segment_id": "S2"}})
+
+    cache.invalidate()
+
+    assert product_ids(cache.get_eligible_products("S1", [])) == ["P1"]
+    cache.get_derived("S1", "names", lambda loaded: builds.append(product_ids(loaded)))
+    assert builds == [["P1", "P2"], ["P1"]]
+    stats = cache.get_stats()
+    assert stats["version"] == 1 and stats["invalidations"] == 1 and stats["segments_cached"] == 1
+
+
+def test_entry_loaded_across_an_invalidation_is_not_kept(products, clock, monkeypatch):
+    cache = CatalogCache(ttl_seconds=60)
+    load = cache._load
+
+    def load_while_the_catalog_changes(segment_id):
+        entry = load(segment_id)
+        cache.invalidate()
+        return entry
+
+    monkeypatch.setattr(cache, "_load", load_while_the_catalog_changes)
+    cache.get_eligible_products("S1", [])
+    monkeypatch.setattr(cache, "_load", load)
+
+    assert cache.get_stats()["segments_cached"] == 0
+    cache.get_eligible_products("S1", [])
+    assert cache.get_stats()["misses"] == 2
+
+
+def test_eligible_memo_is_bounded(products, clock, monkeypatch):
+    monkeypatch.setattr(catalog_cache, "CATALOG_ELIGIBLE_MEMO_SIZE", 2)
+    cache = CatalogCache(ttl_seconds=60)
+
+    for owned in (["P1"], ["P2"], []):
+        cache.get_eligible_products("S1", owned)
+
+    assert list(cache._segments["S1"]["eligible"]) == [frozenset()]
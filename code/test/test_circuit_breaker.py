@@ -0,0 +1,105 @@
+# test/test_circuit_breaker.py
+
+import pytest
+
+from utils import circuit_breaker
+from utils.circuit_breaker import STATE_CLOSED, STATE_HALF_OPEN, STATE_OPEN, BreakerCall, CircuitBreaker
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """
+    A controllable time.monotonic() for the breaker.
+    """
+    now = [1000.0]
+    monkeypatch.setattr(circuit_breaker.time, "monotonic", lambda: now[0])
+    return now
+
+
+def open_breaker(**kwargs) -> CircuitBreaker:
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_seconds=30, **kwargs)
+    for _ in range(2):
+        assert breaker.allow()
+        breaker.record_failure()
+    return breaker
+
+
+def test_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker("test", failure_threshold=3, reset_seconds=30)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == STATE_CLOSED
+
+    breaker.record_failure()
+
+    assert breaker.state == STATE_OPEN
+    assert not breaker.allow()
+    assert breaker.get_stats()["rejected"] == 1
+
+
+def test_half_open_lets_a_single_probe_through(clock):
+    breaker = open_breaker()
+    clock[0] += 30
+
+    assert breaker.allow()
+    assert breaker.state == STATE_HALF_OPEN
+    assert not breaker.allow()
+
+
+def test_successful_probe_closes_the_circuit(clock):
+    breaker = open_breaker()
+    clock[0] += 30
+    assert breaker.allow()
+
+    breaker.record_success()
+
+    assert breaker.state == STATE_CLOSED
+    assert breaker.allow() and breaker.allow()
+
+
+def test_failed_probe_opens_the_circuit_again(clock):
+    breaker = open_breaker()
+    clock[0] += 30
+    assert breaker.allow()
+
+    breaker.record_failure()
+
+    assert breaker.state == STATE_OPEN
+    assert not breaker.allow()
+    clock[0] += 30
+    assert breaker.allow()
+
+
+def test_lost_probe_is_replaced_after_the_probe_timeout(clock):
+    breaker = open_breaker(probe_timeout_seconds=60)
+    clock[0] += 30
+    assert breaker.allow()
+
+    clock[0] += 59
+    assert not breaker.allow()
+    clock[0] += 1
+    assert breaker.allow()
+    assert not breaker.allow()
+
+
+def test_breaker_call_reports_only_its_first_outcome(clock):
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_seconds=30)
+    call = BreakerCall(breaker)
+    assert call.allow()
+
+    call.record_failure()
+    call.record_success()
+
+    assert breaker.state == STATE_OPEN
+    assert breaker.get_stats()["successes"] == 0
+
+
+def test_settled_breaker_call_is_not_allowed(clock):
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_seconds=30)
+    call = BreakerCall(breaker)
+    call.record_failure()
+
+    assert not call.allow()
+    assert breaker.get_stats()["allowed"] == 0
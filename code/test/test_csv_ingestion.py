@@ -0,0 +1,99 @@
+# test/test_csv_ingestion.py
+
+import csv
+
+import mongomock
+import pytest
+
+from utils import csv_ingestion
+from utils.csv_ingestion import ingest_csv, load_checkpoint, save_checkpoint
+
+
+def parse_row(row):
+    # Module-level so the multiprocessing pool can pickle it
+    if not row["amount"]:
+        return None
+    return {"transaction_id": row["transaction_id"], "amount": float(row["amount"])}
+
+
+def write_csv(path, count: int):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=["transaction_id", "amount"])
+        writer.writeheader()
+        for i in range(count):
+            writer.writerow({"transaction_id": f"tx{i:04d}", "amount": "" if i % 10 == 9 else str(i)})
+
+
+@pytest.fixture
+def collection():
+    return mongomock.MongoClient().db.transactions
+
+
+def test_ingest_skips_rows_the_parser_rejects(tmp_path, collection):
+    csv_path = tmp_path / "transactions.csv"
+    write_csv(csv_path, 25)
+
+    summary = ingest_csv(str(csv_path), collection, parse_row, batch_size=10, workers=1)
+
+    assert (summary["rows_read"], summary["rows_written"], summary["rows_skipped"]) == (25, 23, 2)
+    assert collection.count_documents({}) == 23
+
+
+def test_pool_workers_parse_the_same_rows(tmp_path, collection):
+    csv_path = tmp_path / "transactions.csv"
+    write_csv(csv_path, 25)
+
+    summary = ingest_csv(str(csv_path), collection, parse_row, batch_size=10, workers=2)
+
+    assert summary["rows_written"] == 23
+    assert collection.count_documents({}) == 23
+
+
+def test_rerun_after_a_crash_resumes_without_duplicates(tmp_path, collection, monkeypatch):
+    csv_path, checkpoint_path = tmp_path / "transactions.csv", str(tmp_path / "ingest.ckpt")
+    write_csv(csv_path, 35)
+    upsert_batch = csv_ingestion.upsert_batch
+    calls = []
+
+    def crash_on_third_batch(coll, docs, key_fields):
+        calls.append(len(docs))
+        if len(calls) == 3:
+            raise ConnectionError("mongod went away")
+        return upsert_batch(coll, docs, key_fields)
+
+    monkeypatch.setattr(csv_ingestion, "upsert_batch", crash_on_third_batch)
+    with pytest.raises(ConnectionError):
+        ingest_csv(str(csv_path), collection, parse_row, batch_size=10, workers=1,
+                   key_fields=["transaction_id"], checkpoint_path=checkpoint_path)
+    assert load_checkpoint(checkpoint_path, str(csv_path)) == 20
+
+    monkeypatch.setattr(csv_ingestion, "upsert_batch", upsert_batch)
+    summary = ingest_csv(str(csv_path), collection, parse_row, batch_size=10, workers=1,
+                         key_fields=["transaction_id"], checkpoint_path=checkpoint_path)
+
+    assert summary["rows_read"] == 15
+    assert collection.count_documents({}) == 32
+    assert len(collection.distinct("transaction_id")) == 32
+    assert load_checkpoint(checkpoint_path, str(csv_path)) == 35
+
+
+def test_upserts_leave_rows_already_loaded_untouched(tmp_path, collection):
+    csv_path = tmp_path / "transactions.csv"
+    write_csv(csv_path, 5)
+    ingest_csv(str(csv_path), collection, parse_row, workers=1, key_fields=["transaction_id"])
+    collection.update_one({"transaction_id": "tx0001"}, {"$set": {"amount": -1.0}})
+
+    summary = ingest_csv(str(csv_path), collection, parse_row, workers=1, key_fields=["transaction_id"])
+
+    assert summary["rows_written"] == 0
+    assert collection.find_one({"transaction_id": "tx0001"})["amount"] == -1.0
+
+
+def test_checkpoint_of_another_file_is_ignored(tmp_path):
+    checkpoint_path = str(tmp_path / "ingest.ckpt")
+    save_checkpoint(checkpoint_path, str(tmp_path / "a.csv"), 1200)
+
+    assert load_checkpoint(checkpoint_path, str(tmp_path / "a.csv")) == 1200
+    assert load_checkpoint(checkpoint_path, str(tmp_path / "b.csv")) == 0
+    assert load_checkpoint(str(tmp_path / "missing.ckpt"), str(tmp_path / "a.csv")) == 0
+    assert not (tmp_path / "ingest.ckpt.tmp").exists()
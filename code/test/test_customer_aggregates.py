@@ -0,0 +1,107 @@
+# test/test_customer_aggregates.py
+
+from datetime import datetime
+
+import pytest
+
+from conftest import make_transaction
+from services import customer_aggregates
+from services.customer_aggregates import (
+    AGGREGATES_COLLECTION,
+    apply_processed_transactions,
+    bucket_id,
+    get_customer_aggregate,
+)
+
+
+def processed(index: int, day: int, **fields) -> dict:
+    return make_transaction(index, transaction_date=datetime(2025, 2, day, 9), is_processed_for_recommendation=True,
+                            **fields)
+
+
+def test_folding_a_transaction_twice_counts_it_once(db):
+    transactions = [processed(i, 1 + i % 2) for i in range(4)]
+    db.transactions.insert_many(transactions)
+    window = (datetime(2025, 2, 1), datetime(2025, 2, 2))
+    get_customer_aggregate(db, "101", *window)
+
+    apply_processed_transactions(db, transactions[:2])
+    apply_processed_transactions(db, transactions)
+    aggregate = get_customer_aggregate(db, "101", *window)
+
+    assert aggregate["transaction_count"] == 4
+    assert aggregate["amount_sum"] == sum(tx["amount"] for tx in transactions)
+    assert (aggregate["debit_count"], aggregate["credit_count"]) == (2, 2)
+    assert aggregate["max_amount"] == 103.0
+    assert aggregate["spend_by_category"] == {"Travel": 406.0}
+
+
+def test_window_combines_only_its_days(db):
+    db.transactions.insert_many([processed(0, 1), processed(1, 2, merchant_category="Dining"), processed(2, 3)])
+
+    aggregate = get_customer_aggregate(db, "101", datetime(2025, 2, 2, 15), datetime(2025, 2, 3))
+
+    assert aggregate["transaction_count"] == 2
+    assert aggregate["spend_by_category"] == {"Dining": 101.0, "Travel": 102.0}
+
+
+def test_widening_the_window_builds_only_the_missing_days(db):
+    db.transactions.insert_many([processed(i, day) for i, day in enumerate([1, 2, 3, 4])])
+    assert get_customer_aggregate(db, "101", datetime(2025, 2, 2), datetime(2025, 2, 3))["transaction_count"] == 2
+
+    aggregate = get_customer_aggregate(db, "101", datetime(2025, 2, 1), datetime(2025, 2, 4))
+
+    assert aggregate["transaction_count"] == 4
+
+
+def test_empty_window_leaves_the_extremes_unset(db):
+    aggregate = get_customer_aggregate(db, "101", datetime(2025, 2, 1), datetime(2025, 2, 2))
+
+    assert aggregate["transaction_count"] == 0
+    assert "max_amount" not in aggregate and "min_balance" not in aggregate
+
+
+def test_customers_of_a_page_are_read_together(db, monkeypatch):
+    db.transactions.insert_many([
+        processed(0, 1), processed(1, 1, customer_id="102"), processed(2, 2, customer_id="102"),
+    ])
+    window = (datetime(2025, 2, 1), datetime(2025, 2, 2))
+    first = customer_aggregates.get_customer_aggregates(db, ["101", "102", "103"], *window)
+
+    # Once built, a window is read back with a single query and no pipeline
+    monkeypatch.setattr(customer_aggregates, "_build_buckets", lambda *args: pytest.fail("rebuilt"))
+    finds = []
+    find = db[AGGREGATES_COLLECTION].find
+    monkeypatch.setattr(type(db[AGGREGATES_COLLECTION]), "find",
+                        lambda coll, *args, **kwargs: finds.append(args) or find(*args, **kwargs))
+    second = customer_aggregates.get_customer_aggregates(db, ["101", "102", "103"], *window)
+
+    assert first == second
+    assert len(finds) == 1
+    assert [second[c]["transaction_count"] for c in ("101", "102", "103")] == [1, 2, 0]
+
+
+def test_a_bucket_is_never_replaced_by_an_older_snapshot(db):
+    db.transactions.insert_many([processed(i, 1) for i in range(2)])
+    db[AGGREGATES_COLLECTION].insert_one({
+        "_id": bucket_id("101", datetime(2025, 2, 1)), "customer_id": "101", "day": datetime(2025, 2, 1),
+        "transaction_count": 3, "amount_sum": 303.0, "debit_count": 1, "credit_count": 2,
+        "spend_by_category": {"Travel": 303.0}, "transaction_ids": ["a", "b", "c"],
+    })
+
+    apply_processed_transactions(db, [processed(0, 1)])
+    assert db[AGGREGATES_COLLECTION].find_one({"day": datetime(2025, 2, 1)})["transaction_count"] == 3
+
+    db.transactions.insert_many([processed(i, 1) for i in range(2, 4)])
+    apply_processed_transactions(db, [processed(3, 1)])
+    bucket = db[AGGREGATES_COLLECTION].find_one({"day": datetime(2025, 2, 1)})
+    assert bucket["transaction_count"] == 4
+    assert "transaction_ids" not in bucket
+
+
+def test_only_processed_transactions_are_counted(db):
+    db.transactions.insert_many([processed(0, 1), make_transaction(1, transaction_date=datetime(2025, 2, 1, 9))])
+
+    aggregate = get_customer_aggregate(db, "101", datetime(2025, 2, 1), datetime(2025, 2, 1))
+
+    assert aggregate["transaction_count"] == 1
@@ -0,0 +1,55 @@
+# test/test_fetch_cursor.py
+
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+
+from conftest import make_transaction
+from services.transaction_claims import STATUS_DONE
+from services.transaction_service import decode_fetch_cursor, encode_fetch_cursor, fetch_transactions_page
+
+
+def test_cursor_round_trip():
+    tx = {"transaction_date": datetime(2025, 2, 1, 9, 30, 15), "_id": ObjectId()}
+
+    assert decode_fetch_cursor(encode_fetch_cursor(tx)) == (tx["transaction_date"], tx["_id"])
+
+
+# Not base64, base64 of "not json", a payload without the _id
+@pytest.mark.parametrize("token", ["not-base64!", "bm90IGpzb24=", "eyJkIjogIjIwMjUtMDItMDFUMDk6MDA6MDAifQ=="])
+def test_invalid_cursor_raises_value_error(token):
+    with pytest.raises(ValueError):
+        decode_fetch_cursor(token)
+
+
+def test_pages_cover_the_day_once_in_keyset_order(db):
+    # Several rows share a timestamp, so the _id tie-break decides the order
+    db.transactions.insert_many([
+        make_transaction(i, transaction_date=datetime(2025, 2, 1, 9 + i % 3)) for i in range(7)
+    ])
+    db.transactions.insert_one(make_transaction(7, processing_status=STATUS_DONE))
+    db.transactions.insert_one(make_transaction(8, transaction_date=datetime(2025, 2, 2, 9)))
+
+    pages, cursor = [], None
+    while True:
+        transactions, cursor = fetch_transactions_page("02/01/2025", cursor, limit=3)
+        pages.append([tx["transaction_id"] for tx in transactions])
+        if cursor is None:
+            break
+
+    assert [len(page) for page in pages] == [3, 3, 1]
+    fetched = [tx_id for page in pages for tx_id in page]
+    assert sorted(fetched) == [f"tx{i:04d}" for i in range(7)]
+    expected = sorted(db.transactions.find({"transaction_id": {"$in": fetched}}),
+                      key=lambda tx: (tx["transaction_date"], tx["_id"]))
+    assert fetched == [tx["transaction_id"] for tx in expected]
+
+
+def test_last_full_page_has_no_next_cursor(db):
+    db.transactions.insert_many([make_transaction(i) for i in range(3)])
+
+    transactions, cursor = fetch_transactions_page("02/01/2025", limit=3)
+
+    assert len(transactions) == 3
+    assert cursor is None
@@ -0,0 +1,180 @@
+# test/test_job_service.py
+
+import time
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+from flask import Flask
+
+from controllers.job_controller import job_bp, submit_job
+from services import job_service
+from services.job_service import (
+    LOST_JOB_ERROR,
+    STATUS_FAILED,
+    STATUS_QUEUED,
+    STATUS_RUNNING,
+    STATUS_SUCCEEDED,
+    JobManager,
+    JobQueueFullError,
+    JobStore,
+)
+
+
+@pytest.fixture
+def store(tmp_path):
+    return JobStore(str(tmp_path / "jobs.sqlite3"))
+
+
+@pytest.fixture
+def manager(store):
+    manager = JobManager(store, max_workers=1, max_queue=2, lease_seconds=60)
+    yield manager
+    manager.shutdown()
+
+
+def wait_for(manager: JobManager, job_id: str, statuses=(STATUS_SUCCEEDED, STATUS_FAILED)) -> dict:
+    for _ in range(500):
+        job = manager.get(job_id)
+        if job["status"] in statuses:
+            return job
+        time.sleep(0.01)
+    pytest.fail(f"job {job_id} stuck in {job['status']}")
+
+
+def analyze(customer_id, progress):
+    progress({"chunks_done": 1, "chunks_total": 2})
+    return {"customer_id": customer_id, "valid_products": ["p1"]}
+
+
+def test_job_result_and_progress_are_stored(manager):
+    job_id = manager.submit("analyze_customer_product", analyze, {"customer_id": "101"})
+
+    job = wait_for(manager, job_id)
+
+    assert job["status"] == STATUS_SUCCEEDED
+    assert job["params"] == {"customer_id": "101"}
+    assert job["progress"] == {"chunks_done": 1, "chunks_total": 2}
+    assert job["result"] == {"customer_id": "101", "valid_products": ["p1"]}
+    assert job["started_at"] and job["finished_at"]
+
+
+def test_error_results_and_exceptions_fail_the_job(manager):
+    def not_found(progress):
+        return {"error": "Customer not found"}
+
+    def crash(progress):
+        raise RuntimeError("boom")
+
+    assert wait_for(manager, manager.submit("a", not_found, {}))["error"] == "Customer not found"
+    crashed = wait_for(manager, manager.submit("b", crash, {}))
+    assert (crashed["status"], crashed["error"]) == (STATUS_FAILED, "boom")
+
+
+def test_submissions_beyond_the_queue_are_rejected(manager):
+    release = threading.Event()
+
+    def block(progress):
+        release.wait(5)
+
+    first = manager.submit("a", block, {})
+    manager.submit("a", block, {})
+    with pytest.raises(JobQueueFullError):
+        manager.submit("a", block, {})
+
+    release.set()
+    wait_for(manager, first)
+    # The finished job gave its slot back
+    assert manager.submit("a", block, {})
+
+
+def test_jobs_of_a_dead_process_are_failed(store):
+    job_id = store.create("a", {}, owner="crashed", lease_seconds=60)
+    store.update(job_id, status=STATUS_RUNNING)
+    assert store.get(job_id)["status"] == STATUS_RUNNING
+
+    store.update(job_id, lease_expires_at=(datetime.utcnow() - timedelta(seconds=1)).isoformat())
+
+    job = store.get(job_id)
+    assert (job["status"], job["error"]) == (STATUS_FAILED, LOST_JOB_ERROR)
+
+
+def test_starting_a_manager_fails_lost_jobs(store):
+    lost = store.create("a", {}, owner="crashed", lease_seconds=-1)
+    legacy = store.create("a", {})
+    store.update(legacy, status=STATUS_RUNNING, lease_expires_at=None)
+    live = store.create("a", {}, owner="other-worker", lease_seconds=60)
+
+    manager = JobManager(store, max_workers=1, max_queue=1)
+    manager.shutdown()
+
+    statuses = {job_id: store.get(job_id)["status"] for job_id in (lost, legacy, live)}
+    assert statuses == {lost: STATUS_FAILED, legacy: STATUS_FAILED, live: STATUS_QUEUED}
+
+
+def test_heartbeat_renews_the_lease_of_running_jobs(store):
+    manager = JobManager(store, max_workers=1, max_queue=1, lease_seconds=0.3)
+    release = threading.Event()
+    try:
+        job_id = manager.submit("a", lambda progress: release.wait(5), {})
+        time.sleep(0.6)
+
+        assert manager.get(job_id)["status"] == STATUS_RUNNING
+    finally:
+        release.set()
+        manager.shutdown()
+
+
+def test_job_manager_is_recreated_after_a_fork(monkeypatch, tmp_path):
+    monkeypatch.setattr(job_service, "JOBS_DB_PATH", str(tmp_path / "jobs.sqlite3"))
+    monkeypatch.setattr(job_service, "_job_manager", None)
+
+    parent = job_service.get_job_manager()
+    assert job_service.get_job_manager() is parent
+    monkeypatch.setattr(job_service.os, "getpid", lambda: -1)
+    child = job_service.get_job_manager()
+
+    assert child is not parent
+    assert child.store is not parent.store
+    parent.shutdown()
+    child.shutdown()
+
+
+@pytest.fixture
+def client(monkeypatch, manager):
+    monkeypatch.setattr("controllers.job_controller.get_job_manager", lambda: manager)
+    app = Flask(__name__)
+    app.register_blueprint(job_bp, url_prefix="/api/jobs")
+
+    @app.route("/analyze", methods=["POST"])
+    def analyze_async():
+        return submit_job("analyze_customer_product", analyze, {"customer_id": "101"})
+
+    return app.test_client()
+
+
+def test_submit_answers_202_and_the_job_can_be_polled(client, manager):
+    response = client.post("/analyze")
+
+    assert response.status_code == 202
+    body = response.get_json()
+    assert body["status"] == "queued"
+    assert response.headers["Location"] == body["status_url"] == f"/api/jobs/{body['job_id']}"
+    wait_for(manager, body["job_id"])
+    polled = client.get(body["status_url"])
+    assert polled.status_code == 200
+    assert polled.get_json()["result"]["valid_products"] == ["p1"]
+
+
+def test_unknown_job_is_404_and_a_full_queue_is_503(client, manager):
+    assert client.get("/api/jobs/missing").status_code == 404
+
+    release = threading.Event()
+    for _ in range(2):
+        manager.submit("a", lambda progress: release.wait(5), {})
+    try:
+        response = client.post("/analyze")
+        assert response.status_code == 503
+        assert "error" in response.get_json()
+    finally:
+        release.set()
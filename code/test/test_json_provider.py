@@ -0,0 +1,85 @@
+# test/test_json_provider.py
+
+import json
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+from flask import Flask
+
+from utils.json_provider import JSONProvider, StreamingArrayParser, parse_completion_json, strip_code_fence
+
+COMPLETION = (
+    "```json\n"
+    '{"valid_transactions": [\n'
+    '  {"transaction_id": "tx1", "reason": "Large [travel] spend, \\"abroad\\""},\n'
+    '  {"transaction_id": "tx2", "reason": "{braces} and commas, inside strings"},\n'
+    '  {"transaction_id": "tx3", "reason": "Nested", "tags": [1, [2, 3]]}\n'
+    '], "uncertain_transactions": ["tx4"]}\n'
+    "```\n"
+)
+
+
+def feed_in_pieces(parser: StreamingArrayParser, text: str, size: int) -> list:
+    elements = []
+    for start in range(0, len(text), size):
+        elements.extend(parser.feed(text[start:start + size]))
+    return elements
+
+
+@pytest.mark.parametrize("size", [1, 2, 7, 64, len(COMPLETION)])
+def test_streamed_elements_match_the_full_parse(size):
+    parser = StreamingArrayParser(["valid_transactions"])
+
+    elements = feed_in_pieces(parser, COMPLETION, size)
+
+    assert elements == parse_completion_json(COMPLETION)["valid_transactions"]
+    assert parser.text == COMPLETION
+
+
+def test_elements_are_returned_as_soon_as_they_are_complete():
+    parser = StreamingArrayParser(["valid_transactions"])
+
+    assert parser.feed('{"valid_transactions": [{"transaction_id": "tx1"}') == []
+    assert parser.feed(", ") == [{"transaction_id": "tx1"}]
+    assert parser.feed('{"transaction_id": "tx2"}]') == [{"transaction_id": "tx2"}]
+    assert parser.feed(', "valid_transactions": [{"transaction_id": "tx3"}]}') == []
+
+
+def test_other_keys_are_ignored():
+    parser = StreamingArrayParser(["valid_products"])
+
+    text = '{"notes": [{"a": 1}], "valid_products": [{"product_id": "p1"}, {"product_id": "p2"}]}'
+
+    assert feed_in_pieces(parser, text, 3) == [{"product_id": "p1"}, {"product_id": "p2"}]
+
+
+def test_top_level_array():
+    parser = StreamingArrayParser(["valid_transactions"])
+
+    assert feed_in_pieces(parser, '[{"transaction_id": "tx1"}, "tx2", 3]', 5) == [{"transaction_id": "tx1"}, "tx2", 3]
+
+
+def test_malformed_element_raises():
+    parser = StreamingArrayParser(["valid_transactions"])
+    parser.feed('{"valid_transactions": [{"transaction_id": }')
+
+    with pytest.raises(json.JSONDecodeError):
+        parser.feed(",")
+
+
+def test_strip_code_fence():
+    assert strip_code_fence('```json\n{"a": 1}\n```\ntrailing') == '{"a": 1}\n'
+    assert strip_code_fence('{"a": 1}') == '{"a": 1}'
+    assert parse_completion_json('```\n[1, 2]\n```') == [1, 2]
+
+
+def test_provider_encodes_bson_types():
+    app = Flask(__name__)
+    object_id = ObjectId()
+    with app.app_context():
+        body = JSONProvider(app).dumps({"_id": object_id, "at": datetime(2025, 2, 1, 9, 30)})
+
+    decoded = json.loads(body)
+    assert decoded["_id"] == str(object_id)
+    assert decoded["at"] == "Sat, 01 Feb 2025 09:30:00 GMT"
@@ -0,0 +1,114 @@
+# test/test_llm_batch.py
+
+import threading
+
+from utils import metrics
+from utils.llm_batch import chunk_by_tokens, estimate_tokens, stream_chunks_concurrently
+
+
+def drain(stream) -> tuple:
+    """
+    Run a stream_chunks_concurrently generator to the end.
+    :return: (batches it yielded, its return value)
+    """
+    batches = []
+    while True:
+        try:
+            batches.append(next(stream))
+        except StopIteration as stop:
+            return batches, stop.value
+
+
+def test_estimate_tokens():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens(None) == 0
+    assert estimate_tokens("abc") == 1
+    assert estimate_tokens("a" * 40) == 11
+
+
+def test_chunks_fit_the_token_budget_and_keep_the_order():
+    chunks = chunk_by_tokens(range(10), lambda i: "x" * 19, max_tokens=12)
+
+    assert [items for items, _ in chunks] == [[0, 1], [2, 3], [4, 5], [6, 7], [8, 9]]
+    assert chunks[0][1] == ["x" * 19] * 2
+
+
+def test_an_item_over_the_budget_gets_its_own_chunk():
+    chunks = chunk_by_tokens(["a", "b" * 100, "c"], str, max_tokens=5)
+
+    assert [items for items, _ in chunks] == [["a"], ["b" * 100], ["c"]]
+    assert chunk_by_tokens([], str) == []
+
+
+def test_failed_chunk_is_isolated_while_the_others_complete():
+    progress = []
+
+    def fn(chunk, emit):
+        for item in chunk:
+            if item == "boom":
+                raise ValueError("invalid LLM output")
+            emit(item.upper())
+
+    batches, failures = drain(stream_chunks_concurrently(
+        [["a", "b"], ["c", "boom", "d"], ["e"]], fn, max_workers=2, on_progress=progress.append
+    ))
+
+    assert sorted(item for batch in batches for item in batch) == [(0, "A"), (0, "B"), (1, "C"), (2, "E")]
+    assert failures == [(1, "invalid LLM output")]
+    assert progress[-1] == {"chunks_total": 3, "chunks_done": 3, "chunks_failed": 1}
+
+
+def test_items_are_yielded_before_slower_chunks_finish():
+    release = threading.Event()
+
+    def fn(chunk, emit):
+        if chunk == "slow":
+            assert release.wait(5)
+        emit(chunk)
+
+    stream = stream_chunks_concurrently(["fast", "slow"], fn, max_workers=2)
+
+    assert next(stream) == [(0, "fast")]
+    release.set()
+    batches, failures = drain(stream)
+    assert batches == [[(1, "slow")]] and failures == []
+
+
+def test_heartbeat_runs_while_chunks_are_pending():
+    beats = []
+    release = threading.Event()
+
+    def fn(chunk, emit):
+        assert release.wait(5)
+        emit(chunk)
+
+    def heartbeat():
+        beats.append(1)
+        if len(beats) == 2:
+            release.set()
+
+    batches, failures = drain(stream_chunks_concurrently(
+        ["only"], fn, heartbeat=heartbeat, heartbeat_seconds=0.01
+    ))
+
+    assert len(beats) >= 2
+    assert batches == [[(0, "only")]] and failures == []
+
+
+def test_chunk_workers_run_in_the_callers_trace(monkeypatch):
+    monkeypatch.setattr(metrics, "TRACING_ENABLED", True)
+    parents = []
+
+    def fn(chunk, emit):
+        with metrics.span("chunk") as current:
+            parents.append((current.trace_id, current.parent_id))
+        emit(chunk)
+
+    with metrics.span("analyze") as root:
+        drain(stream_chunks_concurrently(["a", "b"], fn, max_workers=2))
+
+    assert parents == [(root.trace_id, root.span_id)] * 2
+
+
+def test_no_chunks():
+    assert drain(stream_chunks_concurrently([], lambda chunk, emit: None)) == ([], [])
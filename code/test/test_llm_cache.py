@@ -0,0 +1,147 @@
+# test/test_llm_cache.py
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from utils import llm_cache
+from utils.llm_cache import DiskCache, LLMResponseCache, MemoryCache, MongoCache, make_cache_key
+
+MESSAGES = [{"role": "system", "content": "rank"}, {"role": "user", "content": "tx1, tx2"}]
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """
+    A controllable time.monotonic() and time.time() for the cache tiers.
+    """
+    now = [1000.0]
+    monkeypatch.setattr(llm_cache.time, "monotonic", lambda: now[0])
+    monkeypatch.setattr(llm_cache.time, "time", lambda: now[0])
+    return now
+
+
+class FailingTier:
+    def get(self, key):
+        raise OSError("tier down")
+
+    def set(self, key, value):
+        raise OSError("tier down")
+
+
+def test_cache_key_is_stable_and_covers_every_input():
+    key = make_cache_key("m", 0.2, MESSAGES)
+
+    assert key == make_cache_key("m", 0.2, [dict(reversed(list(m.items()))) for m in MESSAGES])
+    assert len(key) == 64
+    assert key != make_cache_key("other", 0.2, MESSAGES)
+    assert key != make_cache_key("m", 0.0, MESSAGES)
+    assert key != make_cache_key("m", 0.2, MESSAGES[::-1])
+    assert key != make_cache_key("m", 0.2, MESSAGES[:1])
+
+
+def test_memory_cache_evicts_the_least_recently_used(clock):
+    cache = MemoryCache(max_entries=2, ttl_seconds=60)
+    cache.set("a", "1")
+    cache.set("b", "2")
+    assert cache.get("a") == "1"
+
+    cache.set("c", "3")
+
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == ("1", "3")
+    assert len(cache) == 2
+
+
+def test_memory_cache_entries_expire(clock):
+    cache = MemoryCache(max_entries=2, ttl_seconds=60)
+    cache.set("a", "1")
+
+    clock[0] += 59
+    assert cache.get("a") == "1"
+    clock[0] += 2
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_disk_cache_is_shared_through_the_file(tmp_path, clock):
+    path = str(tmp_path / "llm_cache.sqlite3")
+    DiskCache(path, max_entries=10, ttl_seconds=60).set("a", "1")
+
+    other_worker = DiskCache(path, max_entries=10, ttl_seconds=60)
+
+    assert other_worker.get("a") == "1"
+    clock[0] += 61
+    assert other_worker.get("a") is None
+
+
+def test_disk_cache_keeps_the_newest_entries(tmp_path, clock):
+    cache = DiskCache(str(tmp_path / "llm_cache.sqlite3"), max_entries=2, ttl_seconds=60)
+    for key in "abc":
+        cache.set(key, key.upper())
+        clock[0] += 1
+
+    assert [cache.get(key) for key in "abc"] == [None, "B", "C"]
+    cache.clear()
+    assert cache.get("c") is None
+
+
+def test_mongo_cache_round_trip_and_expiry(db):
+    cache = MongoCache(ttl_seconds=60)
+    cache.set("a", '{"valid_products": []}')
+    cache.set("a", '{"valid_products": ["P1"]}')
+
+    assert cache.get("a") == '{"valid_products": ["P1"]}'
+    assert db.llm_cache.count_documents({}) == 1
+    assert "expires_at_1" in db.llm_cache.index_information()
+
+    db.llm_cache.update_one({"_id": "a"}, {"$set": {"expires_at": datetime.utcnow() - timedelta(seconds=1)}})
+    assert cache.get("a") is None
+
+
+def test_two_tier_hit_and_miss_stats(tmp_path, clock):
+    backend = DiskCache(str(tmp_path / "llm_cache.sqlite3"), max_entries=10, ttl_seconds=60)
+    backend.set("warm", "from disk")
+    cache = LLMResponseCache(MemoryCache(max_entries=10, ttl_seconds=60), backend)
+
+    assert cache.get("cold") is None
+    assert cache.get("warm") == "from disk"
+    assert cache.get("warm") == "from disk"
+    cache.set("new", "value")
+    assert cache.get("new") == "value" and backend.get("new") == "value"
+
+    stats = cache.get_stats()
+    assert {name: stats[name] for name in ("hits", "memory_hits", "backend_hits", "misses", "errors")} == {
+        "hits": 3, "memory_hits": 2, "backend_hits": 1, "misses": 1, "errors": 0
+    }
+    assert stats["memory_entries"] == 2
+
+
+def test_failing_backend_is_counted_and_the_memory_tier_still_serves(clock):
+    cache = LLMResponseCache(MemoryCache(max_entries=10, ttl_seconds=60), FailingTier())
+
+    cache.set("a", "1")
+
+    assert cache.get("a") == "1"
+    assert cache.get("b") is None
+    assert cache.get_stats()["errors"] == 2
+    assert cache.get_stats()["misses"] == 1
+
+
+def test_get_llm_cache_is_none_when_disabled(monkeypatch):
+    monkeypatch.setattr(llm_cache, "LLM_CACHE_ENABLED", False)
+
+    assert llm_cache.get_llm_cache() is None
+
+
+def test_get_llm_cache_builds_the_configured_backend_once(tmp_path, monkeypatch):
+    monkeypatch.setattr(llm_cache, "_cache", None)
+    monkeypatch.setattr(llm_cache, "LLM_CACHE_ENABLED", True)
+    monkeypatch.setattr(llm_cache, "LLM_CACHE_BACKEND", "disk")
+    monkeypatch.setattr(llm_cache, "LLM_CACHE_PATH", str(tmp_path / "llm_cache.sqlite3"))
+
+    cache = llm_cache.get_llm_cache()
+
+    assert isinstance(cache.backend, DiskCache)
+    assert llm_cache.get_llm_cache() is cache
+    assert cache.get_stats()["backend"] == "disk"
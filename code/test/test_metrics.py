@@ -0,0 +1,187 @@
+# test/test_metrics.py
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import pytest
+from flask import Flask
+
+from utils import metrics
+from utils.metrics import Counter, Histogram, MetricsRegistry, MongoCommandMetrics
+
+
+@pytest.fixture
+def tracing(monkeypatch):
+    monkeypatch.setattr(metrics, "TRACING_ENABLED", True)
+
+
+def sample(metric, suffix: str = "", **labels):
+    """
+    Value of one rendered sample of metric, or None if it was never recorded.
+    """
+    names = metric.labelnames + (("le",) if "le" in labels else ())
+    rendered = metrics._format_labels(names, [labels[name] for name in names])
+    prefix = f"{metric.name}{suffix}{rendered} "
+    for line in metric.samples():
+        if line.startswith(prefix):
+            return float(line[len(prefix):])
+    return None
+
+
+def command_event(name: str, command: dict, request_id: int, **fields):
+    return SimpleNamespace(command_name=name, command=command, connection_id=("db", 27017),
+                           request_id=request_id, **fields)
+
+
+def test_registry_renders_the_prometheus_text_format():
+    registry = MetricsRegistry()
+    requests = registry.counter("requests_total", "Requests served.", ("path",))
+    latency = registry.histogram("latency_seconds", "Request latency.", ("path",), buckets=(0.1, 1))
+    requests.inc(path="/a")
+    requests.inc(2, path='/b"\n')
+    latency.observe(0.05, path="/a")
+    latency.observe(0.5, path="/a")
+    latency.observe(3, path="/a")
+
+    assert registry.render() == (
+        "# HELP requests_total Requests served.\n"
+        "# TYPE requests_total counter\n"
+        'requests_total{path="/a"} 1\n'
+        'requests_total{path="/b\\"\\n"} 2\n'
+        "# HELP latency_seconds Request latency.\n"
+        "# TYPE latency_seconds histogram\n"
+        'latency_seconds_bucket{path="/a",le="0.1"} 1\n'
+        'latency_seconds_bucket{path="/a",le="1"} 2\n'
+        'latency_seconds_bucket{path="/a",le="+Inf"} 3\n'
+        'latency_seconds_sum{path="/a"} 3.55\n'
+        'latency_seconds_count{path="/a"} 3\n'
+    )
+
+
+def test_registering_a_name_twice_returns_the_first_metric():
+    registry = MetricsRegistry()
+    first = registry.counter("jobs_total", "Jobs.")
+
+    assert registry.counter("jobs_total", "Jobs again.") is first
+    assert registry.render().count("# TYPE jobs_total") == 1
+
+
+def test_unlabelled_counter_and_concurrent_increments():
+    counter = Counter("events_total", "Events.")
+
+    threads = [threading.Thread(target=lambda: [counter.inc() for _ in range(1000)]) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert list(counter.samples()) == ["events_total 4000"]
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram("size", "Sizes.", buckets=(1, 10, 100))
+    for value in (0, 1, 5, 50, 500):
+        histogram.observe(value)
+
+    assert [sample(histogram, "_bucket", le=le) for le in ("1", "10", "100", "+Inf")] == [2, 3, 4, 5]
+    assert sample(histogram, "_sum") == 556
+    assert sample(histogram, "_count") == 5
+
+
+def test_spans_nest_and_follow_propagate_context_into_threads(tracing):
+    def child(name):
+        with metrics.span(name) as current:
+            return current
+
+    with metrics.span("request") as root:
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            propagated = executor.submit(metrics.propagate_context(child), "propagated").result()
+            bare = executor.submit(child, "bare").result()
+        with metrics.span("nested") as nested:
+            pass
+
+    assert (propagated.trace_id, propagated.parent_id) == (root.trace_id, root.span_id)
+    assert (nested.trace_id, nested.parent_id) == (root.trace_id, root.span_id)
+    assert bare.parent_id is None and bare.trace_id != root.trace_id
+    recorded = metrics.get_recent_spans(root.trace_id)
+    assert [s["name"] for s in recorded] == ["propagated", "nested", "request"]
+    assert all(s["duration_ms"] is not None and s["status"] == "ok" for s in recorded)
+
+
+def test_failed_span_is_marked_as_an_error(tracing):
+    with pytest.raises(ValueError):
+        with metrics.span("failing") as current:
+            raise ValueError("boom")
+
+    assert metrics.get_recent_spans(current.trace_id)[0]["status"] == "error"
+
+
+def test_spans_are_not_recorded_when_tracing_is_disabled(monkeypatch):
+    monkeypatch.setattr(metrics, "TRACING_ENABLED", False)
+
+    with metrics.span("untraced") as current:
+        pass
+
+    assert metrics.get_recent_spans(current.trace_id) == []
+
+
+def test_pipeline_stages_are_timed_under_the_pipeline_label(tracing):
+    before = sample(metrics.STAGE_SECONDS, "_count", pipeline="test_pipeline", stage="load") or 0
+
+    def load():
+        with metrics.stage("load") as current:
+            current.set(documents=7)
+
+    with metrics.pipeline("test_pipeline") as total:
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            executor.submit(metrics.propagate_context(load)).result()
+
+    assert sample(metrics.STAGE_SECONDS, "_count", pipeline="test_pipeline", stage="load") == before + 1
+    assert sample(metrics.STAGE_SECONDS, "_count", pipeline="test_pipeline", stage="total") >= 1
+    assert sample(metrics.STAGE_DOCUMENTS, "_bucket", pipeline="test_pipeline", stage="load", le="10") >= 1
+    assert {s["name"] for s in metrics.get_recent_spans(total.trace_id)} >= {
+        "test_pipeline.load", "test_pipeline.total"
+    }
+
+
+def test_mongo_command_metrics_per_command_and_collection():
+    listener = MongoCommandMetrics()
+    labels = {"command": "find", "collection": "metrics_test"}
+    before = sample(metrics.MONGO_SECONDS, "_count", **labels) or 0
+
+    listener.started(command_event("find", {"find": "metrics_test"}, 1))
+    listener.succeeded(command_event("find", {}, 1, duration_micros=2500,
+                                     reply={"cursor": {"firstBatch": [{}, {}, {}]}}))
+    listener.started(command_event("getMore", {"getMore": 1, "collection": "metrics_test"}, 2))
+    listener.succeeded(command_event("getMore", {}, 2, duration_micros=100, reply={"cursor": {"nextBatch": [{}]}}))
+    listener.started(command_event("update", {"update": "metrics_test"}, 3))
+    listener.failed(command_event("update", {}, 3, duration_micros=100))
+    listener.started(command_event("ping", {"ping": 1}, 4))
+    listener.succeeded(command_event("ping", {}, 4, duration_micros=100, reply={"ok": 1}))
+
+    assert sample(metrics.MONGO_SECONDS, "_count", **labels) == before + 1
+    assert sample(metrics.MONGO_DOCUMENTS, "_bucket", command="getMore", collection="metrics_test", le="1") >= 1
+    assert sample(metrics.MONGO_FAILURES, command="update", collection="metrics_test") >= 1
+    assert sample(metrics.MONGO_SECONDS, "_count", command="ping", collection="") is None
+    assert listener._collections == {}
+
+
+def test_requests_are_timed_by_route_and_traced(tracing):
+    app = Flask(__name__)
+    metrics.init_app(app)
+
+    @app.route("/metrics_test/<item_id>")
+    def item(item_id):
+        with metrics.span("handler") as current:
+            return {"trace_id": current.trace_id, "parent_id": current.parent_id}
+
+    labels = {"endpoint": "/metrics_test/<item_id>", "method": "GET", "status": "200"}
+    before = sample(metrics.HTTP_SECONDS, "_count", **labels) or 0
+
+    body = app.test_client().get("/metrics_test/42").get_json()
+
+    assert sample(metrics.HTTP_SECONDS, "_count", **labels) == before + 1
+    request_span = metrics.get_recent_spans(body["trace_id"])[-1]
+    assert request_span["name"] == "GET /metrics_test/<item_id>"
+    assert body["parent_id"] == request_span["span_id"]
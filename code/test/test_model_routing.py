@@ -0,0 +1,146 @@
+# test/test_model_routing.py
+
+import json
+
+import pytest
+
+from conftest import make_transaction
+from services import transaction_service
+from services.transaction_service import LLMResponseError, LLMUnavailableError, _stream_transaction_chunk
+from utils import model_routing
+from utils.circuit_breaker import get_circuit_breaker
+from utils.model_routing import (
+    ROUTE_ESCALATION,
+    ROUTE_TRIAGE,
+    get_route_stats,
+    llm_cost,
+    record_escalation,
+    should_escalate,
+)
+
+TRIAGE_MODEL, ESCALATION_MODEL = "fast-model", "careful-model"
+
+
+class FakeLLMClient:
+    """
+    Streams a canned completion per model, a few characters per chunk.
+    """
+
+    def __init__(self, completions: dict):
+        self.completions = completions
+        self.calls = []
+
+    def stream_chat_completion(self, model, messages, temperature=None, **kwargs):
+        self.calls.append((model, messages[-1]["content"]))
+        text = self.completions[model]
+        for start in range(0, len(text), 5):
+            yield {"choices": [{"delta": {"content": text[start:start + 5]}}]}
+        yield {"choices": [], "usage": {"prompt_tokens": 1000, "completion_tokens": 100}}
+
+
+@pytest.fixture(autouse=True)
+def routes(monkeypatch):
+    monkeypatch.setitem(model_routing.ROUTE_MODELS, ROUTE_TRIAGE, TRIAGE_MODEL)
+    monkeypatch.setitem(model_routing.ROUTE_MODELS, ROUTE_ESCALATION, ESCALATION_MODEL)
+    monkeypatch.setattr(model_routing, "_stats", {})
+    monkeypatch.setattr(transaction_service, "LLM_STREAM_ENABLED", True)
+
+
+def use_client(monkeypatch, triage, escalation=None) -> FakeLLMClient:
+    completions = {TRIAGE_MODEL: triage if isinstance(triage, str) else json.dumps(triage)}
+    if escalation is not None:
+        completions[ESCALATION_MODEL] = json.dumps(escalation)
+    client = FakeLLMClient(completions)
+    monkeypatch.setattr(transaction_service, "get_llm_client", lambda: client)
+    return client
+
+
+def run_chunk(transactions) -> list:
+    emitted = []
+    _stream_transaction_chunk((transactions, None), emitted.append)
+    return [item["transaction_id"] for item in emitted]
+
+
+def test_uncertain_rows_are_asked_again_of_the_escalation_model(monkeypatch):
+    transactions = [make_transaction(i) for i in range(5)]
+    client = use_client(
+        monkeypatch,
+        triage={
+            "valid_transactions": [
+                {"transaction_id": "tx0000", "reason": "sure", "confidence": 0.9},
+                {"transaction_id": "tx0001", "reason": "guess", "confidence": 0.2},
+                {"transaction_id": "unknown", "reason": "not in the chunk"},
+            ],
+            "uncertain_transactions": ["tx0002"],
+        },
+        escalation={"valid_transactions": [
+            {"transaction_id": "tx0001", "reason": "checked"},
+            {"transaction_id": "tx0003", "reason": "not escalated"},
+        ]},
+    )
+
+    assert run_chunk(transactions) == ["tx0000", "tx0001"]
+
+    assert [model for model, _ in client.calls] == [TRIAGE_MODEL, ESCALATION_MODEL]
+    escalation_prompt = client.calls[1][1]
+    assert "tx0001" in escalation_prompt and "tx0002" in escalation_prompt
+    assert "tx0000" not in escalation_prompt and "tx0003" not in escalation_prompt
+    triage_stats = next(r for r in get_route_stats()["routes"] if r["route"] == ROUTE_TRIAGE)
+    assert triage_stats["escalated_rows"] == 2
+
+
+def test_invalid_triage_answer_escalates_the_whole_chunk(monkeypatch):
+    transactions = [make_transaction(i) for i in range(3)]
+    client = use_client(
+        monkeypatch,
+        triage='{"valid_transactions": [{"transaction_id": }, ',
+        escalation={"valid_transactions": [{"transaction_id": "tx0002", "reason": "checked"}]},
+    )
+
+    assert run_chunk(transactions) == ["tx0002"]
+
+    assert all(tx["transaction_id"] in client.calls[1][1] for tx in transactions)
+
+
+def test_invalid_answer_raises_without_an_escalation_model(monkeypatch):
+    monkeypatch.setitem(model_routing.ROUTE_MODELS, ROUTE_ESCALATION, TRIAGE_MODEL)
+    use_client(monkeypatch, triage="not json")
+
+    with pytest.raises(LLMResponseError):
+        run_chunk([make_transaction(0)])
+
+
+def test_open_circuit_is_not_escalated(monkeypatch):
+    client = use_client(monkeypatch, triage={"valid_transactions": []}, escalation={"valid_transactions": []})
+    breaker = get_circuit_breaker("llm")
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+
+    with pytest.raises(LLMUnavailableError):
+        run_chunk([make_transaction(0)])
+
+    assert client.calls == []
+
+
+def test_escalation_needs_a_different_model(monkeypatch):
+    assert should_escalate(ROUTE_TRIAGE)
+
+    monkeypatch.setitem(model_routing.ROUTE_MODELS, ROUTE_ESCALATION, TRIAGE_MODEL)
+
+    assert not should_escalate(ROUTE_TRIAGE)
+
+
+def test_llm_cost_uses_per_million_token_prices(monkeypatch):
+    monkeypatch.setitem(model_routing.MODEL_PRICES, "priced-model", (1.0, 2.0))
+
+    assert llm_cost("priced-model", {"prompt_tokens": 1_000_000, "completion_tokens": 500_000}) == 2.0
+    assert llm_cost("unpriced-model", {"prompt_tokens": 1_000_000}) == 0.0
+    assert llm_cost("priced-model", None) == 0.0
+
+
+def test_route_stats_count_escalated_rows():
+    record_escalation(ROUTE_TRIAGE, 3)
+    record_escalation(ROUTE_TRIAGE, 2)
+
+    (route,) = get_route_stats()["routes"]
+    assert (route["route"], route["model"], route["escalated_rows"]) == (ROUTE_TRIAGE, TRIAGE_MODEL, 5)
@@ -0,0 +1,260 @@
+# test/test_openai_util.py
+
+import json
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+
+from services import transaction_service
+from utils import openai_util
+from utils.openai_util import LLMClient, LLMHTTPError
+
+COMPLETION = {"choices": [{"message": {"content": '{"valid_products": []}'}}], "usage": {"prompt_tokens": 3}}
+MESSAGES = [{"role": "user", "content": "hi"}]
+
+
+class StubLLMServer:
+    """
+    Local chat completions endpoint answering each POST with the next
+    scripted (status, headers, body) reply; the last one is repeated.
+    """
+
+    def __init__(self, replies: list):
+        self.replies = list(replies)
+        self.requests = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                stub.requests.append(json.loads(self.rfile.read(int(self.headers["Content-Length"]))))
+                status, headers, body = stub.replies.pop(0) if len(stub.replies) > 1 else stub.replies[0]
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True)
+        self.thread.start()
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_address[1]}/v1"
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class FakeCache:
+    """
+    In-memory stand-in for the LLM response cache.
+    """
+
+    def __init__(self):
+        self.entries = {}
+
+    def get(self, key):
+        return self.entries.get(key)
+
+    def set(self, key, value):
+        self.entries[key] = value
+
+
+def reply(status: int, body=COMPLETION, headers: dict = None):
+    return status, {"Content-Type": "application/json", **(headers or {})}, json.dumps(body).encode("utf-8")
+
+
+def sse(*events) -> tuple:
+    body = "".join(f"data: {event if isinstance(event, str) else json.dumps(event)}\n\n" for event in events)
+    return 200, {"Content-Type": "text/event-stream"}, body.encode("utf-8")
+
+
+@pytest.fixture
+def delays(monkeypatch):
+    # Record the backoff delays instead of sleeping through them
+    slept = []
+    monkeypatch.setattr(openai_util.time, "sleep", slept.append)
+    return slept
+
+
+@pytest.fixture
+def serve():
+    servers = []
+
+    def start(*replies) -> tuple:
+        server = StubLLMServer(replies)
+        servers.append(server)
+        return server, LLMClient(api_key="test", base_url=server.base_url, max_retries=3)
+
+    yield start
+    for server in servers:
+        server.close()
+
+
+def test_retries_429_and_5xx_with_backoff(serve, delays):
+    server, client = serve(reply(429, {}, {"Retry-After": "2"}), reply(503, {}), reply(200))
+
+    assert client.chat_completion("m", MESSAGES, temperature=0.2) == COMPLETION
+
+    assert len(server.requests) == 3
+    assert server.requests[0] == {"model": "m", "messages": MESSAGES, "temperature": 0.2}
+    assert delays[0] == 2.0
+    assert 0 <= delays[1] <= openai_util.LLM_BACKOFF_BASE_SECONDS * 2
+    assert client.get_stats() == {"requests": 3, "retries": 2, "failures": 0}
+
+
+def test_gives_up_after_max_retries(serve, delays):
+    server, client = serve(reply(500, {"error": "down"}))
+
+    with pytest.raises(LLMHTTPError) as raised:
+        client.chat_completion("m", MESSAGES)
+
+    assert raised.value.status_code == 500
+    assert len(server.requests) == 4 and len(delays) == 3
+    assert client.get_stats()["failures"] == 1
+
+
+def test_4xx_is_not_retried(serve, delays):
+    server, client = serve(reply(400, {"error": "bad request"}))
+
+    with pytest.raises(LLMHTTPError) as raised:
+        client.chat_completion("m", MESSAGES)
+
+    assert raised.value.status_code == 400
+    assert "bad request" in raised.value.body
+    assert len(server.requests) == 1 and delays == []
+    assert client.get_stats() == {"requests": 1, "retries": 0, "failures": 1}
+
+
+def test_success_body_that_is_not_json_raises_llm_http_error(serve, delays):
+    server, client = serve((200, {"Content-Type": "text/html"}, b"<html>proxy error</html>"))
+
+    with pytest.raises(LLMHTTPError) as raised:
+        client.chat_completion("m", MESSAGES)
+
+    assert raised.value.status_code == 200
+    assert "proxy error" in raised.value.body
+    assert client.get_stats()["failures"] == 1
+
+
+def test_transport_errors_are_retried(delays):
+    client = LLMClient(api_key="test", base_url="http://127.0.0.1:9/v1", max_retries=1,
+                       timeout=httpx.Timeout(1.0))
+
+    with pytest.raises(LLMHTTPError) as raised:
+        client.chat_completion("m", MESSAGES)
+
+    assert raised.value.status_code is None
+    assert client.get_stats() == {"requests": 2, "retries": 1, "failures": 1}
+
+
+def test_stream_yields_each_event_after_a_retried_start(serve, delays):
+    chunks = [{"choices": [{"delta": {"content": part}}]} for part in ('{"a"', ": 1}")]
+    server, client = serve(reply(502, {}), sse(*chunks, {"choices": [], "usage": {"completion_tokens": 2}}, "[DONE]"))
+
+    streamed = list(client.stream_chat_completion("m", MESSAGES))
+
+    assert streamed[:2] == chunks
+    assert streamed[2]["usage"] == {"completion_tokens": 2}
+    assert server.requests[-1]["stream"] is True
+    assert server.requests[-1]["stream_options"] == {"include_usage": True}
+    assert client.get_stats() == {"requests": 2, "retries": 1, "failures": 0}
+
+
+def test_stream_4xx_is_not_retried(serve, delays):
+    server, client = serve(reply(401, {"error": "bad key"}))
+
+    with pytest.raises(LLMHTTPError):
+        list(client.stream_chat_completion("m", MESSAGES))
+
+    assert len(server.requests) == 1
+    assert client.get_stats()["failures"] == 1
+
+
+def test_stream_event_that_is_not_json_raises_llm_http_error(serve, delays):
+    server, client = serve(sse({"choices": []}, "{not json"))
+    stream = client.stream_chat_completion("m", MESSAGES)
+
+    assert next(stream) == {"choices": []}
+    with pytest.raises(LLMHTTPError):
+        next(stream)
+    assert client.get_stats()["failures"] == 1
+
+
+def test_call_llm_json_turns_a_garbled_answer_into_llm_unavailable(serve, delays, monkeypatch):
+    server, client = serve((200, {"Content-Type": "text/html"}, b"<html>proxy error</html>"))
+    monkeypatch.setattr(transaction_service, "get_llm_client", lambda: client)
+
+    with pytest.raises(transaction_service.LLMUnavailableError):
+        transaction_service.call_llm_json("system", "user")
+    assert transaction_service.get_circuit_breaker("llm").get_stats()["failures"] == 1
+
+
+@pytest.fixture
+def async_delays(monkeypatch):
+    slept = []
+
+    async def sleep(seconds):
+        slept.append(seconds)
+
+    monkeypatch.setattr(openai_util.asyncio, "sleep", sleep)
+    return slept
+
+
+def run_async(client: LLMClient, coroutine):
+    async def run():
+        try:
+            return await coroutine
+        finally:
+            await client.aclose()
+
+    return asyncio.run(run())
+
+
+def test_async_retries_with_backoff(serve, async_delays):
+    server, client = serve(reply(503, {}), reply(429, {}, {"Retry-After": "1.5"}), reply(200))
+
+    assert run_async(client, client.achat_completion("m", MESSAGES)) == COMPLETION
+
+    assert len(server.requests) == 3
+    assert async_delays[1] == 1.5
+    assert client.get_stats() == {"requests": 3, "retries": 2, "failures": 0}
+
+
+def test_async_4xx_is_not_retried(serve, async_delays):
+    server, client = serve(reply(404, {"error": "no such model"}))
+
+    with pytest.raises(LLMHTTPError) as raised:
+        run_async(client, client.achat_completion("m", MESSAGES))
+
+    assert raised.value.status_code == 404
+    assert len(server.requests) == 1 and async_delays == []
+    assert client.get_stats()["failures"] == 1
+
+
+def test_async_calls_share_the_sync_cache(serve, async_delays, monkeypatch):
+    server, client = serve(reply(200))
+    cache = FakeCache()
+    monkeypatch.setattr(transaction_service, "get_llm_client", lambda: client)
+    monkeypatch.setattr(transaction_service, "get_llm_cache", lambda: cache)
+
+    async def call_twice():
+        first = await transaction_service.acall_llm_json("system", "user")
+        second = await transaction_service.acall_llm_json("system", "user")
+        return first, second
+
+    first, second = run_async(client, call_twice())
+
+    assert first == second == {"valid_products": []}
+    assert len(server.requests) == 1
+    assert transaction_service.call_llm_json("system", "user") == first
+    assert len(server.requests) == 1
@@ -0,0 +1,60 @@
+# test/test_prompt_builder.py
+
+from conftest import make_transaction
+from utils.prompt_builder import PromptBuilder
+
+SYSTEM_PROMPT = "Pick the transactions worth a recommendation."
+
+
+def test_everything_is_listed_when_it_fits():
+    builder = PromptBuilder(SYSTEM_PROMPT, footer="Answer in JSON.", max_tokens=10000)
+    transactions = [make_transaction(i) for i in range(5)]
+
+    builder.add_transactions(transactions)
+    system_prompt, user_message = builder.build()
+
+    assert system_prompt == SYSTEM_PROMPT
+    assert all(tx["transaction_id"] in user_message for tx in transactions)
+    assert user_message.endswith("Answer in JSON.")
+    assert builder.summarized == []
+    assert builder.stats["transactions_listed"] == 5
+
+
+def test_repeated_descriptions_are_listed_once():
+    builder = PromptBuilder(SYSTEM_PROMPT, max_tokens=10000)
+    transactions = [make_transaction(i, description="Monthly rent to ACME Properties") for i in range(3)]
+    transactions.append(make_transaction(3, description="One-off purchase"))
+
+    builder.add_transactions(transactions)
+    _, user_message = builder.build()
+
+    assert user_message.count("Monthly rent to ACME Properties") == 1
+    assert "D1: Monthly rent to ACME Properties" in user_message
+    assert user_message.count("Description: [D1]") == 3
+    assert "Description: One-off purchase" in user_message
+    assert builder.stats["descriptions_deduplicated"] == 3
+
+
+def test_tight_budget_summarizes_the_smallest_rows():
+    transactions = [make_transaction(i, amount=float(i)) for i in range(40)]
+    builder = PromptBuilder(SYSTEM_PROMPT, footer="Answer in JSON.", max_tokens=400)
+
+    builder.add_transactions(transactions)
+    _, user_message = builder.build()
+
+    listed = [tx for tx in transactions if f"TransactionID: {tx['transaction_id']}," in user_message]
+    assert 0 < len(listed) < 40
+    assert builder.stats["total_tokens"] <= 400
+    assert min(tx["amount"] for tx in listed) > max(tx["amount"] for tx in builder.summarized)
+    assert len(listed) + len(builder.summarized) == 40
+    assert "Travel: " in user_message.split("summarized by merchant category:")[1]
+
+
+def test_add_lines_stops_at_the_budget():
+    builder = PromptBuilder(SYSTEM_PROMPT, max_tokens=100)
+
+    added = builder.add_lines("Products:", [f"  Product {i}: a long enough product line" for i in range(50)])
+
+    assert 0 < added < 50
+    assert builder.stats["lines_dropped"] == 50 - added
+    assert builder.remaining() >= 0
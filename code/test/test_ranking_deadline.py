@@ -0,0 +1,100 @@
+# test/test_ranking_deadline.py
+
+import threading
+
+import pytest
+
+from conftest import make_transaction
+from services import transaction_service
+from services.transaction_service import LLMUnavailableError, rank_products_within_deadline
+from utils import circuit_breaker
+from utils.circuit_breaker import STATE_OPEN, CircuitBreaker
+
+CUSTOMER = {"customer_id": "101", "interests": ["travel"], "credit_score": 720}
+PRODUCTS = [{
+    "product_id": "p1", "product_name": "Travel Card", "product_type": "Credit Card",
+    "description": "Miles on travel spend", "eligibility_criteria": "Credit score 650+",
+}]
+
+
+class SlowLLMClient:
+    """
+    Answers each chat completion with answer once release is set.
+    """
+
+    def __init__(self):
+        self.answer = '{"valid_products": [{"product_id": "p1"}]}'
+        self.release = threading.Event()
+        self.started = threading.Semaphore(0)
+        self.finished = threading.Semaphore(0)
+
+    def chat_completion(self, model, messages, temperature=None, **kwargs):
+        self.started.release()
+        self.release.wait(5)
+        self.finished.release()
+        return {"choices": [{"message": {"content": self.answer}}]}
+
+
+@pytest.fixture
+def client(monkeypatch):
+    client = SlowLLMClient()
+    monkeypatch.setattr(transaction_service, "get_llm_client", lambda: client)
+    monkeypatch.setattr(transaction_service, "_deadline_executor", None)
+    yield client
+    client.release.set()
+
+
+@pytest.fixture
+def breaker(monkeypatch):
+    breaker = CircuitBreaker("llm", failure_threshold=1, reset_seconds=60)
+    monkeypatch.setitem(circuit_breaker._breakers, "llm", breaker)
+    return breaker
+
+
+def rank(deadline_seconds: float) -> dict:
+    return rank_products_within_deadline(CUSTOMER, [make_transaction(0)], PRODUCTS, deadline_seconds=deadline_seconds)
+
+
+def test_late_answer_does_not_close_the_circuit_its_deadline_opened(client, breaker, monkeypatch):
+    # One worker, so the no-op submitted below runs after the late call has settled
+    monkeypatch.setattr(transaction_service, "RANKING_DEADLINE_WORKERS", 1)
+    with pytest.raises(LLMUnavailableError):
+        rank(0.05)
+    assert breaker.state == STATE_OPEN
+
+    client.release.set()
+    assert client.finished.acquire(timeout=5)
+    transaction_service._deadline_executor.submit(lambda: None).result(5)
+
+    assert breaker.state == STATE_OPEN
+    assert breaker.get_stats()["failures"] == 1
+    assert breaker.get_stats()["successes"] == 0
+
+
+def test_answer_within_the_deadline_is_recorded_once(client, breaker):
+    client.release.set()
+
+    assert rank(5)["valid_products"] == [{"product_id": "p1"}]
+    assert breaker.get_stats()["successes"] == 1
+
+
+def test_bare_list_answer_is_read_as_the_ranking(client, breaker):
+    client.answer = '```json\n[{"product_id": "p1", "priority": 1}]\n```'
+    client.release.set()
+
+    assert rank(0)["valid_products"] == [{"product_id": "p1", "priority": 1}]
+    assert rank(5)["valid_products"] == [{"product_id": "p1", "priority": 1}]
+
+
+def test_calls_queued_past_their_deadline_are_cancelled(client, monkeypatch):
+    monkeypatch.setattr(transaction_service, "RANKING_DEADLINE_WORKERS", 1)
+    blocking = transaction_service._get_deadline_executor().submit(client.chat_completion, "m", [])
+    assert client.started.acquire(timeout=5)
+
+    with pytest.raises(LLMUnavailableError):
+        rank(0.05)
+
+    client.release.set()
+    blocking.result(5)
+    assert client.started.acquire(timeout=0.2) is False
+    assert circuit_breaker.get_circuit_breaker("llm").get_stats()["failures"] == 0
@@ -0,0 +1,141 @@
+# test/test_recommendation_store.py
+
+from datetime import datetime, timedelta
+
+import pytest
+from flask import Flask
+
+from controllers.recommendation_controller import recommendation_bp
+from services import recommendation_store
+from services.recommendation_store import (
+    LATEST_PER_CUSTOMER_SORT,
+    compute_input_hash,
+    get_latest_recommendation,
+    is_fresh,
+    load_latest_recommendations,
+    save_recommendations,
+)
+from utils import json_provider
+from utils.db_indexes import INDEXES
+
+WINDOW = (datetime(2025, 2, 1), datetime(2025, 2, 15, 23, 59, 59))
+CREATED = datetime(2025, 2, 16, 8, 0)
+
+
+def stored(customer_id: str, run_id: str, hours: int = 0, window=WINDOW, **fields) -> dict:
+    return {
+        "customer_id": customer_id,
+        "run_id": run_id,
+        "valid_products": [{"product_id": f"P-{run_id}", "priority": 1}],
+        "model": "m",
+        "input_hash": "h",
+        "error": None,
+        "window_start": window[0],
+        "window_end": window[1],
+        "created_at": CREATED + timedelta(hours=hours),
+        **fields,
+    }
+
+
+def test_latest_per_customer_sort_follows_the_customer_latest_index():
+    index = next(model for model in INDEXES["recommendations"] if model.document["name"] == "customer_latest")
+
+    assert LATEST_PER_CUSTOMER_SORT == list(index.document["key"].items())
+
+
+def test_load_latest_recommendations_picks_the_newest_success_per_customer(db):
+    db.recommendations.insert_many([
+        stored("101", "r1"),
+        stored("101", "r2", hours=1),
+        stored("101", "r3", hours=2, error="LLM unavailable"),
+        stored("102", "r1", hours=3),
+        stored("102", "r2", hours=4, window=(datetime(2025, 1, 1), None)),
+        stored("103", "r1"),
+    ])
+
+    latest = load_latest_recommendations(db, ["101", "102", "104"], *WINDOW)
+
+    assert {customer_id: doc["run_id"] for customer_id, doc in latest.items()} == {"101": "r2", "102": "r1"}
+    assert "_id" not in latest["101"]
+
+
+def test_save_recommendations_upserts_per_customer_and_run(db):
+    save_recommendations(db, [stored("101", "r1", valid_products=[])])
+    first = db.recommendations.find_one({"customer_id": "101"})
+
+    save_recommendations(db, [{"customer_id": "101", "run_id": "r1", "valid_products": [{"product_id": "P2"}]}])
+    save_recommendations(db, [])
+
+    docs = list(db.recommendations.find({"customer_id": "101"}))
+    assert len(docs) == 1
+    assert docs[0]["valid_products"] == [{"product_id": "P2"}]
+    assert docs[0]["created_at"] == first["created_at"]
+    assert docs[0]["updated_at"] >= first["updated_at"]
+
+
+def test_get_latest_recommendation_with_and_without_a_window(db):
+    db.recommendations.insert_many([
+        stored("101", "r1"),
+        stored("101", "r2", hours=1, window=(datetime(2025, 1, 1), None)),
+    ])
+
+    assert get_latest_recommendation(db, "101")["run_id"] == "r2"
+    assert get_latest_recommendation(db, "101", *WINDOW)["run_id"] == "r1"
+    assert get_latest_recommendation(db, "102") is None
+
+
+def test_is_fresh(monkeypatch):
+    monkeypatch.setattr(recommendation_store, "RECOMMENDATION_MAX_AGE_SECONDS", 3600)
+    recommendation = stored("101", "r1", created_at=datetime.utcnow())
+
+    assert is_fresh(recommendation, "h", "m")
+    assert not is_fresh(recommendation, "other", "m")
+    assert not is_fresh(recommendation, "h", "other-model")
+    assert not is_fresh({**recommendation, "error": "failed"}, "h", "m")
+    assert not is_fresh({**recommendation, "created_at": datetime.utcnow() - timedelta(hours=2)}, "h", "m")
+    assert not is_fresh(None, "h", "m")
+
+
+def test_input_hash_ignores_order_but_not_content():
+    customer = {"segment_id": "S1", "product_ids": ["P1", "P2"], "interests": ["travel"], "credit_score": 700}
+    transactions = [
+        {"transaction_id": "tx1", "amount": 10.0, "balance_after_transaction": 90.0},
+        {"transaction_id": "tx2", "amount": 20.0, "balance_after_transaction": 70.0},
+    ]
+    products = [{"product_id": "P3", "product_name": "Card"}, {"product_id": "P4", "product_name": "Loan"}]
+    base = compute_input_hash(customer, transactions, products, *WINDOW)
+
+    assert compute_input_hash({**customer, "product_ids": ["P2", "P1"]}, transactions[::-1], products[::-1],
+                              *WINDOW) == base
+    assert compute_input_hash(customer, transactions[:1], products, *WINDOW) != base
+    assert compute_input_hash(customer, transactions, products, WINDOW[0]) != base
+    assert compute_input_hash(customer, transactions, products, *WINDOW, transaction_summary="summary") != base
+
+
+@pytest.fixture
+def client(db):
+    app = Flask(__name__)
+    json_provider.init_app(app)
+    app.register_blueprint(recommendation_bp, url_prefix="/api/recommendations")
+    return app.test_client()
+
+
+def test_read_api_serves_the_latest_stored_recommendation(client, db):
+    db.recommendations.insert_many([stored("101", "r1"), stored("101", "r2", hours=1, source="api")])
+
+    response = client.get("/api/recommendations/101/latest")
+
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body["run_id"] == "r2" and body["source"] == "api"
+    assert body["valid_products"] == [{"product_id": "P-r2", "priority": 1}]
+    assert "_id" not in body
+
+
+def test_read_api_is_404_without_a_stored_recommendation(client, db):
+    db.recommendations.insert_one(stored("101", "r1", error="LLM unavailable"))
+
+    response = client.get("/api/recommendations/101/latest")
+
+    assert response.status_code == 404
+    assert "error" in response.get_json()
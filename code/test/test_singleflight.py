@@ -0,0 +1,120 @@
+# test/test_singleflight.py
+
+import time
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+from utils import singleflight
+from utils.singleflight import (
+    SINGLEFLIGHT_COLLECTION,
+    STATUS_DONE,
+    STATUS_FAILED,
+    STATUS_RUNNING,
+    SingleFlight,
+    SingleFlightError,
+    SingleFlightTimeoutError,
+)
+
+
+def make_group(**kwargs) -> SingleFlight:
+    options = {"lease_seconds": 60, "result_ttl_seconds": 10, "wait_seconds": 1, "poll_seconds": 0.01}
+    return SingleFlight(**{**options, **kwargs})
+
+
+def test_concurrent_callers_share_one_computation(db):
+    group = make_group()
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return {"answer": 42}
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(group.do("key", compute)))
+    leader.start()
+    assert started.wait(5)
+    followers = [threading.Thread(target=lambda: results.append(group.do("key", compute))) for _ in range(3)]
+    for follower in followers:
+        follower.start()
+    while group.get_stats()["joined_local"] < 3:
+        time.sleep(0.01)
+    release.set()
+    for thread in [leader, *followers]:
+        thread.join(5)
+
+    assert calls == [1]
+    assert results == [{"answer": 42}] * 4
+    assert group.get_stats()["in_flight"] == 0
+    stored = db[SINGLEFLIGHT_COLLECTION].find_one({"_id": "key"})
+    assert stored["status"] == STATUS_DONE
+    assert stored["result"] == {"answer": 42}
+
+
+def test_fresh_result_of_another_worker_is_reused(db):
+    db[SINGLEFLIGHT_COLLECTION].insert_one({
+        "_id": "key", "status": STATUS_DONE, "result": [1, 2], "finished_at": datetime.utcnow(),
+        "lease_expires_at": datetime.utcnow(),
+    })
+    group = make_group()
+
+    assert group.do("key", lambda: pytest.fail("must not recompute")) == [1, 2]
+    assert group.get_stats()["joined_remote"] == 1
+
+
+def test_expired_lease_of_another_worker_is_taken_over(db):
+    db[SINGLEFLIGHT_COLLECTION].insert_one({
+        "_id": "key", "status": STATUS_RUNNING, "owner": "crashed",
+        "lease_expires_at": datetime.utcnow() - timedelta(seconds=1),
+    })
+    group = make_group()
+
+    assert group.do("key", lambda: "recomputed") == "recomputed"
+    assert group.get_stats()["leader"] == 1
+    assert db[SINGLEFLIGHT_COLLECTION].find_one({"_id": "key"})["owner"] != "crashed"
+
+
+def test_waiter_times_out_on_a_live_lease(db):
+    db[SINGLEFLIGHT_COLLECTION].insert_one({
+        "_id": "key", "status": STATUS_RUNNING, "owner": "busy",
+        "lease_expires_at": datetime.utcnow() + timedelta(minutes=5),
+    })
+    group = make_group(wait_seconds=0.05)
+
+    with pytest.raises(SingleFlightTimeoutError):
+        group.do("key", lambda: pytest.fail("must not run under another worker's lease"))
+
+
+def test_failure_is_recorded_and_the_key_can_be_retried(db):
+    group = make_group()
+
+    def fail():
+        raise RuntimeError("LLM down")
+
+    with pytest.raises(RuntimeError):
+        group.do("key", fail)
+    stored = db[SINGLEFLIGHT_COLLECTION].find_one({"_id": "key"})
+    assert (stored["status"], stored["error"]) == (STATUS_FAILED, "LLM down")
+
+    assert group.do("key", lambda: "ok") == "ok"
+
+
+def test_waiters_see_a_remote_failure(db, monkeypatch):
+    db[SINGLEFLIGHT_COLLECTION].insert_one({
+        "_id": "key", "status": STATUS_RUNNING, "owner": "other",
+        "lease_expires_at": datetime.utcnow() + timedelta(minutes=5),
+    })
+    group = make_group()
+
+    def other_worker_fails(seconds):
+        db[SINGLEFLIGHT_COLLECTION].update_one({"_id": "key"}, {"$set": {"status": STATUS_FAILED, "error": "boom"}})
+
+    # The other worker fails while this one is polling
+    monkeypatch.setattr(singleflight.time, "sleep", other_worker_fails)
+
+    with pytest.raises(SingleFlightError, match="boom"):
+        group.do("key", lambda: pytest.fail("must not run"))
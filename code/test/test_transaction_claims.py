@@ -0,0 +1,119 @@
+# test/test_transaction_claims.py
+
+from datetime import datetime, timedelta
+
+from conftest import make_transaction
+from services.transaction_claims import (
+    STATUS_CLAIMED,
+    STATUS_DONE,
+    STATUS_PENDING,
+    claim_transactions,
+    complete_claim,
+    mark_claimed_valid,
+    release_claim,
+    renew_claim,
+)
+
+PROJECTION = {"_id": 0, "transaction_id": 1}
+
+
+def ids(transactions) -> list:
+    return sorted(tx["transaction_id"] for tx in transactions)
+
+
+def test_claims_split_rows_between_workers(db):
+    db.transactions.insert_many([make_transaction(i) for i in range(5)])
+
+    first_token, first = claim_transactions(db, {}, PROJECTION, owner="a", limit=3)
+    second_token, second = claim_transactions(db, {}, PROJECTION, owner="b", limit=3)
+    third_token, third = claim_transactions(db, {}, PROJECTION, owner="c", limit=3)
+
+    assert ids(first) == ["tx0000", "tx0001", "tx0002"]
+    assert ids(second) == ["tx0003", "tx0004"]
+    assert (third_token, third) == (None, [])
+    assert first_token != second_token
+    claimed = db.transactions.find_one({"transaction_id": "tx0000"})
+    assert claimed["processing_status"] == STATUS_CLAIMED
+    assert claimed["claim_owner"] == "a"
+
+
+def test_claims_follow_transaction_date_order(db):
+    db.transactions.insert_many([
+        make_transaction(0, transaction_date=datetime(2025, 2, 1, 18)),
+        make_transaction(1, transaction_date=datetime(2025, 2, 1, 8)),
+        make_transaction(2, transaction_date=datetime(2025, 2, 1, 12)),
+    ])
+
+    _, claimed = claim_transactions(db, {}, PROJECTION, limit=2)
+
+    assert ids(claimed) == ["tx0001", "tx0002"]
+
+
+def test_expired_lease_can_be_taken_over(db):
+    db.transactions.insert_many([make_transaction(i) for i in range(2)])
+    stale_token, _ = claim_transactions(db, {}, PROJECTION, owner="crashed")
+    db.transactions.update_many({}, {"$set": {"claim_expires_at": datetime.utcnow() - timedelta(seconds=1)}})
+
+    token, claimed = claim_transactions(db, {}, PROJECTION, owner="b")
+
+    assert ids(claimed) == ["tx0000", "tx0001"]
+    assert token != stale_token
+    assert mark_claimed_valid(db, stale_token, ["tx0000"]) == []
+
+
+def test_legacy_rows_are_claimable_but_processed_ones_are_not(db):
+    legacy = make_transaction(0)
+    processed = make_transaction(1, is_processed_for_recommendation=True)
+    done = make_transaction(2, processing_status=STATUS_DONE, verdict="rejected")
+    db.transactions.insert_many([legacy, processed, done])
+
+    _, claimed = claim_transactions(db, {}, PROJECTION)
+
+    assert ids(claimed) == ["tx0000"]
+
+
+def test_complete_claim_marks_valid_and_rejects_the_rest(db):
+    db.transactions.insert_many([make_transaction(i) for i in range(4)])
+    token, _ = claim_transactions(db, {}, PROJECTION)
+
+    assert mark_claimed_valid(db, token, ["tx0000", "unknown"]) == ["tx0000"]
+    counts = complete_claim(db, token, ["tx0001"])
+
+    assert counts == {"valid": 1, "rejected": 2}
+    rows = {doc["transaction_id"]: doc for doc in db.transactions.find()}
+    assert [rows[tx_id]["verdict"] for tx_id in sorted(rows)] == ["valid", "valid", "rejected", "rejected"]
+    assert rows["tx0000"]["is_processed_for_recommendation"] is True
+    assert rows["tx0002"]["is_processed_for_recommendation"] is False
+    assert all(doc["processing_status"] == STATUS_DONE and "claim_token" not in doc for doc in rows.values())
+
+
+def test_mark_claimed_valid_skips_rows_taken_over(db):
+    db.transactions.insert_many([make_transaction(i) for i in range(2)])
+    token, _ = claim_transactions(db, {}, PROJECTION)
+    db.transactions.update_one({"transaction_id": "tx0001"}, {"$set": {"claim_token": "other-worker"}})
+
+    assert mark_claimed_valid(db, token, ["tx0000", "tx0001"]) == ["tx0000"]
+    assert mark_claimed_valid(db, token, ["tx0000"]) == []
+
+
+def test_release_claim_returns_rows_to_pending(db):
+    db.transactions.insert_many([make_transaction(i) for i in range(3)])
+    token, _ = claim_transactions(db, {}, PROJECTION)
+
+    assert release_claim(db, token, ["tx0001"]) == 1
+    assert release_claim(db, token) == 2
+
+    assert {doc["processing_status"] for doc in db.transactions.find()} == {STATUS_PENDING}
+    _, reclaimed = claim_transactions(db, {}, PROJECTION)
+    assert len(reclaimed) == 3
+
+
+def test_renew_claim_extends_the_lease_of_held_rows(db):
+    db.transactions.insert_many([make_transaction(i) for i in range(2)])
+    token, _ = claim_transactions(db, {}, PROJECTION, lease_seconds=1)
+    mark_claimed_valid(db, token, ["tx0000"])
+
+    assert renew_claim(db, token, lease_seconds=3600) == 1
+
+    held = db.transactions.find_one({"transaction_id": "tx0001"})
+    assert held["claim_expires_at"] > datetime.utcnow() + timedelta(minutes=59)
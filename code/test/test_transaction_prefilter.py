@@ -0,0 +1,81 @@
+# test/test_transaction_prefilter.py
+
+from conftest import make_transaction
+from services.transaction_prefilter import load_prefilter_rules, prefilter_transactions
+
+
+def row(index: int, category: str, amount: float, balance: float = 5000.0) -> dict:
+    return make_transaction(index, merchant_category=category, amount=amount, balance_after_transaction=balance)
+
+
+def ids(transactions) -> list:
+    return [tx["transaction_id"] for tx in transactions]
+
+
+def test_rows_are_split_by_the_default_rules():
+    transactions = [
+        row(0, "Travel", 20.0),            # below min_amount
+        row(1, "Groceries", 250.0),        # routine, below its threshold
+        row(2, "Groceries", 800.0),        # routine, above its threshold
+        row(3, "Travel", 2500.0),          # auto-accepted
+        row(4, "Travel", 1500.0),          # below the auto-accept threshold
+        row(5, "Insurance", 10.0),         # allowlisted, whatever the amount
+        row(6, "Dining", 30.0, 100.0),     # low balance
+        row(7, "Real Estate", 30000.0),    # auto-accepted
+    ]
+
+    result = prefilter_transactions(transactions, load_prefilter_rules())
+
+    assert [item["transaction_id"] for item in result["accepted"]] == ["tx0003", "tx0007"]
+    assert ids(result["ambiguous"]) == ["tx0002", "tx0004", "tx0005", "tx0006"]
+    assert result["stats"] == {"rows_in": 8, "rows_dropped": 2, "rows_auto_accepted": 2, "rows_to_llm": 4}
+
+
+def test_accepted_items_have_the_llm_output_shape():
+    result = prefilter_transactions([row(0, "Travel", 2000.0)], load_prefilter_rules())
+
+    (item,) = result["accepted"]
+    assert set(item) == {"transaction_id", "reason"}
+    assert "Travel" in item["reason"] and "2000.00" in item["reason"]
+
+
+def test_allowlisted_rows_are_never_auto_accepted():
+    rules = load_prefilter_rules()
+    rules["auto_accept_category_min_amount"]["Insurance"] = 100.0
+
+    result = prefilter_transactions([row(0, "Insurance", 5000.0)], rules)
+
+    assert result["accepted"] == []
+    assert ids(result["ambiguous"]) == ["tx0000"]
+
+
+def test_explicit_rules_replace_the_defaults():
+    rules = {
+        "min_amount": 0.0,
+        "routine_category_max_amount": {},
+        "auto_accept_category_min_amount": {"Groceries": 100.0},
+        "allowlist_categories": [],
+        "low_balance_threshold": 0.0,
+    }
+
+    result = prefilter_transactions([row(0, "Groceries", 150.0), row(1, "Travel", 5.0)], rules)
+
+    assert [item["transaction_id"] for item in result["accepted"]] == ["tx0000"]
+    assert ids(result["ambiguous"]) == ["tx0001"]
+
+
+def test_empty_input():
+    result = prefilter_transactions([], load_prefilter_rules())
+
+    assert result["accepted"] == [] and result["ambiguous"] == []
+    assert result["stats"]["rows_in"] == 0
+
+
+def test_rules_file_overrides_key_by_key(tmp_path):
+    path = tmp_path / "rules.json"
+    path.write_text('{"min_amount": 10}', encoding="utf-8")
+
+    rules = load_prefilter_rules(str(path))
+
+    assert rules["min_amount"] == 10
+    assert rules["low_balance_threshold"] == 500.0
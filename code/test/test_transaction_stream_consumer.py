@@ -0,0 +1,174 @@
+# test/test_transaction_stream_consumer.py
+
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+from pymongo.errors import OperationFailure
+
+from conftest import make_transaction
+from services import transaction_stream_consumer
+from services.transaction_stream_consumer import MODE_AUTO, MODE_CHANGE_STREAM, MODE_POLL, TransactionStreamConsumer
+
+CREATED = datetime(2025, 2, 1, 9, 0)
+
+
+class StopWhenIdle(threading.Event):
+    """
+    Stop event that ends the polling loop the first time it waits for new rows.
+    """
+
+    def wait(self, timeout=None):
+        self.set()
+        return True
+
+
+class FakeChangeStream:
+    """
+    Stand-in for a change stream: returns the scripted inserts, then stops
+    the consumer once they are consumed.
+    """
+
+    def __init__(self, consumer, transaction_ids: list):
+        self.consumer = consumer
+        self.changes = [{"fullDocument": {"transaction_id": tx_id}} for tx_id in transaction_ids]
+        self.resume_token = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def try_next(self):
+        if not self.changes:
+            self.consumer.stop()
+            return None
+        self.resume_token = {"_data": f"token-{len(self.changes)}"}
+        return self.changes.pop(0)
+
+
+@pytest.fixture
+def analyzed(monkeypatch):
+    """
+    Replace the LLM analysis with one that records each micro-batch.
+    """
+    batches = []
+
+    def analyze(transactions, claim_token, label=None):
+        batches.append([tx["transaction_id"] for tx in transactions])
+        if any(tx["transaction_id"] == "tx0666" for tx in transactions):
+            return {"error": "LLM unavailable"}
+        return transactions[:1]
+
+    monkeypatch.setattr(transaction_stream_consumer, "analyze_unprocessed_transactions", analyze)
+    return batches
+
+
+def insert(db, indexes, created_at=CREATED, **fields):
+    db.transactions.insert_many([
+        make_transaction(i, created_at=created_at + timedelta(seconds=i // 2), **fields) for i in indexes
+    ])
+
+
+def polling_consumer(**kwargs) -> TransactionStreamConsumer:
+    consumer = TransactionStreamConsumer(name="test", poll_interval_seconds=0, mode=MODE_POLL, **kwargs)
+    consumer.stop_event = StopWhenIdle()
+    return consumer
+
+
+def test_polling_processes_new_rows_in_created_at_order_and_checkpoints(db, analyzed):
+    insert(db, [3, 0, 2, 1, 4])
+    consumer = polling_consumer(batch_size=2)
+
+    consumer.run()
+
+    assert [sorted(batch) for batch in analyzed] == [["tx0000", "tx0001"], ["tx0002", "tx0003"], ["tx0004"]]
+    last = db.transactions.find_one({"transaction_id": "tx0004"})
+    checkpoint = db.stream_checkpoints.find_one({"_id": "test"})
+    assert (checkpoint["last_created_at"], checkpoint["last_id"]) == (last["created_at"], last["_id"])
+    assert consumer.stats["batches"] == 3 and consumer.stats["transactions"] == 5
+    assert consumer.stats["recommendable"] == 3
+
+
+def test_polling_resumes_after_the_checkpoint(db, analyzed):
+    insert(db, range(4))
+    polling_consumer(batch_size=10).run()
+    # Rows left pending behind the checkpoint are for the by-date analysis, not the consumer
+    db.transactions.update_many({}, {"$set": {"processing_status": "pending"}})
+    insert(db, range(4, 6))
+
+    restarted = polling_consumer(batch_size=10)
+    restarted.run()
+
+    assert [sorted(batch) for batch in analyzed] == [
+        ["tx0000", "tx0001", "tx0002", "tx0003"], ["tx0004", "tx0005"]
+    ]
+
+
+def test_polling_breaks_created_at_ties_on_id(db, analyzed):
+    insert(db, range(4), created_at=CREATED)
+    db.transactions.update_many({}, {"$set": {"created_at": CREATED}})
+
+    polling_consumer(batch_size=3).run()
+
+    assert [sorted(batch) for batch in analyzed] == [["tx0000", "tx0001", "tx0002"], ["tx0003"]]
+
+
+def test_rows_claimed_elsewhere_are_skipped_and_failures_counted(db, analyzed):
+    insert(db, [0, 1, 666])
+    db.transactions.update_one({"transaction_id": "tx0001"}, {"$set": {
+        "processing_status": "claimed", "claim_expires_at": datetime.utcnow() + timedelta(minutes=5),
+    }})
+    consumer = polling_consumer(batch_size=10)
+
+    consumer.run()
+
+    assert [sorted(batch) for batch in analyzed] == [["tx0000", "tx0666"]]
+    assert consumer.stats["failed_batches"] == 1
+    assert consumer.stats["recommendable"] == 0
+
+
+def test_auto_mode_falls_back_to_polling_without_change_streams(db, analyzed):
+    insert(db, range(2))
+    consumer = TransactionStreamConsumer(name="test", poll_interval_seconds=0, mode=MODE_AUTO)
+    consumer.stop_event = StopWhenIdle()
+
+    def watch(*args, **kwargs):
+        raise OperationFailure("The $changeStream stage is only supported on replica sets", code=40573)
+
+    consumer._transactions.watch = watch
+    consumer.run()
+
+    assert [sorted(batch) for batch in analyzed] == [["tx0000", "tx0001"]]
+    assert db.stream_checkpoints.find_one({"_id": "test"})["last_id"] is not None
+
+
+def test_change_stream_mode_does_not_fall_back(db, analyzed):
+    consumer = TransactionStreamConsumer(name="test", mode=MODE_CHANGE_STREAM)
+
+    def watch(*args, **kwargs):
+        raise OperationFailure("The $changeStream stage is only supported on replica sets", code=40573)
+
+    consumer._transactions.watch = watch
+    with pytest.raises(OperationFailure):
+        consumer.run()
+    assert analyzed == []
+
+
+def test_change_stream_resumes_from_and_saves_the_resume_token(db, analyzed):
+    insert(db, range(3))
+    db.stream_checkpoints.insert_one({"_id": "test", "resume_token": {"_data": "saved"}})
+    consumer = TransactionStreamConsumer(name="test", batch_size=2, max_wait_seconds=0, mode=MODE_CHANGE_STREAM)
+    opened = []
+
+    def watch(pipeline, resume_after=None, max_await_time_ms=None):
+        opened.append(resume_after)
+        return FakeChangeStream(consumer, ["tx0000", "tx0001", "tx0002"])
+
+    consumer._transactions.watch = watch
+    consumer.run()
+
+    assert opened == [{"_data": "saved"}]
+    assert analyzed == [["tx0000"], ["tx0001"], ["tx0002"]]
+    assert db.stream_checkpoints.find_one({"_id": "test"})["resume_token"] == {"_data": "token-1"}